@@ -151,7 +151,7 @@ class OrderFlowChart():
         return labels
 
     def plot_ranges(self, ohlc):
-        ymin = ohlc['high'][-1] + 1
+        ymin = ohlc['high'].iloc[-1] + 1
         ymax = ymin - int(48*self.granularity)
         xmax = ohlc.shape[0]
         xmin = xmax - 9
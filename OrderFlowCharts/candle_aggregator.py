@@ -0,0 +1,292 @@
+"""
+Streaming candle aggregator for the OrderFlow server.
+
+Each tick updates the OHLC and the per-price BID/ASK footprint of its candle
+as it arrives, so nothing is re-parsed or re-grouped when the chart refreshes.
+Every candle keeps its chart rows (one OHLC row + one footprint row per price)
+cached; only candles touched since the previous snapshot are rebuilt, and a
+closed candle is frozen: its rows are built once when the next candle opens
+and reused by every later snapshot.
+
+Output matches the DataFrames OrderFlowChart expects:
+
+    ohlc:      index timestamp, columns open, high, low, close, identifier
+    orderflow: index timestamp, columns bid_size, price, ask_size, identifier
+"""
+
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Footprint entry: float key + [bid, ask] list with two ints
+LEVEL_BYTES = sys.getsizeof(0.0) + sys.getsizeof([0, 0]) + 2 * sys.getsizeof(0)
+
+
+class Candle:
+    """OHLC + footprint (price -> [bid_volume, ask_volume]) of one candle"""
+
+    __slots__ = ('start', 'identifier', 'open', 'high', 'low', 'close', 'footprint', 'rows')
+
+    def __init__(self, start, price):
+        self.start = start
+        self.identifier = pd.Timestamp(start).strftime('%Y-%m-%d %H:%M:%S')
+        self.open = self.high = self.low = self.close = price
+        self.footprint = {}
+        self.rows = None  # Cached (ohlc_row, prices, bids, asks)
+
+    def add(self, price, volume, side):
+        if price > self.high:
+            self.high = price
+        elif price < self.low:
+            self.low = price
+        self.close = price
+
+        level = self.footprint.get(price)
+        if level is None:
+            level = self.footprint[price] = [0, 0]
+        if side == 'BID':
+            level[0] += volume
+        elif side == 'ASK':
+            level[1] += volume
+        self.rows = None
+
+    def merge(self, high, low, close, levels):
+        """Apply a pre-grouped batch: levels = [(price, bid_volume, ask_volume), ...]"""
+        if high > self.high:
+            self.high = high
+        if low < self.low:
+            self.low = low
+        self.close = close
+        footprint = self.footprint
+        for price, bid_volume, ask_volume in levels:
+            level = footprint.get(price)
+            if level is None:
+                level = footprint[price] = [0, 0]
+            level[0] += bid_volume
+            level[1] += ask_volume
+        self.rows = None
+
+    def build_rows(self):
+        """Chart rows of this candle (cached until the next tick for it)"""
+        if self.rows is None:
+            prices = np.array(sorted(self.footprint), dtype=np.float64)
+            volumes = np.array([self.footprint[p] for p in prices.tolist()], dtype=np.int64).reshape(-1, 2)
+            self.rows = ((self.open, self.high, self.low, self.close), prices, volumes[:, 0], volumes[:, 1])
+        return self.rows
+
+
+class CandleAggregator:
+    """
+    Incremental OHLC + footprint state for the most recent candles.
+
+    Args:
+        interval: candle length (pandas frequency string, e.g. '1min')
+        max_candles: candles kept; the oldest are dropped when a new one opens
+    """
+
+    def __init__(self, interval='1min', max_candles=500):
+        self.interval_ns = pd.Timedelta(interval).value
+        self.max_candles = max_candles
+        self.candles = {}  # candle start (ns) -> Candle
+        self.last_start = None
+        self.version = 0  # Increases on every change; snapshots are cached per version
+        self._snapshot = None
+        self._snapshot_version = -1
+        # Changes since the last drain_changes() (live push)
+        self._changed_cells = set()  # (candle start, price)
+        self._closed = []            # Starts of candles closed by a newer one
+        self._dropped = []           # Starts of candles removed by max_candles
+
+    def __len__(self):
+        return len(self.candles)
+
+    def add_tick(self, timestamp, price, volume, side):
+        """
+        Add one tick.
+
+        Args:
+            timestamp: ISO string, datetime/pd.Timestamp or int nanoseconds
+            price: trade price
+            volume: contracts
+            side: 'BID' or 'ASK'
+        """
+        ts = timestamp if isinstance(timestamp, (int, np.integer)) else pd.Timestamp(timestamp).value
+        start = ts - ts % self.interval_ns
+        self._candle_for(start, price).add(price, volume, side)
+        self._changed_cells.add((start, price))
+        self.version += 1
+
+    def _candle_for(self, start, open_price):
+        """Candle starting at `start`, opened at open_price when it does not exist yet"""
+        candle = self.candles.get(start)
+        if candle is None:
+            candle = self.candles[start] = Candle(start, open_price)
+            if self.last_start is not None and start > self.last_start:
+                # The previous candle is closed: build its rows once and keep them
+                previous = self.candles.get(self.last_start)
+                if previous is not None:
+                    previous.build_rows()
+                    self._closed.append(previous.start)
+            elif self.last_start is not None and start < self.last_start:
+                self._closed.append(start)  # Late tick for a past candle: never the open one
+            if len(self.candles) > self.max_candles:
+                oldest = min(self.candles)
+                del self.candles[oldest]
+                self._dropped.append(oldest)
+        if self.last_start is None or start > self.last_start:
+            self.last_start = start
+        return candle
+
+    def prepare_batch(self, ts, price, volume, side):
+        """
+        Group a batch of ticks per candle without touching the aggregator state,
+        so it can run outside the server lock. Pass the result to apply_batch().
+
+        Args:
+            ts: int64 nanoseconds, in arrival order
+            price, volume: arrays
+            side: codes (0 = BID, 1 = ASK)
+
+        Returns:
+            [(start, open, high, low, close, [(price, bid_volume, ask_volume), ...]), ...]
+            in order of first appearance in the batch.
+        """
+        ts = np.asarray(ts, dtype=np.int64)
+        if len(ts) == 0:
+            return []
+        price = np.asarray(price, dtype=np.float64)
+        volume = np.asarray(volume, dtype=np.int64)
+        side = np.asarray(side)
+        starts = ts - ts % self.interval_ns
+
+        uniq, first, candle_idx = np.unique(starts, return_index=True, return_inverse=True)
+        k = len(uniq)
+        rows = np.arange(len(ts))
+        last = np.zeros(k, dtype=np.int64)
+        np.maximum.at(last, candle_idx, rows)
+        high = np.full(k, -np.inf)
+        np.maximum.at(high, candle_idx, price)
+        low = np.full(k, np.inf)
+        np.minimum.at(low, candle_idx, price)
+
+        # Volume per (candle, price) and side
+        flow = pd.DataFrame({
+            'candle': candle_idx, 'price': price,
+            'bid': np.where(side == 0, volume, 0), 'ask': np.where(side == 1, volume, 0),
+        }).groupby(['candle', 'price'], sort=False)[['bid', 'ask']].sum()
+        levels = [[] for _ in range(k)]
+        for (c, p), b, a in zip(flow.index.tolist(), flow['bid'].tolist(), flow['ask'].tolist()):
+            levels[c].append((p, b, a))
+
+        return [(int(uniq[c]), float(price[first[c]]), float(high[c]), float(low[c]),
+                 float(price[last[c]]), levels[c])
+                for c in np.argsort(first, kind='stable').tolist()]
+
+    def apply_batch(self, groups):
+        """Apply the output of prepare_batch() (same result as add_tick per tick)"""
+        for start, open_price, high, low, close, levels in groups:
+            self._candle_for(start, open_price).merge(high, low, close, levels)
+            self._changed_cells.update((start, price) for price, _, _ in levels)
+        if groups:
+            self.version += 1
+
+    def footprint_levels(self):
+        """Price levels stored across all candles"""
+        return sum(len(c.footprint) for c in self.candles.values())
+
+    def memory_usage(self):
+        """Approximate bytes held by the candle state (footprint dicts + cached rows)"""
+        total = 0
+        for c in self.candles.values():
+            total += sys.getsizeof(c.footprint) + len(c.footprint) * LEVEL_BYTES
+            if c.rows is not None:
+                total += c.rows[1].nbytes + c.rows[2].nbytes + c.rows[3].nbytes
+        return total
+
+    def drain_changes(self):
+        """
+        Candles and footprint cells changed since the previous call.
+
+        Returns:
+            dict with
+                candles: [(start, open, high, low, close), ...] of every changed candle
+                cells:   [(start, price, bid_volume, ask_volume), ...]
+                closed:  [start, ...] candles closed since the previous call
+                dropped: [start, ...] candles removed by max_candles since the previous call
+        """
+        changed, self._changed_cells = self._changed_cells, set()
+        closed, self._closed = self._closed, []
+        dropped, self._dropped = self._dropped, []
+        candles, cells = {}, []
+        for start, price in sorted(changed):
+            candle = self.candles.get(start)
+            if candle is None:
+                continue  # Dropped by max_candles
+            if start not in candles:
+                candles[start] = (start, candle.open, candle.high, candle.low, candle.close)
+            bid_volume, ask_volume = candle.footprint[price]
+            cells.append((start, price, bid_volume, ask_volume))
+        return {'candles': list(candles.values()), 'cells': cells, 'closed': closed, 'dropped': dropped}
+
+    def full_state(self):
+        """
+        Every candle and cell, in the drain_changes() format (initial state for a
+        new viewer); every candle older than the open one is listed as closed.
+        """
+        candles, cells = [], []
+        for start in sorted(self.candles):
+            c = self.candles[start]
+            candles.append((start, c.open, c.high, c.low, c.close))
+            cells.extend((start, price, b, a) for price, (b, a) in sorted(c.footprint.items()))
+        closed = [start for start, _, _, _, _ in candles if start < self.last_start]
+        return {'candles': candles, 'cells': cells, 'closed': closed, 'dropped': []}
+
+    def reset(self):
+        self.candles = {}
+        self.last_start = None
+        self.version += 1
+        self._snapshot = None
+        self._changed_cells = set()
+        self._closed = []
+        self._dropped = []
+
+    def snapshot(self):
+        """
+        (ohlc_df, orderflow_df) for OrderFlowChart, or (None, None) without data.
+
+        Only candles changed since the previous snapshot rebuild their rows; the
+        DataFrames are new objects on every call (OrderFlowChart adds columns).
+        """
+        if not self.candles:
+            return None, None
+
+        if self._snapshot_version != self.version:
+            starts = sorted(self.candles)
+            blocks = [self.candles[s].build_rows() for s in starts]
+
+            candle_ts = pd.to_datetime(np.array(starts, dtype=np.int64))
+            identifiers = np.array([self.candles[s].identifier for s in starts], dtype=object)
+            sizes = np.array([len(prices) for _, prices, _, _ in blocks], dtype=np.int64)
+
+            ohlc = np.array([row for row, _, _, _ in blocks], dtype=np.float64).reshape(-1, 4)
+            ohlc_df = pd.DataFrame({
+                'open': ohlc[:, 0],
+                'high': ohlc[:, 1],
+                'low': ohlc[:, 2],
+                'close': ohlc[:, 3],
+                'identifier': identifiers,
+            }, index=pd.Index(candle_ts, name='timestamp'))
+
+            orderflow_df = pd.DataFrame({
+                'bid_size': np.concatenate([bids for _, _, bids, _ in blocks]),
+                'price': np.concatenate([prices for _, prices, _, _ in blocks]),
+                'ask_size': np.concatenate([asks for _, _, _, asks in blocks]),
+                'identifier': np.repeat(identifiers, sizes),
+            }, index=pd.Index(candle_ts.repeat(sizes), name='timestamp'))
+
+            self._snapshot = (ohlc_df, orderflow_df)
+            self._snapshot_version = self.version
+
+        ohlc_df, orderflow_df = self._snapshot
+        return ohlc_df.copy(), orderflow_df.copy()
@@ -4,42 +4,72 @@ Supports velocity control to speed up/slow down playback
 """
 
 import pandas as pd
+import numpy as np
 import requests
 import time
 import argparse
 from datetime import datetime
 
+from tick_codec import encode_batch, BATCH_CONTENT_TYPE
+from tick_ring import SIDE_CODES
+
 # Configuration
 SERVER_URL = 'http://localhost:8765'
 DEFAULT_VELOCITY = 10  # 10x faster than real-time
+DEFAULT_SLICE_MS = 50  # Ticks due within the same wall-clock slice are sent as one batch
+MAX_BATCH_TICKS = 20000  # Upper bound per /ticks request when catching up
+PROGRESS_EVERY_SEC = 2.0
+
+# One keep-alive connection for the whole replay
+session = requests.Session()
 
 def send_tick(tick_data):
     """Send a single tick to the server"""
     try:
-        response = requests.post(f'{SERVER_URL}/tick', json=tick_data, timeout=5)
+        response = session.post(f'{SERVER_URL}/tick', json=tick_data, timeout=5)
         return response.status_code == 200
     except Exception as e:
         print(f"Error sending tick: {e}")
         return False
 
+def send_batch(ts, price, volume, side, bid, ask):
+    """Send a batch of ticks to /ticks as packed columns"""
+    try:
+        response = session.post(f'{SERVER_URL}/ticks',
+                                data=encode_batch(ts, price, volume, side, bid, ask),
+                                headers={'Content-Type': BATCH_CONTENT_TYPE}, timeout=10)
+        return response.status_code == 200
+    except Exception as e:
+        print(f"Error sending batch: {e}")
+        return False
+
 def reset_server():
     """Reset server data"""
     try:
-        response = requests.post(f'{SERVER_URL}/reset', timeout=5)
+        response = session.post(f'{SERVER_URL}/reset', timeout=5)
         return response.status_code == 200
     except Exception as e:
         print(f"Error resetting server: {e}")
         return False
 
-def stream_csv(csv_file, velocity=DEFAULT_VELOCITY, start_from=0, max_ticks=None):
+def stream_csv(csv_file, velocity=DEFAULT_VELOCITY, start_from=0, max_ticks=None,
+               slice_ms=DEFAULT_SLICE_MS):
     """
     Stream CSV data to server with velocity control
 
+    Every tick has a due time on a monotonic clock, start + (tick time - first
+    tick time) / velocity. After each send the client sleeps until the next
+    wall-clock slice boundary and then sends everything due as one /ticks batch;
+    boundaries are computed from the start time, so sleep overshoot and HTTP
+    round-trips do not accumulate: a slow send just makes the next batch larger.
+    MAX_BATCH_TICKS only splits a batch when catching up.
+
     Args:
         csv_file: Path to CSV file
         velocity: Speed multiplier (10 = 10x faster, 0.5 = half speed)
         start_from: Skip first N rows
         max_ticks: Maximum number of ticks to send (None = all)
+        slice_ms: Batching slice in milliseconds of wall-clock time
     """
     print(f"Loading tick data from {csv_file}...")
 
@@ -54,6 +84,7 @@ def stream_csv(csv_file, velocity=DEFAULT_VELOCITY, start_from=0, max_ticks=None
     print(f"Loaded {len(df):,} ticks")
     print(f"Date range: {df['Timestamp'].min()} to {df['Timestamp'].max()}")
     print(f"Velocity: {velocity}x")
+    print(f"Batch slice: {slice_ms} ms")
     print(f"Starting from row: {start_from}")
 
     # Skip rows if requested
@@ -66,17 +97,28 @@ def stream_csv(csv_file, velocity=DEFAULT_VELOCITY, start_from=0, max_ticks=None
         df = df.head(max_ticks)
         print(f"Limited to {max_ticks} ticks")
 
-    # Calculate time deltas between ticks
-    df['TimeDelta'] = df['Timestamp'].diff().dt.total_seconds()
+    if len(df) == 0:
+        print("No ticks to send")
+        return
+
+    # Columns as arrays (encoded per batch without touching pandas)
+    ts = df['Timestamp'].to_numpy().astype('datetime64[ns]').view(np.int64)
+    price = df['Precio'].to_numpy(dtype=np.float64)
+    volume = df['Volumen'].to_numpy()
+    side = df['Lado'].map(SIDE_CODES).fillna(2).to_numpy(dtype=np.uint8)  # Codes once, not per batch
+    bid = df['Bid'].to_numpy(dtype=np.float64) if 'Bid' in df.columns else None
+    ask = df['Ask'].to_numpy(dtype=np.float64) if 'Ask' in df.columns else None
 
-    # First tick has no delta, use 0
-    df.loc[df.index[0], 'TimeDelta'] = 0
+    # Wall-clock second at which each tick is due (relative to the stream start).
+    # Running max: a tick stamped before its predecessor is due with it (never earlier)
+    due = np.maximum.accumulate((ts - ts[0]) / 1e9 / velocity)
+    slice_sec = slice_ms / 1000
 
     print(f"\nConnecting to server at {SERVER_URL}...")
 
     # Test connection
     try:
-        response = requests.get(f'{SERVER_URL}/stats', timeout=5)
+        response = session.get(f'{SERVER_URL}/stats', timeout=5)
         if response.status_code != 200:
             print("ERROR: Server not responding!")
             return
@@ -89,62 +131,67 @@ def stream_csv(csv_file, velocity=DEFAULT_VELOCITY, start_from=0, max_ticks=None
     print("\nStarting data stream...")
     print("Press Ctrl+C to stop\n")
 
-    ticks_sent = 0
+    n = len(ts)
+    sent = 0
+    batches = 0
     errors = 0
-    start_time = time.time()
+    start_time = time.monotonic()
+    next_slice = 0.0
+    next_progress = PROGRESS_EVERY_SEC
 
     try:
-        for idx, row in df.iterrows():
-            # Calculate delay with velocity applied
-            if ticks_sent > 0:
-                real_delay = row['TimeDelta']
-                adjusted_delay = real_delay / velocity
-
-                # Sleep for the adjusted delay
-                if adjusted_delay > 0:
-                    time.sleep(adjusted_delay)
-
-            # Prepare tick data
-            tick_data = {
-                'Timestamp': row['Timestamp'].isoformat(),
-                'Precio': str(row['Precio']),  # Keep as string to preserve format
-                'Volumen': int(row['Volumen']),
-                'Lado': row['Lado'],
-                'Bid': str(row['Bid']),
-                'Ask': str(row['Ask'])
-            }
-
-            # Send to server
-            success = send_tick(tick_data)
-
-            if success:
-                ticks_sent += 1
-
-                # Print progress every 100 ticks
-                if ticks_sent % 100 == 0:
-                    elapsed = time.time() - start_time
-                    rate = ticks_sent / elapsed
-                    print(f"Sent {ticks_sent:,} ticks | Rate: {rate:.1f} ticks/sec | "
-                          f"Time: {row['Timestamp']} | Price: {row['Precio']}")
+        while sent < n:
+            now = time.monotonic() - start_time
+            wake = max(due[sent], next_slice)
+            if now < wake:
+                # Sleep until the next slice boundary (or the next tick, if later)
+                time.sleep(wake - now)
+                continue
+
+            end = min(int(np.searchsorted(due, now, side='right')), sent + MAX_BATCH_TICKS)
+            end = max(end, sent + 1)
+            catching_up = end < n and due[end] <= now  # Batch capped, more ticks already due
+            sl = slice(sent, end)
+            if send_batch(ts[sl], price[sl], volume[sl], side[sl],
+                          None if bid is None else bid[sl], None if ask is None else ask[sl]):
+                sent = end
+                batches += 1
             else:
+                catching_up = False
                 errors += 1
                 if errors > 10:
                     print("Too many errors, stopping...")
                     break
 
+            # Catching up: next batch right away. Otherwise wait for the next slice
+            # boundary on the absolute schedule (no drift)
+            next_slice = now if catching_up else (int(now / slice_sec) + 1) * slice_sec
+
+            if now >= next_progress:
+                next_progress = now + PROGRESS_EVERY_SEC
+                replayed = due[sent - 1] * velocity if sent else 0.0
+                lag = now - due[sent - 1] if sent else 0.0
+                print(f"Sent {sent:,} ticks in {batches:,} batches | Rate: {sent / now:,.0f} ticks/sec | "
+                      f"Velocity: {replayed / now:.1f}x of {velocity}x | Lag: {lag:.2f}s | "
+                      f"Time: {pd.Timestamp(ts[sent - 1])}")
+
     except KeyboardInterrupt:
         print("\n\nStopped by user")
 
     # Final statistics
-    elapsed = time.time() - start_time
+    elapsed = time.monotonic() - start_time
+    replayed = due[sent - 1] * velocity if sent else 0.0
     print(f"\n{'='*60}")
-    print(f"STREAMING COMPLETE - All data sent")
+    print(f"STREAMING COMPLETE - All data sent" if sent == n else f"STREAMING STOPPED - {sent:,}/{n:,} ticks sent")
     print(f"{'='*60}")
-    print(f"Ticks sent: {ticks_sent:,}")
+    print(f"Ticks sent: {sent:,}")
+    print(f"Batches: {batches:,} (avg {sent / batches if batches else 0:.1f} ticks/batch)")
     print(f"Errors: {errors}")
     print(f"Elapsed time: {elapsed:.1f} seconds")
     if elapsed > 0:
-        print(f"Average rate: {ticks_sent/elapsed:.1f} ticks/sec")
+        print(f"Average rate: {sent/elapsed:.1f} ticks/sec")
+        print(f"Velocity: requested {velocity}x, achieved {replayed / elapsed:.1f}x "
+              f"({replayed:.1f}s of data in {elapsed:.1f}s)")
     print(f"{'='*60}")
     print("Client exiting normally.")
 
@@ -163,6 +210,8 @@ def main():
                         help='Reset server data before starting')
     parser.add_argument('--server', type=str, default=SERVER_URL,
                         help=f'Server URL (default: {SERVER_URL})')
+    parser.add_argument('--slice-ms', type=float, default=DEFAULT_SLICE_MS,
+                        help=f'Batch ticks due within the same slice of wall-clock time (default: {DEFAULT_SLICE_MS} ms)')
 
     args = parser.parse_args()
 
@@ -187,7 +236,8 @@ def main():
         args.csv_file,
         velocity=args.velocity,
         start_from=args.start_from,
-        max_ticks=args.max_ticks
+        max_ticks=args.max_ticks,
+        slice_ms=args.slice_ms
     )
 
 if __name__ == '__main__':
@@ -0,0 +1,340 @@
+"""
+WebSocket push channel for live order-flow updates.
+
+A background thread runs an asyncio WebSocket server (WS_PORT). Every
+PUSH_INTERVAL_MS the push loop takes the server lock once, drains what changed
+since the previous push and broadcasts one JSON message to every viewer:
+
+    {"type": "delta",
+     "candles": [[t_ms, open, high, low, close], ...],   changed candles (new ones included)
+     "cells":   [[t_ms, price, bid, ask], ...],           changed footprint cells
+     "closed":  [t_ms, ...],                              candles closed since the last push
+     "dropped": [t_ms, ...],                              candles removed by MAX_CANDLES
+     "ticks":   [[t_ms, price, side], ...]}               new trades (side 0 = BID, 1 = ASK)
+
+Nothing is sent when nothing changed. A new viewer first receives the same
+message with "type": "snapshot" (every candle and cell, every candle but the
+open one listed as closed, + the last ticks), and after /reset every viewer
+receives {"type": "reset"}.
+
+The page served at /live/ (LIVE_PAGE) keeps the figure in the browser. Closed
+candles and their cells live in frozen traces that are only appended to
+(Plotly.extendTraces, once per closed candle) and trimmed from the front when
+candles are dropped; the open candle has its own small traces, the only ones
+restyled on every push. Browser and server work per push therefore follow the
+size of the open candle, not the session length.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+
+from websockets.asyncio.server import broadcast, serve
+
+logger = logging.getLogger(__name__)
+
+PUSH_INTERVAL_MS = 200
+MAX_PUSH_TICKS = 5000    # New trades sent per push (the newest ones)
+SNAPSHOT_TICKS = 2000    # Trades sent to a new viewer
+LIVE_TICK_POINTS = 5000  # Trades kept in the browser's tick trace
+
+NS_PER_MS = 1_000_000
+
+
+def _candle_rows(candles):
+    return [[start // NS_PER_MS, o, h, l, c] for start, o, h, l, c in candles]
+
+
+def _cell_rows(cells):
+    return [[start // NS_PER_MS, price, int(b), int(a)] for start, price, b, a in cells]
+
+
+def _tick_rows(records):
+    return [[t // NS_PER_MS, p, s] for t, p, s in
+            zip(records['ts'].tolist(), records['price'].tolist(), records['side'].tolist())]
+
+
+class LivePush:
+    """
+    Collects deltas from the aggregator + tick ring and broadcasts them.
+
+    Args:
+        aggregator: CandleAggregator
+        ticks: TickRing
+        lock: lock that guards both (the server's data_lock)
+    """
+
+    def __init__(self, aggregator, ticks, lock, push_interval_ms=PUSH_INTERVAL_MS):
+        self.aggregator = aggregator
+        self.ticks = ticks
+        self.lock = lock
+        self.push_interval = push_interval_ms / 1000
+        self.clients = set()
+        self.pending = set()  # Connected, waiting for their snapshot
+        self.tick_mark = 0    # ticks.received at the previous push
+        self.reset_pending = False
+        self.messages_sent = 0
+
+    def notify_reset(self):
+        """Call with the lock held after the aggregator and tick ring were cleared"""
+        self.reset_pending = True
+        self.tick_mark = 0
+
+    def _collect(self, with_snapshot):
+        """Drain changes (and build a snapshot for new viewers); call with the lock held"""
+        reset = self.reset_pending
+        self.reset_pending = False
+        changes = self.aggregator.drain_changes()
+        new_ticks = self.ticks.since(self.tick_mark, MAX_PUSH_TICKS)
+        self.tick_mark = self.ticks.received
+
+        delta = None
+        if changes['candles'] or changes['closed'] or changes['dropped'] or len(new_ticks):
+            delta = {
+                'type': 'delta',
+                'candles': _candle_rows(changes['candles']),
+                'cells': _cell_rows(changes['cells']),
+                'closed': [start // NS_PER_MS for start in changes['closed']],
+                'dropped': [start // NS_PER_MS for start in changes['dropped']],
+                'ticks': _tick_rows(new_ticks),
+            }
+
+        snapshot = None
+        if with_snapshot:
+            state = self.aggregator.full_state()
+            snapshot = {
+                'type': 'snapshot',
+                'candles': _candle_rows(state['candles']),
+                'cells': _cell_rows(state['cells']),
+                'closed': [start // NS_PER_MS for start in state['closed']],
+                'dropped': [],
+                'ticks': _tick_rows(self.ticks.since(0, SNAPSHOT_TICKS)),
+            }
+        return reset, delta, snapshot
+
+    async def _push_loop(self):
+        while True:
+            await asyncio.sleep(self.push_interval)
+            new_clients, self.pending = self.pending, set()
+            with self.lock:
+                reset, delta, snapshot = self._collect(bool(new_clients))
+
+            if reset:
+                broadcast(self.clients, json.dumps({'type': 'reset'}))
+            if delta is not None and self.clients:
+                broadcast(self.clients, json.dumps(delta))
+                self.messages_sent += 1
+            if snapshot is not None:
+                broadcast(new_clients, json.dumps(snapshot))
+            self.clients |= new_clients
+
+    async def _handler(self, websocket):
+        self.pending.add(websocket)
+        logger.info(f"Live viewer connected ({len(self.clients) + len(self.pending)} total)")
+        try:
+            await websocket.wait_closed()
+        finally:
+            self.pending.discard(websocket)
+            self.clients.discard(websocket)
+            logger.info(f"Live viewer disconnected ({len(self.clients)} total)")
+
+    async def _serve(self, host, port):
+        async with serve(self._handler, host, port):
+            await self._push_loop()
+
+    def start(self, host='0.0.0.0', port=8766):
+        """Run the WebSocket server + push loop in a daemon thread"""
+        thread = threading.Thread(target=lambda: asyncio.run(self._serve(host, port)),
+                                  name='live-push', daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        return {'live_viewers': len(self.clients), 'live_messages': self.messages_sent}
+
+
+LIVE_PAGE = """
+<html>
+<head>
+    <title>OrderFlow Live</title>
+    <script src="https://cdn.plot.ly/plotly-2.35.2.min.js"></script>
+</head>
+<body style="background: #111; color: #fff; font-family: monospace; margin: 0;">
+    <div id="status" style="padding: 8px;">Connecting...</div>
+    <div id="chart" style="height: 92vh;"></div>
+    <script>
+    const WS_URL = 'ws://' + location.hostname + ':__WS_PORT__/';
+    const TICK_POINTS = __TICK_POINTS__;
+    const BID_COLOR = '#B266FF', ASK_COLOR = '#00FF00', FLAT_COLOR = '#AAAAAA';
+    // Trace indices: closed candles/cells (append-only), open candle/cells (restyled), trades
+    const FROZEN_CANDLES = 0, FROZEN_CELLS = 1, LIVE_CANDLES = 2, LIVE_CELLS = 3, TRADES = 4;
+    const gd = document.getElementById('chart');
+    let live, frozen, frozenIndex, frozenCells, ready = false, messages = 0;
+
+    function clearState() {
+        live = new Map();         // t -> {t, ohlc, cells: Map(price -> [bid, ask])}, candles not closed yet
+        frozen = [];              // Closed candles in the order of the frozen traces
+        frozenIndex = new Map();  // t -> closed candle
+        frozenCells = 0;          // Points in the frozen cell trace
+    }
+
+    function cellText(b, a) { return b + ' x ' + a; }
+    function cellColor(b, a) { return a > b ? ASK_COLOR : (b > a ? BID_COLOR : FLAT_COLOR); }
+
+    function candleTrace(name, opacity) {
+        return {type: 'candlestick', name: name, x: [], open: [], high: [], low: [], close: [],
+                increasing: {line: {color: 'green'}}, decreasing: {line: {color: 'red'}}, opacity: opacity};
+    }
+
+    function cellTrace(name) {
+        return {type: 'scatter', mode: 'text', name: name, x: [], y: [], text: [],
+                textfont: {family: 'Courier New', size: 10, color: []}, hoverinfo: 'x+y+text'};
+    }
+
+    function emptyTraces() {
+        return [
+            candleTrace('Candle', 0.5), cellTrace('BidAsk'),
+            candleTrace('Open candle', 0.7), cellTrace('Open BidAsk'),
+            {type: 'scatter', mode: 'markers', name: 'Trades', x: [], y: [],
+             marker: {size: 3, color: []}, hoverinfo: 'x+y'}
+        ];
+    }
+
+    function layout() {
+        return {paper_bgcolor: '#111', plot_bgcolor: '#111', font: {color: '#fff'}, uirevision: 'live',
+                xaxis: {type: 'date', rangeslider: {visible: false}, gridcolor: '#333'},
+                yaxis: {title: {text: 'Price'}, gridcolor: '#333'},
+                margin: {l: 60, r: 20, t: 20, b: 40}};
+    }
+
+    // Flatten candles into trace columns (new closed candles, the open candle, or a full rebuild)
+    function columns(candles) {
+        const c = {x: [], open: [], high: [], low: [], close: []}, f = {x: [], y: [], text: [], color: []};
+        for (const k of candles) {
+            const [o, h, l, cl] = k.ohlc;
+            c.x.push(k.t); c.open.push(o); c.high.push(h); c.low.push(l); c.close.push(cl);
+            for (const [p, [b, a]] of k.cells) {
+                f.x.push(k.t); f.y.push(p); f.text.push(cellText(b, a)); f.color.push(cellColor(b, a));
+            }
+        }
+        return [c, f];
+    }
+
+    function setCandles(index, c) {
+        Plotly.restyle(gd, {x: [c.x], open: [c.open], high: [c.high], low: [c.low], close: [c.close]}, [index]);
+    }
+
+    function setCells(index, f) {
+        Plotly.restyle(gd, {x: [f.x], y: [f.y], text: [f.text], 'textfont.color': [f.color]}, [index]);
+    }
+
+    function liveCandle(t) {
+        let k = live.get(t);
+        if (k === undefined) live.set(t, k = {t: t, ohlc: null, cells: new Map()});
+        return k;
+    }
+
+    function apply(msg) {
+        if (msg.type === 'reset' || msg.type === 'snapshot') {
+            clearState();
+            Plotly.react(gd, emptyTraces(), layout());
+            ready = true;
+            if (msg.type === 'reset') return;
+        }
+        if (!ready) return;
+
+        // Late ticks for a closed candle (out-of-order data) force a rebuild of the frozen traces
+        let rebuild = false;
+        for (const [t, o, h, l, cl] of msg.candles) {
+            const k = frozenIndex.get(t) || liveCandle(t);
+            k.ohlc = [o, h, l, cl];
+            if (frozenIndex.has(t)) rebuild = true;
+        }
+        for (const [t, p, b, a] of msg.cells) {
+            const k = frozenIndex.get(t) || liveCandle(t);
+            if (frozenIndex.has(t)) {
+                if (!k.cells.has(p)) frozenCells += 1;
+                rebuild = true;
+            }
+            k.cells.set(p, [b, a]);
+        }
+
+        // Closed candles move from the open traces to the end of the frozen ones
+        const added = [];
+        for (const t of msg.closed) {
+            const k = live.get(t);
+            if (k === undefined) continue;
+            live.delete(t);
+            if (frozen.length && t < frozen[frozen.length - 1].t) {
+                rebuild = true;
+                frozen.splice(frozen.findIndex(f => f.t > t), 0, k);
+            } else {
+                frozen.push(k);
+                added.push(k);
+            }
+            frozenIndex.set(t, k);
+            frozenCells += k.cells.size;
+        }
+
+        // Dropped candles are the oldest ones: trimmed from the front through extendTraces(maxPoints)
+        let trimmed = false;
+        for (const t of msg.dropped) {
+            if (live.delete(t)) continue;
+            const k = frozenIndex.get(t);
+            if (k === undefined) continue;
+            frozenIndex.delete(t);
+            frozenCells -= k.cells.size;
+            if (frozen[0] === k) frozen.shift(); else { frozen.splice(frozen.indexOf(k), 1); rebuild = true; }
+            trimmed = true;
+        }
+        if (trimmed && (!added.length || !frozen.length)) rebuild = true;
+
+        if (rebuild) {
+            const [c, f] = columns(frozen);
+            setCandles(FROZEN_CANDLES, c);
+            setCells(FROZEN_CELLS, f);
+        } else if (added.length) {
+            const [c, f] = columns(added);
+            Plotly.extendTraces(gd, {x: [c.x], open: [c.open], high: [c.high], low: [c.low], close: [c.close]},
+                                [FROZEN_CANDLES], frozen.length);
+            if (f.x.length) Plotly.extendTraces(gd, {x: [f.x], y: [f.y], text: [f.text], 'textfont.color': [f.color]},
+                                                [FROZEN_CELLS], frozenCells);
+        }
+
+        if (msg.candles.length || msg.closed.length || msg.dropped.length) {
+            const [c, f] = columns([...live.values()].sort((a, b) => a.t - b.t));
+            setCandles(LIVE_CANDLES, c);
+            setCells(LIVE_CELLS, f);
+        }
+
+        if (msg.ticks.length) {
+            const x = [], y = [], color = [];
+            for (const [t, p, s] of msg.ticks) { x.push(t); y.push(p); color.push(s === 1 ? ASK_COLOR : BID_COLOR); }
+            Plotly.extendTraces(gd, {x: [x], y: [y], 'marker.color': [color]}, [TRADES], TICK_POINTS);
+        }
+
+        messages += 1;
+        document.getElementById('status').textContent = 'Live | candles: ' + (frozen.length + live.size) +
+            ' | cells: ' + (frozenCells + [...live.values()].reduce((n, k) => n + k.cells.size, 0)) +
+            ' | updates: ' + messages;
+    }
+
+    function connect() {
+        const ws = new WebSocket(WS_URL);
+        ws.onmessage = (e) => apply(JSON.parse(e.data));
+        ws.onclose = () => {
+            ready = false;
+            document.getElementById('status').textContent = 'Disconnected, retrying...';
+            setTimeout(connect, 1000);
+        };
+    }
+    connect();
+    </script>
+</body>
+</html>
+"""
+
+
+def live_page(ws_port):
+    return LIVE_PAGE.replace('__WS_PORT__', str(ws_port)).replace('__TICK_POINTS__', str(LIVE_TICK_POINTS))
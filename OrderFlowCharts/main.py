@@ -1,6 +1,11 @@
 from OrderFlow import OrderFlowChart
 import pandas as pd
 import numpy as np
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from tick_store import load_ticks
 
 # Configuration
 INPUT_FILE = '../data/time_and_sales_nq.csv'
@@ -8,22 +13,11 @@ CANDLE_INTERVAL = '1min'
 MAX_CANDLES = 500
 
 print(f"Loading tick data from {INPUT_FILE}...")
-# Read tick data with European format
-df = pd.read_csv(
-    INPUT_FILE,
-    sep=';',
-    decimal=',',
-    parse_dates=['Timestamp'],
-    dtype={'Volumen': int}
-)
+# Read tick data from the binary tick store (built from the European-format CSV once)
+df = load_ticks(INPUT_FILE)
 
 print(f"Loaded {len(df):,} ticks")
 
-# Convert price columns to float
-df['Precio'] = df['Precio'].astype(float)
-df['Bid'] = df['Bid'].astype(float)
-df['Ask'] = df['Ask'].astype(float)
-
 # Set timestamp as index
 df.set_index('Timestamp', inplace=True)
 
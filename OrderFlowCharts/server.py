@@ -5,22 +5,33 @@ Listens on HTTP port for incoming tick data and updates visualization
 
 from flask import Flask, request, jsonify
 from OrderFlow import OrderFlowChart
+from candle_aggregator import CandleAggregator
+from tick_ring import TickRing
+from tick_codec import decode_request
+from live_push import LivePush, live_page
 import pandas as pd
 import numpy as np
 from datetime import datetime
 from threading import Lock
 import plotly.graph_objects as go
-from dash import Dash, dcc, html, Input, Output
+from dash import Dash, dcc, html, Input, Output, State, ctx, no_update
 import json
 import logging
 import os
+import time
 
 # Configuration
 PORT = 8765
+WS_PORT = 8766  # WebSocket push channel for /live/
 CANDLE_INTERVAL = '1min'
 MAX_CANDLES = 500
 INITIAL_WINDOW_MINUTES = 30
 
+# Tick retention (fixed-size ring buffer, 37 bytes per tick)
+TICK_CAPACITY = 2_000_000                 # Max ticks in memory (~74 MB)
+TICK_RETENTION = ('candles', MAX_CANDLES)  # ('candles', N), ('time', '2h') or None
+TICK_SPILL_DIR = None                     # Directory for evicted ticks (None = drop them)
+
 # Setup logging to file
 LOG_DIR = 'logs'
 os.makedirs(LOG_DIR, exist_ok=True)
@@ -40,11 +51,22 @@ logger = logging.getLogger(__name__)
 
 # Thread-safe data storage
 data_lock = Lock()
-tick_buffer = []
+tick_buffer = TickRing(TICK_CAPACITY, TICK_RETENTION, CANDLE_INTERVAL, TICK_SPILL_DIR)
+candle_aggregator = CandleAggregator(CANDLE_INTERVAL, MAX_CANDLES)  # OHLC + footprint updated per tick
 ohlc_data = None
 orderflow_data = None
 y_axis_range = None  # Store fixed y-axis range
 
+# /ticks ingestion counters (updated under data_lock)
+def new_ingest_stats():
+    return {'batches': 0, 'ticks': 0, 'handler_sec': 0.0, 'lock_sec': 0.0,
+            'first_batch': None, 'last_batch': None}
+
+ingest_stats = new_ingest_stats()
+
+# Pushes candle/cell/tick deltas to /live/ viewers (started in __main__)
+live_push = LivePush(candle_aggregator, tick_buffer, data_lock)
+
 # Initialize Flask for receiving data
 flask_app = Flask(__name__)
 
@@ -66,6 +88,7 @@ dash_app.layout = html.Div([
         ], style={'display': 'inline-block'})
     ]),
     dcc.Graph(id='orderflow-chart', style={'height': '90vh'}),
+    dcc.Store(id='rendered-version'),  # Aggregator version of the figure shown in this browser
     dcc.Interval(
         id='interval-component',
         interval=500,  # Update every 500ms
@@ -74,73 +97,9 @@ dash_app.layout = html.Div([
 ])
 
 def process_ticks_to_orderflow():
-    """Process accumulated ticks into OHLC and orderflow data"""
-    global ohlc_data, orderflow_data
-
+    """Current OHLC and orderflow data from the streaming aggregator"""
     with data_lock:
-        if len(tick_buffer) == 0:
-            return None, None
-
-        # Create DataFrame from tick buffer
-        df = pd.DataFrame(tick_buffer)
-        df['Timestamp'] = pd.to_datetime(df['Timestamp'], format='ISO8601')
-        df.set_index('Timestamp', inplace=True)
-
-        # Group by candle interval
-        df['candle_id'] = df.index.floor(CANDLE_INTERVAL)
-
-        # Limit to MAX_CANDLES most recent
-        unique_candles = df['candle_id'].unique()
-        if len(unique_candles) > MAX_CANDLES:
-            selected_candles = unique_candles[-MAX_CANDLES:]
-            df = df[df['candle_id'].isin(selected_candles)]
-
-        # Create OHLC data
-        ohlc_list = []
-        for candle_time, group in df.groupby('candle_id'):
-            ohlc_list.append({
-                'timestamp': candle_time,
-                'open': group['Precio'].iloc[0],
-                'high': group['Precio'].max(),
-                'low': group['Precio'].min(),
-                'close': group['Precio'].iloc[-1],
-                'identifier': candle_time.strftime('%Y-%m-%d %H:%M:%S')
-            })
-
-        ohlc_df = pd.DataFrame(ohlc_list)
-        ohlc_df.set_index('timestamp', inplace=True)
-
-        # Create Orderflow data
-        orderflow_list = []
-        for candle_time, group in df.groupby('candle_id'):
-            identifier = candle_time.strftime('%Y-%m-%d %H:%M:%S')
-
-            # Aggregate volume by price level and side
-            volume_by_price = group.groupby(['Precio', 'Lado'])['Volumen'].sum().unstack(fill_value=0)
-
-            # Ensure both BID and ASK columns exist
-            if 'BID' not in volume_by_price.columns:
-                volume_by_price['BID'] = 0
-            if 'ASK' not in volume_by_price.columns:
-                volume_by_price['ASK'] = 0
-
-            # Get all price levels in this candle
-            for price in volume_by_price.index:
-                bid_vol = volume_by_price.loc[price, 'BID']
-                ask_vol = volume_by_price.loc[price, 'ASK']
-
-                orderflow_list.append({
-                    'timestamp': candle_time,
-                    'bid_size': int(bid_vol),
-                    'price': float(price),
-                    'ask_size': int(ask_vol),
-                    'identifier': identifier
-                })
-
-        orderflow_df = pd.DataFrame(orderflow_list)
-        orderflow_df.set_index('timestamp', inplace=True)
-
-        return ohlc_df, orderflow_df
+        return candle_aggregator.snapshot()
 
 @flask_app.route('/tick', methods=['POST'])
 def receive_tick():
@@ -151,21 +110,69 @@ def receive_tick():
         # Convert price to float
         tick_data['Precio'] = float(tick_data['Precio'])
         tick_data['Volumen'] = int(tick_data['Volumen'])
+        # Parse the timestamp once, outside the lock
+        ts_ns = pd.Timestamp(tick_data['Timestamp']).value
+
+        bid = float(tick_data.get('Bid', 'nan'))
+        ask = float(tick_data.get('Ask', 'nan'))
 
         with data_lock:
-            tick_buffer.append(tick_data)
+            tick_buffer.append(ts_ns, tick_data['Precio'], tick_data['Volumen'], tick_data['Lado'], bid, ask)
+            candle_aggregator.add_tick(ts_ns, tick_data['Precio'], tick_data['Volumen'], tick_data['Lado'])
+            ticks_received = tick_buffer.received
 
-        return jsonify({'status': 'ok', 'ticks_received': len(tick_buffer)}), 200
+        return jsonify({'status': 'ok', 'ticks_received': ticks_received}), 200
     except Exception as e:
         logger.error(f"Error receiving tick: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 400
 
+@flask_app.route('/ticks', methods=['POST'])
+def receive_ticks():
+    """Receive a batch of ticks (packed columns, NDJSON or JSON list, see tick_codec.py)"""
+    try:
+        start = time.perf_counter()
+
+        # Decode and group per candle outside the lock
+        cols = decode_request(request.get_data(), request.content_type)
+        n = len(cols['ts'])
+        groups = candle_aggregator.prepare_batch(cols['ts'], cols['price'], cols['volume'], cols['side'])
+
+        with data_lock:
+            lock_start = time.perf_counter()
+            tick_buffer.extend(cols['ts'], cols['price'], cols['volume'], cols['side'], cols['bid'], cols['ask'])
+            candle_aggregator.apply_batch(groups)
+            ticks_received = tick_buffer.received
+
+            end = time.perf_counter()
+            ingest_stats['batches'] += 1
+            ingest_stats['ticks'] += n
+            ingest_stats['handler_sec'] += end - start
+            ingest_stats['lock_sec'] += end - lock_start
+            if ingest_stats['first_batch'] is None:
+                ingest_stats['first_batch'] = start
+            ingest_stats['last_batch'] = end
+
+        elapsed = end - start
+        return jsonify({
+            'status': 'ok',
+            'ticks': n,
+            'ticks_received': ticks_received,
+            'ticks_per_sec': round(n / elapsed, 1) if elapsed > 0 else None,
+            'lock_ms': round((end - lock_start) * 1000, 3),
+        }), 200
+    except Exception as e:
+        logger.error(f"Error receiving tick batch: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
 @flask_app.route('/reset', methods=['POST'])
 def reset_data():
     """Reset all data"""
-    global tick_buffer, ohlc_data, orderflow_data, y_axis_range
+    global ohlc_data, orderflow_data, y_axis_range, ingest_stats
     with data_lock:
-        tick_buffer = []
+        tick_buffer.clear()
+        ingest_stats = new_ingest_stats()
+        live_push.notify_reset()
+        candle_aggregator.reset()
         ohlc_data = None
         orderflow_data = None
         y_axis_range = None
@@ -177,20 +184,51 @@ def get_stats():
     """Get current statistics"""
     with data_lock:
         return jsonify({
-            'ticks_received': len(tick_buffer),
-            'candles': len(ohlc_data) if ohlc_data is not None else 0
+            **tick_buffer.stats(),
+            'candles': len(candle_aggregator),
+            'footprint_levels': candle_aggregator.footprint_levels(),
+            'aggregator_bytes': candle_aggregator.memory_usage(),
+            **batch_ingest_stats(),
+            **live_push.stats(),
         }), 200
 
+@flask_app.route('/live/')
+def live():
+    """Push-based chart: the browser patches the figure with deltas from the WebSocket"""
+    return live_page(WS_PORT)
+
+def batch_ingest_stats():
+    """Throughput of /ticks (call with data_lock held)"""
+    s = ingest_stats
+    if s['batches'] == 0:
+        return {'batches': 0}
+    wall = s['last_batch'] - s['first_batch']
+    return {
+        'batches': s['batches'],
+        'batch_ticks': s['ticks'],
+        'ingest_ticks_per_sec': round(s['ticks'] / wall, 1) if wall > 0 else None,   # Wall clock, first to last batch
+        'handler_ticks_per_sec': round(s['ticks'] / s['handler_sec'], 1) if s['handler_sec'] > 0 else None,
+        'avg_lock_ms': round(s['lock_sec'] / s['batches'] * 1000, 3),
+    }
+
 @dash_app.callback(
     [Output('orderflow-chart', 'figure'),
-     Output('stats', 'children')],
+     Output('stats', 'children'),
+     Output('rendered-version', 'data')],
     [Input('interval-component', 'n_intervals'),
-     Input('volume-profile-toggle', 'value')]
+     Input('volume-profile-toggle', 'value')],
+    [State('rendered-version', 'data')]
 )
-def update_chart(n, volume_profile_toggle):
+def update_chart(n, volume_profile_toggle, rendered_version):
     """Update the chart with latest data"""
     global ohlc_data, orderflow_data, y_axis_range
 
+    # Nothing arrived since this browser's last render: keep its figure
+    with data_lock:
+        version = candle_aggregator.version
+    if ctx.triggered_id == 'interval-component' and rendered_version == version:
+        return no_update, no_update, no_update
+
     # Check if volume profile should be shown
     show_volume_profile = 'show' in volume_profile_toggle if volume_profile_toggle else False
 
@@ -207,7 +245,7 @@ def update_chart(n, volume_profile_toggle):
                 height=800
             )
             stats_text = "No data received yet. Waiting for client to send ticks..."
-            return fig, stats_text
+            return fig, stats_text, version
 
         # Update global variables
         ohlc_data = ohlc_df
@@ -253,13 +291,13 @@ def update_chart(n, volume_profile_toggle):
 
         # Statistics
         with data_lock:
-            total_ticks = len(tick_buffer)
+            total_ticks = tick_buffer.received
 
         stats_text = f"Total Ticks: {total_ticks:,} | Candles: {len(ohlc_data)} | " \
                      f"Orderflow Records: {len(orderflow_data)} | " \
                      f"Price Range: {orderflow_data['price'].min():.2f} - {orderflow_data['price'].max():.2f}"
 
-        return fig, stats_text
+        return fig, stats_text, version
 
     except Exception as e:
         logger.error(f"ERROR in update_chart: {e}")
@@ -274,7 +312,7 @@ def update_chart(n, volume_profile_toggle):
             height=800
         )
         stats_text = f"Error: {str(e)}"
-        return fig, stats_text
+        return fig, stats_text, None
 
 @flask_app.route('/')
 def index():
@@ -288,7 +326,9 @@ def index():
             <p>Endpoints:</p>
             <ul>
                 <li><a href="/chart/" style="color: #4af">View Chart</a> - Real-time OrderFlow visualization</li>
+                <li><a href="/live/" style="color: #4af">Live Chart</a> - Push updates over WebSocket (port {})</li>
                 <li>POST /tick - Send tick data</li>
+                <li>POST /ticks - Send a batch of ticks (packed columns or NDJSON)</li>
                 <li>POST /reset - Reset all data</li>
                 <li>GET /stats - Get statistics</li>
             </ul>
@@ -304,7 +344,7 @@ def index():
             </script>
         </body>
     </html>
-    """.format(PORT)
+    """.format(PORT, WS_PORT)
 
 if __name__ == '__main__':
     # Disable Flask/Werkzeug request logging
@@ -314,6 +354,9 @@ if __name__ == '__main__':
     logger.info(f"OrderFlow Server starting on port {PORT}...")
     logger.info(f"Logging to file: {log_file}")
     logger.info(f"Chart will be available at: http://localhost:{PORT}/chart/")
+    logger.info(f"Live chart (WebSocket push on port {WS_PORT}): http://localhost:{PORT}/live/")
     logger.info(f"Send ticks to: http://localhost:{PORT}/tick")
 
+    live_push.start(port=WS_PORT)
+
     flask_app.run(host='0.0.0.0', port=PORT, debug=False, threaded=True)
@@ -0,0 +1,116 @@
+"""
+Wire formats for batches of ticks (POST /ticks).
+
+Packed columnar batch (Content-Type: application/x-tick-batch):
+
+    4 bytes   magic b'TKB1'
+    uint32    n (little endian)
+    int64[n]   ts      nanoseconds since epoch
+    float64[n] price
+    float64[n] bid     NaN = unknown
+    float64[n] ask     NaN = unknown
+    uint32[n]  volume
+    uint8[n]   side    0 = BID, 1 = ASK, 2 = other
+
+Decoding is a few np.frombuffer views, no per-tick Python work.
+
+Fallbacks for clients without numpy: NDJSON (application/x-ndjson, one /tick
+JSON object per line) or a JSON list of the same objects (application/json).
+"""
+
+import json
+import struct
+
+import numpy as np
+import pandas as pd
+
+from tick_ring import SIDE_CODES
+
+BATCH_MAGIC = b'TKB1'
+BATCH_CONTENT_TYPE = 'application/x-tick-batch'
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+JSON_CONTENT_TYPE = 'application/json'
+
+BATCH_COLUMNS = [
+    ('ts', np.dtype('<i8')),
+    ('price', np.dtype('<f8')),
+    ('bid', np.dtype('<f8')),
+    ('ask', np.dtype('<f8')),
+    ('volume', np.dtype('<u4')),
+    ('side', np.dtype('u1')),
+]
+_HEADER = struct.Struct('<4sI')
+_ROW_BYTES = sum(dtype.itemsize for _, dtype in BATCH_COLUMNS)
+
+
+def encode_batch(ts, price, volume, side, bid=None, ask=None):
+    """
+    Pack a batch of ticks.
+
+    Args:
+        ts: int64 nanoseconds (or datetime64)
+        price, bid, ask: prices (bid/ask default to NaN)
+        volume: contracts
+        side: 'BID'/'ASK' labels or 0/1 codes
+    """
+    ts = np.asarray(ts)
+    if ts.dtype.kind == 'M':
+        ts = ts.astype('datetime64[ns]').view(np.int64)
+    n = len(ts)
+    side = np.asarray(side)
+    if side.dtype.kind not in 'iub':
+        side = np.array([SIDE_CODES.get(s, 2) for s in side.tolist()], dtype=np.uint8)
+    nan = np.full(n, np.nan)
+    columns = {'ts': ts, 'price': price, 'bid': nan if bid is None else bid,
+               'ask': nan if ask is None else ask, 'volume': volume, 'side': side}
+
+    parts = [_HEADER.pack(BATCH_MAGIC, n)]
+    for name, dtype in BATCH_COLUMNS:
+        col = np.asarray(columns[name]).astype(dtype, copy=False)
+        if len(col) != n:
+            raise ValueError(f"Column {name} has {len(col)} values, expected {n}")
+        parts.append(col.tobytes())
+    return b''.join(parts)
+
+
+def decode_batch(payload):
+    """Packed batch -> dict of column arrays (read-only views on the payload)"""
+    if len(payload) < _HEADER.size:
+        raise ValueError("Tick batch too short")
+    magic, n = _HEADER.unpack_from(payload)
+    if magic != BATCH_MAGIC:
+        raise ValueError(f"Bad tick batch magic {magic!r}")
+    if len(payload) != _HEADER.size + n * _ROW_BYTES:
+        raise ValueError(f"Tick batch size mismatch: {len(payload)} bytes for {n} ticks")
+
+    columns = {}
+    offset = _HEADER.size
+    for name, dtype in BATCH_COLUMNS:
+        columns[name] = np.frombuffer(payload, dtype=dtype, count=n, offset=offset)
+        offset += n * dtype.itemsize
+    return columns
+
+
+def decode_json_ticks(ticks):
+    """List of /tick JSON objects -> dict of column arrays"""
+    ts = pd.to_datetime([t['Timestamp'] for t in ticks], format='ISO8601')
+    return {
+        'ts': ts.values.astype('datetime64[ns]').view(np.int64),
+        'price': np.array([float(t['Precio']) for t in ticks], dtype=np.float64),
+        'bid': np.array([float(t.get('Bid', 'nan')) for t in ticks], dtype=np.float64),
+        'ask': np.array([float(t.get('Ask', 'nan')) for t in ticks], dtype=np.float64),
+        'volume': np.array([int(t['Volumen']) for t in ticks], dtype=np.uint32),
+        'side': np.array([SIDE_CODES.get(t['Lado'], 2) for t in ticks], dtype=np.uint8),
+    }
+
+
+def decode_request(payload, content_type):
+    """Decode a /ticks body according to its Content-Type"""
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if content_type == BATCH_CONTENT_TYPE:
+        return decode_batch(payload)
+    if content_type == NDJSON_CONTENT_TYPE:
+        return decode_json_ticks([json.loads(line) for line in payload.splitlines() if line.strip()])
+    if content_type == JSON_CONTENT_TYPE:
+        return decode_json_ticks(json.loads(payload))
+    raise ValueError(f"Unsupported Content-Type for /ticks: {content_type!r}")
@@ -0,0 +1,250 @@
+"""
+Fixed-capacity ring buffer of ticks for the OrderFlow server.
+
+Ticks live in one preallocated numpy structured array (TICK_DTYPE, 37 bytes
+per tick), so memory is bounded by `capacity` no matter how long the session
+runs. Ticks leave the buffer from the oldest end when:
+
+    - they fall outside the retention window:
+        ('candles', N)   keep the ticks of the last N candles
+        ('time', '2h')   keep the ticks newer than last tick - 2h
+        None             no window, only the capacity limit applies
+      (eviction stops at the first retained tick, so a late out-of-order tick
+      stays until the ticks before it expire)
+    - the buffer is full (the oldest `capacity // EVICT_BLOCK_DIV` ticks are
+      overwritten at once, so a full buffer does not evict/spill per tick)
+
+Evicted ticks are dropped, or appended to a raw binary file in `spill_dir`
+(read back with np.fromfile(path, dtype=TICK_DTYPE)).
+"""
+
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+TICK_DTYPE = np.dtype([
+    ('ts', '<i8'),       # nanoseconds since epoch
+    ('price', '<f8'),
+    ('bid', '<f8'),
+    ('ask', '<f8'),
+    ('volume', '<u4'),
+    ('side', 'u1'),      # 0 = BID, 1 = ASK, 2 = other
+])
+
+EVICT_BLOCK_DIV = 64  # A full buffer frees 1/64 of its capacity at a time
+
+SIDE_CODES = {'BID': 0, 'ASK': 1}
+SIDE_NAMES = np.array(['BID', 'ASK', ''], dtype=object)
+
+
+class TickRing:
+    """
+    Ring buffer of ticks with a retention policy.
+
+    Args:
+        capacity: maximum number of ticks kept in memory
+        retention: ('candles', N), ('time', pandas timedelta) or None
+        interval: candle length used by the 'candles' policy
+        spill_dir: directory for evicted ticks (None = drop them)
+    """
+
+    def __init__(self, capacity=1_000_000, retention=None, interval='1min', spill_dir=None):
+        self.capacity = int(capacity)
+        self.evict_block = max(1, self.capacity // EVICT_BLOCK_DIV)
+        self.records = np.zeros(self.capacity, dtype=TICK_DTYPE)
+        self.interval_ns = pd.Timedelta(interval).value
+        self.retention = self._parse_retention(retention)
+        self.spill_dir = spill_dir
+        self.spill_path = None
+        self._spill_file = None
+        self.head = 0  # Oldest retained tick
+        self.size = 0
+        self.received = 0
+        self.evicted = 0
+        self.spilled = 0
+        self.last_ts = None
+
+    def _parse_retention(self, retention):
+        if retention is None:
+            return None
+        kind, value = retention
+        if kind == 'candles':
+            return kind, int(value)
+        if kind == 'time':
+            return kind, pd.Timedelta(value).value
+        raise ValueError(f"Unknown retention policy: {kind!r} (use 'candles' or 'time')")
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self):
+        """Bytes allocated by the buffer (fixed for the whole session)"""
+        return self.records.nbytes
+
+    def _cutoff(self):
+        """Oldest timestamp (ns) the retention policy keeps, or None"""
+        if self.retention is None or self.last_ts is None:
+            return None
+        kind, value = self.retention
+        if kind == 'candles':
+            current = self.last_ts - self.last_ts % self.interval_ns
+            return current - (value - 1) * self.interval_ns
+        return self.last_ts - value
+
+    def _positions(self, start, count):
+        """Buffer positions of `count` ticks starting `start` ticks after head"""
+        return (self.head + start + np.arange(count)) % self.capacity
+
+    def _evict(self, count):
+        if count <= 0:
+            return
+        if self.spill_dir is not None:
+            self._spill(self._positions(0, count))
+        self.head = (self.head + count) % self.capacity
+        self.size -= count
+        self.evicted += count
+
+    def _spill(self, pos):
+        if self._spill_file is None:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            self.spill_path = os.path.join(
+                self.spill_dir, f'ticks_{datetime.now().strftime("%Y%m%d_%H%M%S_%f")}.bin')
+            self._spill_file = open(self.spill_path, 'ab')
+        self._spill_file.write(self.records[pos].tobytes())
+        self.spilled += len(pos)
+
+    def close(self):
+        """Flush and close the spill file (the next eviction opens a new one)"""
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+
+    def extend(self, ts, price, volume, side, bid=None, ask=None):
+        """
+        Append a batch of ticks (arrays of equal length).
+
+        Args:
+            ts: int64 nanoseconds
+            price, bid, ask: prices (bid/ask default to NaN)
+            volume: contracts
+            side: side codes (0 = BID, 1 = ASK)
+        """
+        ts = np.asarray(ts, dtype=np.int64)
+        n = len(ts)
+        if n == 0:
+            return
+        if n > self.capacity:
+            # Larger than the buffer: write it in capacity-sized chunks (older chunks get evicted/spilled)
+            price, volume, side = np.asarray(price), np.asarray(volume), np.asarray(side)
+            for i in range(0, n, self.capacity):
+                sl = slice(i, i + self.capacity)
+                self.extend(ts[sl], price[sl], volume[sl], side[sl],
+                            None if bid is None else np.asarray(bid)[sl],
+                            None if ask is None else np.asarray(ask)[sl])
+            return
+
+        # Make room, then write the batch after the newest tick
+        overflow = self.size + n - self.capacity
+        if overflow > 0:
+            self._evict(min(self.size, max(overflow, self.evict_block)))
+        pos = self._positions(self.size, n)
+        rec = self.records
+        rec['ts'][pos] = ts
+        rec['price'][pos] = price
+        rec['bid'][pos] = np.nan if bid is None else bid
+        rec['ask'][pos] = np.nan if ask is None else ask
+        rec['volume'][pos] = volume
+        rec['side'][pos] = side
+        self._written(n, int(ts.max()))
+
+    def append(self, ts, price, volume, side, bid=np.nan, ask=np.nan):
+        """Append one tick (side as 'BID'/'ASK' or code)"""
+        if isinstance(side, str):
+            side = SIDE_CODES.get(side, 2)
+        if self.size == self.capacity:
+            self._evict(self.evict_block)
+        self.records[(self.head + self.size) % self.capacity] = (ts, price, bid, ask, volume, side)
+        self._written(1, int(ts))
+
+    def _written(self, n, newest_ts):
+        """Bookkeeping after n ticks were written, then apply the retention window"""
+        self.size += n
+        self.received += n
+        if self.last_ts is None or newest_ts > self.last_ts:
+            self.last_ts = newest_ts
+
+        cutoff = self._cutoff()
+        if cutoff is not None and self.records['ts'][self.head] < cutoff:
+            self._evict(self._count_before(cutoff))
+
+    def _count_before(self, cutoff):
+        """
+        Leading run of retained ticks (from head) older than cutoff. Eviction
+        stops at the first tick the window keeps, so a late out-of-order tick
+        never pushes out newer ticks that are still inside the window.
+        """
+        first = min(self.size, self.capacity - self.head)  # Contiguous run from head
+        ts = self.records['ts']
+        count = 0
+        for segment in (ts[self.head:self.head + first], ts[:self.size - first]):
+            keep = segment >= cutoff
+            if keep.any():
+                return count + int(np.argmax(keep))
+            count += len(segment)
+        return count
+
+    def since(self, received_mark, limit=None):
+        """
+        Ticks appended after `received` was received_mark (those still retained),
+        oldest first, as a copy of the structured records.
+
+        Args:
+            received_mark: value of `received` at the previous call
+            limit: return only the newest `limit` of them
+        """
+        count = min(max(self.received - received_mark, 0), self.size)
+        if limit is not None:
+            count = min(count, limit)
+        return self.records[self._positions(self.size - count, count)]
+
+    def clear(self):
+        self.close()
+        self.head = 0
+        self.size = 0
+        self.received = 0
+        self.evicted = 0
+        self.spilled = 0
+        self.last_ts = None
+        self.spill_path = None
+
+    def to_frame(self):
+        """Retained ticks in arrival order (Timestamp, Precio, Volumen, Lado, Bid, Ask)"""
+        pos = self._positions(0, self.size)
+        rec = self.records[pos]
+        return pd.DataFrame({
+            'Timestamp': pd.to_datetime(rec['ts']),
+            'Precio': rec['price'],
+            'Volumen': rec['volume'].astype(np.int64),
+            'Lado': SIDE_NAMES[np.minimum(rec['side'], 2)],
+            'Bid': rec['bid'],
+            'Ask': rec['ask'],
+        })
+
+    def stats(self):
+        """Counters and memory usage for /stats"""
+        if self._spill_file is not None:
+            self._spill_file.flush()
+        return {
+            'ticks_received': self.received,
+            'ticks_retained': self.size,
+            'ticks_evicted': self.evicted,
+            'ticks_spilled': self.spilled,
+            'capacity': self.capacity,
+            'buffer_bytes': self.nbytes,
+            'buffer_used_bytes': self.size * TICK_DTYPE.itemsize,
+            'spill_file': self.spill_path,
+        }
+
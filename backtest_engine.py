@@ -0,0 +1,537 @@
+"""
+Event-driven backtest core shared by the strategy scripts.
+
+Every strategy (strat_OM_1..3, strat_OM_4_absortion) used to walk its
+DataFrame with iterrows() and repeat the same TP/SL/EOD bookkeeping. Here the
+bookkeeping lives once; a strategy only builds its signal arrays:
+
+    prices        float64 [n]   price of each row (tick / time bin)
+    long_signal   bool    [n]   open LONG on this row
+    short_signal  bool    [n]   open SHORT on this row (ignored where long_signal)
+    entry_price   float64 [n]   optional fill price of entries (default: prices)
+    active        bool    [n]   optional rows the engine looks at (others are skipped)
+
+Brackets are fixed, so the exit of every possible entry is resolved up front
+with a first-touch search (FirstTouch: sparse table of block maxima) instead
+of stepping through every tick; only the signal rows are walked in Python to
+decide which entries are taken. The ledger is columnar (one array per field)
+and converts to the tracking_record_*.csv columns with TradeLedger.to_frame().
+
+Usage:
+    from backtest_engine import run_backtest
+    ledger = run_backtest(df['TimeBin'], df['Precio'], df['bid_abs'], df['ask_abs'],
+                          tp_points=2.0, sl_points=2.0, eod_time=time(16, 0))
+    trades_df = ledger.to_frame(extra={'atr_entry': df['atr']})
+
+    # Every (TP, SL) pair against the same ticks: one row of stats per cell
+    table = sweep_brackets(df['TimeBin'], df['Precio'], df['bid_abs'], df['ask_abs'],
+                           tp_grid=[1.0, 2.0, 3.0], sl_grid=[1.0, 2.0])
+
+    python backtest_engine.py [n_rows] [signal_every]   # benchmark on a synthetic random walk
+"""
+
+import heapq
+import sys
+import time
+from datetime import time as dtime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Exit reason codes stored in the ledger
+TARGET, STOP, EOD, END_OF_DATA = 0, 1, 2, 3
+DEFAULT_LABELS = {TARGET: 'TARGET', STOP: 'STOP', EOD: 'EOD', END_OF_DATA: 'END_OF_DATA'}
+
+
+class TradeLedger:
+    """Closed trades as parallel arrays, in the order they were closed."""
+
+    def __init__(self, times, entry_idx, exit_idx, side, entry_price, exit_price, tp_price, sl_price,
+                 reason, point_value=20.0, contracts=1):
+        self.times = times
+        self.entry_idx = entry_idx
+        self.exit_idx = exit_idx
+        self.side = side  # +1 = LONG, -1 = SHORT
+        self.entry_price = entry_price
+        self.exit_price = exit_price
+        self.tp_price = tp_price
+        self.sl_price = sl_price
+        self.reason = reason
+        self.point_value = point_value
+        self.contracts = contracts
+
+    def __len__(self) -> int:
+        return len(self.entry_idx)
+
+    def _points(self) -> np.ndarray:
+        return np.where(self.side > 0, self.exit_price - self.entry_price, self.entry_price - self.exit_price)
+
+    @property
+    def profit_points(self) -> np.ndarray:
+        return np.round(self._points(), 2)
+
+    @property
+    def profit_dollars(self) -> np.ndarray:
+        return np.round(self._points() * self.point_value * self.contracts, 2)
+
+    def to_frame(self, reason_column='resultado', labels=None, extra=None, columns=None) -> pd.DataFrame:
+        """
+        Trade ledger as a tracking_record DataFrame.
+
+        Args:
+            reason_column: name of the exit reason column ('resultado' / 'exit_reason')
+            labels: {reason code: label} overrides of DEFAULT_LABELS
+            extra: {column: per-row array (taken at the entry row) or scalar}
+            columns: output column order (default: base columns with `extra`
+                     inserted after sl_price)
+        """
+        names = {**DEFAULT_LABELS, **(labels or {})}
+        label_array = np.array([names[code] for code in sorted(names)], dtype=object)
+
+        data = {
+            'entry_time': self.times[self.entry_idx],
+            'entry_price': self.entry_price,
+            'exit_time': self.times[self.exit_idx],
+            'exit_price': self.exit_price,
+            'side': np.where(self.side > 0, 'LONG', 'SHORT').astype(object),
+            'tp_price': self.tp_price,
+            'sl_price': self.sl_price,
+        }
+        extra_columns = []
+        for name, values in (extra or {}).items():
+            if np.ndim(values) == 0:
+                data[name] = np.full(len(self), values, dtype=object if isinstance(values, str) else None)
+            else:
+                data[name] = np.asarray(values)[self.entry_idx]
+            extra_columns.append(name)
+        data[reason_column] = label_array[self.reason]
+        data['profit_points'] = self.profit_points
+        data['profit_dollars'] = self.profit_dollars
+        data['contracts'] = np.full(len(self), self.contracts)
+
+        if columns is None:
+            columns = ['entry_time', 'entry_price', 'exit_time', 'exit_price', 'side', 'tp_price', 'sl_price',
+                       *extra_columns, reason_column, 'profit_points', 'profit_dollars', 'contracts']
+        return pd.DataFrame({name: data[name] for name in columns})
+
+
+TOUCH_BLOCK = 32  # Ticks per block of the first-touch sparse table
+
+
+class FirstTouch:
+    """
+    First index j >= start with values[j] >= level, for many (start, level) queries at once.
+
+    Values are cut into blocks of `block` ticks; a sparse table holds the max of
+    2^k consecutive blocks. A query scans the rest of its start block, then
+    skips whole block runs whose max stays below the level (binary lifting
+    over the table) and scans the block where the level is first reached:
+    O(block + log n) per query, vectorized over all queries.
+    """
+
+    def __init__(self, values, block: int = TOUCH_BLOCK):
+        values = np.asarray(values, dtype=np.float64)
+        self.n = len(values)
+        self.block = block
+        n_blocks = max(1, -(-self.n // block))
+        padded = np.full(n_blocks * block, -np.inf)
+        padded[:self.n] = np.where(np.isnan(values), -np.inf, values)
+        self.blocks = padded.reshape(n_blocks, block)
+        self.table = [self.blocks.max(axis=1)]  # table[k][b] = max of blocks [b, b + 2^k)
+        while 2 ** len(self.table) <= n_blocks:
+            prev, half = self.table[-1], 2 ** (len(self.table) - 1)
+            self.table.append(np.maximum(prev[:-half], prev[half:]))
+
+    def query(self, start, level) -> np.ndarray:
+        """First index at or after each start reaching its level (n = never)."""
+        start = np.asarray(start, dtype=np.int64)
+        level = np.asarray(level, dtype=np.float64)
+        result = np.full(len(start), self.n, dtype=np.int64)
+        todo = (start < self.n) & ~np.isnan(level)  # A NaN level is never reached
+        if not todo.any():
+            return result
+        n_blocks, block = len(self.blocks), self.block
+        offsets = np.arange(block)
+
+        # 1. Rest of the start block
+        q = np.flatnonzero(todo)
+        b0 = start[q] // block
+        hit = (self.blocks[b0] >= level[q, None]) & (offsets >= (start[q] % block)[:, None])
+        found = hit.any(axis=1)
+        result[q[found]] = b0[found] * block + hit[found].argmax(axis=1)
+
+        # 2. First later block whose max reaches the level
+        q, lvl = q[~found], level[q[~found]]
+        cur = b0[~found] + 1
+        for k in range(len(self.table) - 1, -1, -1):
+            span = 2 ** k
+            ok = cur + span <= n_blocks
+            ok[ok] = self.table[k][cur[ok]] < lvl[ok]
+            cur[ok] += span
+
+        # 3. Position inside that block
+        inside = cur < n_blocks
+        q, cur, lvl = q[inside], cur[inside], lvl[inside]
+        result[q] = cur * block + (self.blocks[cur] >= lvl[:, None]).argmax(axis=1)
+        return result
+
+
+def _time_of_day_ns(times: pd.DatetimeIndex) -> np.ndarray:
+    return np.asarray(times - times.normalize(), dtype='timedelta64[ns]').view(np.int64)
+
+
+def _prepare(times, prices, long_signal, short_signal, entry_price, active, eod_time):
+    """Common array setup of run_backtest / _run_backtest_stepwise."""
+    times = pd.DatetimeIndex(times)
+    px = np.asarray(prices, dtype=np.float64)
+    n = len(px)
+    is_long = np.asarray(long_signal, dtype=bool)
+    is_short = np.asarray(short_signal, dtype=bool) & ~is_long
+    fill = px if entry_price is None else np.asarray(entry_price, dtype=np.float64)
+    act = np.ones(n, dtype=bool) if active is None else np.asarray(active, dtype=bool)
+    after_eod = None
+    if eod_time is not None:
+        eod_ns = ((eod_time.hour * 60 + eod_time.minute) * 60 + eod_time.second) * 10**9 + eod_time.microsecond * 1000
+        after_eod = _time_of_day_ns(times) >= eod_ns
+    return times, px, is_long, is_short, fill, act, after_eod
+
+
+class ExitResolver:
+    """
+    First-touch tables of one price stream, built once and reused for any bracket.
+
+    The exit of an entry (if it were the only open position) is the first active
+    row after it that is at/after EOD or touches tp_price / sl_price; on the same
+    row EOD wins over TARGET and TARGET over STOP, as in the stepwise loop.
+    """
+
+    def __init__(self, prices, active=None, after_eod=None):
+        self.px = np.asarray(prices, dtype=np.float64)
+        self.n = len(self.px)
+        act = np.ones(self.n, dtype=bool) if active is None else np.asarray(active, dtype=bool)
+        # Inactive rows can never trigger an exit
+        self.up = FirstTouch(np.where(act, self.px, -np.inf))     # price >= level
+        self.down = FirstTouch(np.where(act, -self.px, -np.inf))  # price <= level
+        self.eod_rows = None
+        if after_eod is not None:
+            self.eod_rows = np.append(np.flatnonzero(np.asarray(after_eod, dtype=bool) & act), self.n)
+
+    def touch(self, entry_rows, side, level, target: bool) -> np.ndarray:
+        """First row after each entry where a target (or stop) level is touched (n = never)."""
+        after = np.asarray(entry_rows, dtype=np.int64) + 1
+        level = np.asarray(level, dtype=np.float64)
+        rising = (np.asarray(side) > 0) == target  # LONG target / SHORT stop: price >= level
+        return np.where(rising, self.up.query(after, level), self.down.query(after, -level))
+
+    def eod_row(self, entry_rows) -> np.ndarray:
+        entry_rows = np.asarray(entry_rows, dtype=np.int64)
+        if self.eod_rows is None:
+            return np.full(len(entry_rows), self.n, dtype=np.int64)
+        return self.eod_rows[np.searchsorted(self.eod_rows[:-1], entry_rows + 1)]
+
+    def combine(self, tp_row, sl_row, eod_row, tp_price, sl_price):
+        """
+        Returns:
+            (exit_row, exit_price, reason): exit_row = n when the position is
+            never closed (exit_price NaN, reason END_OF_DATA).
+        """
+        n = self.n
+        exit_row = np.minimum(np.minimum(tp_row, sl_row), eod_row)
+        reason = np.select([exit_row == n, eod_row == exit_row, tp_row == exit_row], [END_OF_DATA, EOD, TARGET],
+                           STOP).astype(np.int8)
+        exit_price = np.select([reason == TARGET, reason == STOP, reason == EOD],
+                               [tp_price, sl_price, self.px[np.minimum(exit_row, n - 1)]], np.nan)
+        return exit_row, exit_price, reason
+
+    def resolve(self, entry_rows, side, tp_price, sl_price):
+        return self.combine(self.touch(entry_rows, side, tp_price, target=True),
+                            self.touch(entry_rows, side, sl_price, target=False),
+                            self.eod_row(entry_rows), tp_price, sl_price)
+
+
+def resolve_exits(prices, entry_rows, side, tp_price, sl_price, active=None, after_eod=None):
+    """Exit row, price and reason of each entry if it were the only open position (see ExitResolver)."""
+    return ExitResolver(prices, active, after_eod).resolve(entry_rows, side, tp_price, sl_price)
+
+
+def _take_entries(rows, exit_row, max_open: int, reenter_on_exit: bool) -> np.ndarray:
+    """Walk the signal rows only: an entry is taken when a slot is free (indices into rows)."""
+    taken = []
+    open_exits = []  # Min-heap of exit rows of the open positions
+    for k, (i, x) in enumerate(zip(rows.tolist(), exit_row.tolist())):
+        closed_here = False
+        while open_exits and open_exits[0] <= i:
+            closed_here |= heapq.heappop(open_exits) == i
+        if closed_here and not reenter_on_exit:
+            continue
+        if len(open_exits) < max_open:
+            heapq.heappush(open_exits, x)
+            taken.append(k)
+    return np.asarray(taken, dtype=np.int64)
+
+
+def _build_ledger(times, px, rows, side, entry_px, tp_px, sl_px, exit_row, exit_px, reason, taken,
+                  close_at_end, point_value, contracts) -> TradeLedger:
+    n = len(px)
+    exit_row, exit_px = exit_row[taken], exit_px[taken]
+
+    # Open at the end of the data: close on the last row or drop
+    still_open = exit_row == n
+    if close_at_end:
+        if still_open.any():
+            exit_row[still_open] = n - 1
+            exit_px[still_open] = px[n - 1]
+        keep = np.arange(len(taken))
+    else:
+        keep = np.flatnonzero(~still_open)
+
+    # Ledger in closing order (END_OF_DATA last), ties in entry order
+    keep = keep[np.lexsort((taken[keep], still_open[keep], exit_row[keep]))]
+    taken = taken[keep]
+    return TradeLedger(times, rows[taken], exit_row[keep], side[taken], entry_px[taken], exit_px[keep],
+                       tp_px[taken], sl_px[taken], reason[taken], point_value=point_value, contracts=contracts)
+
+
+def run_backtest(times, prices, long_signal, short_signal, tp_points: float, sl_points: float,
+                 entry_price=None, active=None, eod_time: dtime = None, max_open: int = 1,
+                 reenter_on_exit: bool = False, close_at_end: bool = True,
+                 point_value: float = 20.0, contracts: int = 1) -> TradeLedger:
+    """
+    Run the bracket (TP/SL) backtest over one price stream and its signals.
+
+    On each active row, in order:
+      1. With open positions: if the row is at/after `eod_time` all of them
+         close at the row price (EOD); otherwise each position closes at its
+         tp_price (TARGET, checked first) or sl_price (STOP) when touched.
+      2. If nothing closed on this row (or `reenter_on_exit`) and fewer than
+         `max_open` positions are open, a LONG (long_signal) or else a SHORT
+         (short_signal) opens at entry_price with fixed TP/SL distances.
+    Positions still open after the last row close there (END_OF_DATA) when
+    `close_at_end`.
+
+    With fixed brackets a position's exit does not depend on the others, so the
+    exit of every possible entry is resolved up front (ExitResolver) and only
+    the signal rows are walked to decide which entries are taken.
+
+    Args:
+        times: row timestamps (anything pd.DatetimeIndex accepts)
+        prices: row prices
+        long_signal, short_signal: bool per row
+        tp_points, sl_points: bracket distances in points
+        entry_price: fill price per row (default: prices)
+        active: bool per row; inactive rows are skipped entirely (default: all)
+        eod_time: time of day from which open positions are closed (None = never)
+    """
+    times, px, is_long, is_short, fill, act, after_eod = _prepare(
+        times, prices, long_signal, short_signal, entry_price, active, eod_time)
+
+    rows = np.flatnonzero((is_long | is_short) & act)
+    side = np.where(is_long[rows], 1, -1).astype(np.int8)
+    entry_px = fill[rows]
+    tp_px = entry_px + side * tp_points
+    sl_px = entry_px - side * sl_points
+    exit_row, exit_px, reason = ExitResolver(px, act, after_eod).resolve(rows, side, tp_px, sl_px)
+
+    taken = _take_entries(rows, exit_row, max_open, reenter_on_exit)
+    return _build_ledger(times, px, rows, side, entry_px, tp_px, sl_px, exit_row, exit_px, reason, taken,
+                         close_at_end, point_value, contracts)
+
+
+def ledger_stats(ledger: TradeLedger) -> dict:
+    """Summary of a ledger: trades, P&L, win rate, drawdown (same definitions as the strategy reports)."""
+    profit = ledger.profit_dollars
+    if len(profit) == 0:
+        return {'trades': 0, 'total_profit': 0.0, 'avg_profit': 0.0, 'win_rate': 0.0, 'profit_factor': 0.0,
+                'max_drawdown': 0.0, 'targets': 0, 'stops': 0, 'eods': 0}
+    equity = np.cumsum(profit)
+    gross_profit = profit[profit > 0].sum()
+    gross_loss = -profit[profit < 0].sum()
+    return {
+        'trades': len(profit),
+        'total_profit': round(float(profit.sum()), 2),
+        'avg_profit': round(float(profit.mean()), 2),
+        'win_rate': round(float((profit > 0).mean() * 100), 2),
+        'profit_factor': round(float(gross_profit / gross_loss), 2) if gross_loss > 0 else float('inf'),
+        'max_drawdown': round(float((equity - np.maximum.accumulate(equity)).min()), 2),
+        'targets': int((ledger.reason == TARGET).sum()),
+        'stops': int((ledger.reason == STOP).sum()),
+        'eods': int(np.isin(ledger.reason, (EOD, END_OF_DATA)).sum()),
+    }
+
+
+def sweep_brackets(times, prices, long_signal, short_signal, tp_grid, sl_grid,
+                   entry_price=None, active=None, eod_time: dtime = None, max_open: int = 1,
+                   reenter_on_exit: bool = False, close_at_end: bool = True,
+                   point_value: float = 20.0, contracts: int = 1) -> pd.DataFrame:
+    """
+    run_backtest for every (TP, SL) pair of the grid against the same tick arrays.
+
+    The first-touch tables are built once; the touch rows of every signal are
+    resolved once per TP value and once per SL value, and each grid cell only
+    combines them and walks the signal rows.
+
+    Returns:
+        One row per cell: tp_points, sl_points and the ledger_stats() columns
+        (long format, ready to pivot into a heatmap).
+    """
+    times, px, is_long, is_short, fill, act, after_eod = _prepare(
+        times, prices, long_signal, short_signal, entry_price, active, eod_time)
+
+    rows = np.flatnonzero((is_long | is_short) & act)
+    side = np.where(is_long[rows], 1, -1).astype(np.int8)
+    entry_px = fill[rows]
+    resolver = ExitResolver(px, act, after_eod)
+    eod_row = resolver.eod_row(rows)
+    tp_rows = {tp: resolver.touch(rows, side, entry_px + side * tp, target=True) for tp in tp_grid}
+    sl_rows = {sl: resolver.touch(rows, side, entry_px - side * sl, target=False) for sl in sl_grid}
+
+    results = []
+    for tp in tp_grid:
+        tp_px = entry_px + side * tp
+        for sl in sl_grid:
+            sl_px = entry_px - side * sl
+            exit_row, exit_px, reason = resolver.combine(tp_rows[tp], sl_rows[sl], eod_row, tp_px, sl_px)
+            taken = _take_entries(rows, exit_row, max_open, reenter_on_exit)
+            ledger = _build_ledger(times, px, rows, side, entry_px, tp_px, sl_px, exit_row, exit_px, reason,
+                                   taken, close_at_end, point_value, contracts)
+            results.append({'tp_points': tp, 'sl_points': sl, **ledger_stats(ledger)})
+    return pd.DataFrame(results)
+
+
+def save_sweep(table: pd.DataFrame, path) -> Path:
+    """Write a sweep table (';' separator, ',' decimal, like the tracking records)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    table.to_csv(path, sep=';', decimal=',', index=False)
+    return path
+
+
+def _run_backtest_stepwise(times, prices, long_signal, short_signal, tp_points: float, sl_points: float,
+                           entry_price=None, active=None, eod_time: dtime = None, max_open: int = 1,
+                           reenter_on_exit: bool = False, close_at_end: bool = True,
+                           point_value: float = 20.0, contracts: int = 1) -> TradeLedger:
+    """Reference tick-by-tick version of run_backtest (same arguments and ledger)."""
+    times, px, is_long, is_short, fill, act, after_eod = _prepare(
+        times, prices, long_signal, short_signal, entry_price, active, eod_time)
+    n = len(px)
+    if after_eod is not None:
+        after_eod = after_eod.tolist()
+
+    # Next active signal row at or after each row (n = none): lets the loop skip flat stretches
+    signal_rows = np.flatnonzero((is_long | is_short) & act)
+    next_signal = np.append(signal_rows, n)[np.searchsorted(signal_rows, np.arange(n))].tolist()
+
+    # Preallocated ledger: every trade starts on a signal row
+    cap = len(signal_rows)
+    entry_idx = np.empty(cap, dtype=np.int64)
+    exit_idx = np.empty(cap, dtype=np.int64)
+    side = np.empty(cap, dtype=np.int8)
+    entry_px = np.empty(cap)
+    exit_px = np.empty(cap)
+    tp_px = np.empty(cap)
+    sl_px = np.empty(cap)
+    reason = np.empty(cap, dtype=np.int8)
+    n_trades = 0
+
+    px_list, fill_list, act_list = px.tolist(), fill.tolist(), act.tolist()
+    long_list, short_list = is_long.tolist(), is_short.tolist()
+    open_positions = []  # [entry row, side, entry price, tp, sl]
+
+    i = 0
+    while i < n:
+        if not open_positions:
+            i = next_signal[i]
+            if i >= n:
+                break
+        elif not act_list[i]:
+            i += 1
+            continue
+
+        p = px_list[i]
+        if open_positions:
+            closed = []  # (position, exit price, reason)
+            if after_eod is not None and after_eod[i]:
+                closed = [(pos, p, EOD) for pos in open_positions]
+                open_positions = []
+            else:
+                still_open = []
+                for pos in open_positions:
+                    tp, sl = pos[3], pos[4]
+                    if pos[1] > 0:
+                        if p >= tp:
+                            closed.append((pos, tp, TARGET))
+                        elif p <= sl:
+                            closed.append((pos, sl, STOP))
+                        else:
+                            still_open.append(pos)
+                    else:
+                        if p <= tp:
+                            closed.append((pos, tp, TARGET))
+                        elif p >= sl:
+                            closed.append((pos, sl, STOP))
+                        else:
+                            still_open.append(pos)
+                open_positions = still_open
+
+            for pos, exit_price, code in closed:
+                entry_idx[n_trades], side[n_trades], entry_px[n_trades], tp_px[n_trades], sl_px[n_trades] = pos
+                exit_idx[n_trades] = i
+                exit_px[n_trades] = exit_price
+                reason[n_trades] = code
+                n_trades += 1
+            if closed and not reenter_on_exit:
+                i += 1
+                continue
+
+        if len(open_positions) < max_open:
+            if long_list[i]:
+                e = fill_list[i]
+                open_positions.append([i, 1, e, e + tp_points, e - sl_points])
+            elif short_list[i]:
+                e = fill_list[i]
+                open_positions.append([i, -1, e, e - tp_points, e + sl_points])
+        i += 1
+
+    if close_at_end and open_positions:
+        last = n - 1
+        for pos in open_positions:
+            entry_idx[n_trades], side[n_trades], entry_px[n_trades], tp_px[n_trades], sl_px[n_trades] = pos
+            exit_idx[n_trades] = last
+            exit_px[n_trades] = px_list[last]
+            reason[n_trades] = END_OF_DATA
+            n_trades += 1
+
+    return TradeLedger(times, entry_idx[:n_trades], exit_idx[:n_trades], side[:n_trades], entry_px[:n_trades],
+                       exit_px[:n_trades], tp_px[:n_trades], sl_px[:n_trades], reason[:n_trades],
+                       point_value=point_value, contracts=contracts)
+
+
+def benchmark(n_rows=1_000_000, signal_every=200, tp_points=2.0, sl_points=2.0, seed=0):
+    """Time the engine on a synthetic 0.25-tick random walk with random LONG/SHORT signals."""
+    rng = np.random.default_rng(seed)
+    times = pd.date_range('2025-10-20 09:30', periods=n_rows, freq='50ms')
+    prices = 25000 + np.cumsum(rng.choice([-0.25, 0.0, 0.25], size=n_rows))
+    signal = rng.random(n_rows) < 1 / signal_every
+    is_long = signal & (rng.random(n_rows) < 0.5)
+    args = (times, prices, is_long, signal & ~is_long, tp_points, sl_points)
+
+    start = time.perf_counter()
+    ledger = run_backtest(*args, eod_time=dtime(16, 0))
+    elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    reference = _run_backtest_stepwise(*args, eod_time=dtime(16, 0))
+    stepwise_sec = time.perf_counter() - start
+
+    trades = ledger.to_frame()
+    print(f"{n_rows:,} rows, {int(signal.sum()):,} signals -> {len(trades):,} trades")
+    print(f"  First-touch resolver  {elapsed:8.3f}s  ({n_rows / elapsed / 1e6:.1f}M rows/s)")
+    print(f"  Tick-by-tick loop     {stepwise_sec:8.3f}s")
+    print(f"  Ledger matches loop: {trades.equals(reference.to_frame())}")
+    print(trades['resultado'].value_counts().to_string())
+    return trades
+
+
+if __name__ == '__main__':
+    benchmark(n_rows=int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000,
+              signal_every=int(sys.argv[2]) if len(sys.argv) > 2 else 200)
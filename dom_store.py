@@ -0,0 +1,472 @@
+"""
+Binary order-book store for Time & Sales + DOM captures (`ts_and_dom_*.csv`).
+
+The CSV has one trade per row followed by two unquoted JSON maps with the
+book at that moment (`Timestamp,Price,Size,Side,{DOM_BID},{DOM_ASK}`, `,`
+separator, `.` decimal). It is converted once into a columnar file next to
+it (`ts_and_dom_2min.csv` -> `ts_and_dom_2min.dom`):
+
+    Timestamp     int64   [n]          nanoseconds since epoch (naive local time)
+    Price         int32   [n]          trade price in ticks (reference for the offsets)
+    Size          uint16  [n]          contracts
+    Side          uint8   [n]          side code (0 = BID, 1 = ASK)
+
+Consecutive books repeat almost every level, so the book is delta-encoded:
+a full keyframe every K rows (rows 0, K, 2K, ...) and, for the other rows,
+only the levels that changed against the previous row.
+
+    KeyBidCount   uint8   [nk]         levels present in DOM_BID at the keyframe
+    KeyBidOffset  int16   [nk, depth]  level price - trade price, in ticks
+    KeyBidSize    uint32  [nk, depth]  size per level (0 in unused slots)
+    KeyAsk*                            same for DOM_ASK
+    DeltaStart    int64   [n + 1]      deltas of row i: [DeltaStart[i], DeltaStart[i+1])
+    DeltaSide     uint8   [m]          0 = DOM_BID, 1 = DOM_ASK
+    DeltaOffset   int16   [m]          level price - trade price of the row, in ticks
+    DeltaSize     int32   [m]          new size, -1 = level removed from the map
+
+Any book is rebuilt by seeking to the keyframe at or before the row and
+applying at most K - 1 rows of deltas (sequential reads reuse the last book).
+
+File layout as in tick_store.py: 8-byte magic, uint32 header length, JSON
+header (rows, depth, keyframe interval, tick size, column dtypes/shapes/
+offsets), then one block per column aligned to 64 bytes. Columns are
+memory-mapped on open.
+
+Usage:
+    from dom_store import open_dom
+    dom = open_dom('data/ts_and_dom_2min.csv')
+    trades = dom.trades()                          # Timestamp, Price, Size, Side
+    bid_px, bid_sz, ask_px, ask_sz = dom.book_at('2025-10-20 18:09:00')
+
+    python dom_store.py data/ts_and_dom_2min.csv  # convert + report load times
+"""
+
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import tick_store
+from tick_store import DEFAULT_TICK_SIZE, SIDE_CODES, SIDE_NAMES, write_column_file
+
+MAGIC = b'DOMSTOR2'
+STORE_SUFFIX = '.dom'
+KEYFRAME_INTERVAL = 64  # Rows between full book keyframes
+
+TRADE_DTYPES = {
+    'Timestamp': np.dtype('<i8'),
+    'Price': np.dtype('<i4'),
+    'Size': np.dtype('<u2'),
+    'Side': np.dtype('u1'),
+}
+KEY_DTYPES = {
+    'Count': np.dtype('u1'),
+    'Offset': np.dtype('<i2'),
+    'Size': np.dtype('<u4'),
+}
+DELTA_DTYPES = {
+    'DeltaStart': np.dtype('<i8'),
+    'DeltaSide': np.dtype('u1'),
+    'DeltaOffset': np.dtype('<i2'),
+    'DeltaSize': np.dtype('<i4'),
+}
+
+# Characters that separate numbers inside a DOM map: {"25313.5": 6, "25313.25": 5}
+_DOM_SEPARATORS = str.maketrans({'{': ' ', '}': ' ', '"': ' ', ':': ' ', ',': ' '})
+
+
+def store_path_for(csv_path):
+    """Path of the binary DOM store that belongs to a CSV file."""
+    return Path(csv_path).with_suffix(STORE_SUFFIX)
+
+
+def parse_dom_csv(csv_path, verbose=True):
+    """
+    Fast parser for `ts_and_dom_*.csv` (no json.loads).
+
+    Each line is split on the first 4 commas; the two maps are separated at
+    '},{' and flattened into alternating price/size tokens, converted to
+    arrays in one step for the whole file.
+
+    Returns:
+        dict with 'Timestamp' (datetime64[ns]), 'Price' (float), 'Size' (int),
+        'Side' (str) per row, and for 'Bid' / 'Ask': 'count' [n], 'price' and
+        'size' (flat arrays of all levels in map order).
+    """
+    timestamps, prices, sizes, sides = [], [], [], []
+    tokens = {'Bid': [], 'Ask': []}
+    counts = {'Bid': [], 'Ask': []}
+
+    with open(csv_path, 'r') as f:
+        f.readline()  # Skip header
+        for line_no, line in enumerate(f, start=2):
+            parts = line.rstrip('\n').split(',', 4)
+            if len(parts) < 5:
+                continue
+            rest = parts[4]
+            cut = rest.find('},{')
+            if cut < 0:
+                if verbose:
+                    print(f"Warning: line {line_no} has no DOM_BID/DOM_ASK pair, skipping")
+                continue
+            bid_tokens = rest[:cut + 1].translate(_DOM_SEPARATORS).split()
+            ask_tokens = rest[cut + 2:].translate(_DOM_SEPARATORS).split()
+            if len(bid_tokens) % 2 or len(ask_tokens) % 2:
+                if verbose:
+                    print(f"Warning: line {line_no} has a malformed DOM map, skipping")
+                continue
+
+            timestamps.append(parts[0])
+            prices.append(parts[1])
+            sizes.append(parts[2])
+            sides.append(parts[3])
+            tokens['Bid'] += bid_tokens
+            tokens['Ask'] += ask_tokens
+            counts['Bid'].append(len(bid_tokens) // 2)
+            counts['Ask'].append(len(ask_tokens) // 2)
+
+    parsed = {
+        'Timestamp': pd.to_datetime(pd.Series(timestamps, dtype=object)).to_numpy().astype('datetime64[ns]'),
+        'Price': np.array(prices, dtype=np.float64),
+        'Size': np.array(sizes, dtype=np.int64),
+        'Side': np.array(sides, dtype=object),
+    }
+    for book in ('Bid', 'Ask'):
+        values = np.array(tokens[book], dtype=np.float64).reshape(-1, 2)
+        parsed[book] = {
+            'count': np.array(counts[book], dtype=np.int64),
+            'price': values[:, 0],
+            'size': values[:, 1].astype(np.int64),
+        }
+    return parsed
+
+
+def _check_offsets(rel):
+    if len(rel) and (rel.min() < np.iinfo(np.int16).min or rel.max() > np.iinfo(np.int16).max):
+        raise ValueError("DOM level offsets do not fit in int16 ticks")
+
+
+def _keyframes(count, level_ticks, level_size, ref_ticks, depth, key_rows):
+    """Full books of the keyframe rows as [nk, depth] count/offset/size arrays."""
+    row = np.repeat(np.arange(len(count)), count)
+    slot = np.arange(len(row)) - np.repeat(np.cumsum(count) - count, count)
+    key_index = np.full(len(count), -1)
+    key_index[key_rows] = np.arange(len(key_rows))
+    keep = key_index[row] >= 0
+
+    offsets = np.zeros((len(key_rows), depth), dtype=np.int16)
+    sizes = np.zeros((len(key_rows), depth), dtype=np.uint32)
+    rel = level_ticks[keep] - ref_ticks[row[keep]]
+    _check_offsets(rel)
+    offsets[key_index[row[keep]], slot[keep]] = rel
+    sizes[key_index[row[keep]], slot[keep]] = level_size[keep]
+    return count[key_rows], offsets, sizes
+
+
+def _deltas(count, level_ticks, level_size, is_key):
+    """
+    Level changes of every non-keyframe row against the previous row.
+
+    Returns (row, level ticks, new size or -1) sorted by row, computed by
+    matching the (row, price) levels of each book with those of the book
+    before it (shifted one row forward).
+    """
+    n = len(count)
+    row = np.repeat(np.arange(n), count)
+    cur = ~is_key[row]
+    prev = row + 1 < n
+    prev[prev] = ~is_key[row[prev] + 1]
+
+    # Current levels (tag 0) and previous-row levels moved to the next row (tag 1)
+    rows = np.concatenate([row[cur], row[prev] + 1])
+    ticks = np.concatenate([level_ticks[cur], level_ticks[prev]])
+    sizes = np.concatenate([level_size[cur], level_size[prev]])
+    tags = np.concatenate([np.zeros(cur.sum(), dtype=np.int8), np.ones(prev.sum(), dtype=np.int8)])
+    order = np.lexsort((tags, ticks, rows))
+    rows, ticks, sizes, tags = rows[order], ticks[order], sizes[order], tags[order]
+
+    same_next = np.append((rows[1:] == rows[:-1]) & (ticks[1:] == ticks[:-1]), False)
+    same_prev = np.append(False, same_next[:-1])
+    paired_cur = (tags == 0) & same_next  # Level in both books: the next entry is its previous size
+    changed = (tags == 0) & ~(paired_cur & (sizes == np.append(sizes[1:], 0)))
+    removed = (tags == 1) & ~same_prev
+
+    emit = changed | removed
+    out_sizes = np.where(removed, -1, sizes)[emit]
+    return rows[emit], ticks[emit], out_sizes
+
+
+def write_store(parsed, store_path, tick_size=DEFAULT_TICK_SIZE, source=None,
+                keyframe_interval=KEYFRAME_INTERVAL):
+    """Write a parsed DOM capture to the binary store (keyframes + deltas)."""
+    n_rows = len(parsed['Timestamp'])
+    side = pd.Series(parsed['Side']).astype(str).str.strip().str.upper()
+    unknown = set(side.unique()) - set(SIDE_CODES)
+    if unknown:
+        raise ValueError(f"Unknown side values in Side: {sorted(unknown)}")
+    if n_rows and (parsed['Size'].min() < 0 or parsed['Size'].max() > np.iinfo(np.uint16).max):
+        raise ValueError("Column Size does not fit in uint16")
+
+    ref_ticks = np.rint(parsed['Price'] / tick_size).astype(np.int64)
+    depth = max([1] + [int(parsed[b]['count'].max()) for b in ('Bid', 'Ask') if n_rows])
+    if depth > np.iinfo(np.uint8).max:
+        raise ValueError(f"DOM depth {depth} does not fit in uint8 counts")
+
+    key_rows = np.arange(0, n_rows, keyframe_interval)
+    is_key = np.zeros(n_rows, dtype=bool)
+    is_key[key_rows] = True
+
+    arrays = {
+        'Timestamp': parsed['Timestamp'].astype('datetime64[ns]').view(np.int64),
+        'Price': ref_ticks.astype(np.int32),
+        'Size': parsed['Size'].astype(np.uint16),
+        'Side': side.map(SIDE_CODES).to_numpy().astype(np.uint8),
+    }
+    dtypes = dict(TRADE_DTYPES)
+    delta_parts = []
+    for side_code, book in enumerate(('Bid', 'Ask')):
+        count = parsed[book]['count']
+        level_ticks = np.rint(parsed[book]['price'] / tick_size).astype(np.int64)
+        if not np.allclose(level_ticks * tick_size, parsed[book]['price']):
+            raise ValueError(f"DOM_{book.upper()} has prices that are not multiples of tick_size={tick_size}")
+        key_count, key_offsets, key_sizes = _keyframes(count, level_ticks, parsed[book]['size'],
+                                                       ref_ticks, depth, key_rows)
+        arrays[f'Key{book}Count'] = key_count.astype(np.uint8)
+        arrays[f'Key{book}Offset'] = key_offsets
+        arrays[f'Key{book}Size'] = key_sizes
+        for name, dtype in KEY_DTYPES.items():
+            dtypes[f'Key{book}{name}'] = dtype
+
+        d_rows, d_ticks, d_sizes = _deltas(count, level_ticks, parsed[book]['size'], is_key)
+        delta_parts.append((d_rows, np.full(len(d_rows), side_code), d_ticks, d_sizes))
+
+    # Deltas of both sides grouped by row (BID first within a row)
+    d_rows, d_side, d_ticks, d_sizes = (np.concatenate(c) for c in zip(*delta_parts))
+    order = np.argsort(d_rows, kind='stable')
+    d_rows, d_side, d_ticks, d_sizes = d_rows[order], d_side[order], d_ticks[order], d_sizes[order]
+    rel = d_ticks - ref_ticks[d_rows]
+    _check_offsets(rel)
+    arrays['DeltaStart'] = np.searchsorted(d_rows, np.arange(n_rows + 1)).astype(np.int64)
+    arrays['DeltaSide'] = d_side.astype(np.uint8)
+    arrays['DeltaOffset'] = rel.astype(np.int16)
+    arrays['DeltaSize'] = d_sizes.astype(np.int32)
+    dtypes.update(DELTA_DTYPES)
+
+    return write_column_file(
+        store_path, {name: np.asarray(arrays[name], dtype=dtype) for name, dtype in dtypes.items()},
+        magic=MAGIC, n_rows=n_rows, depth=depth, keyframe_interval=keyframe_interval,
+        n_deltas=len(d_rows), tick_size=tick_size, source=str(source) if source is not None else None)
+
+
+def read_header(store_path):
+    """Read the JSON header of a DOM store."""
+    return tick_store.read_header(store_path, magic=MAGIC, kind='DOM store')
+
+
+def convert_csv(csv_path, store_path=None, tick_size=DEFAULT_TICK_SIZE):
+    """Convert a ts_and_dom CSV into its binary store. Returns the store path."""
+    store_path = store_path_for(csv_path) if store_path is None else Path(store_path)
+    parsed = parse_dom_csv(csv_path)
+    return write_store(parsed, store_path, tick_size=tick_size, source=Path(csv_path).name)
+
+
+def _store_is_fresh(csv_path, store_path):
+    if not store_path.exists():
+        return False
+    with open(store_path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            return False  # Older layout: rebuild
+    if not Path(csv_path).exists():
+        return True
+    return store_path.stat().st_mtime >= Path(csv_path).stat().st_mtime
+
+
+class DomStore:
+    """
+    Read-only view of a DOM store (memory-mapped columns).
+
+    Indexing a DomStore returns the book of a row as ({price_str: size}, ...)
+    dicts with the same keys as the JSON maps, so it can stand in for the
+    parsed DOM_BID / DOM_ASK of plot_dom.py.
+    """
+
+    def __init__(self, store_path):
+        self.path = Path(store_path)
+        self.header = read_header(self.path)
+        self.tick_size = self.header['tick_size']
+        self.depth = self.header['depth']
+        self.columns = {}
+        for name, col in self.header['columns'].items():
+            dtype = np.dtype(col['dtype'])
+            shape = tuple(col['shape'])
+            if np.prod(shape) == 0:
+                self.columns[name] = np.empty(shape, dtype=dtype)
+                continue
+            self.columns[name] = np.memmap(self.path, dtype=dtype, mode='r',
+                                           offset=self.header['data_start'] + col['offset'], shape=shape)
+        self.timestamps = self.columns['Timestamp']
+        self._cache = None  # (row, (bid, ask)) of the last rebuilt book
+
+    def __len__(self):
+        return self.header['n_rows']
+
+    def trades(self):
+        """Trades with the CSV schema (Timestamp, Price, Size, Side)."""
+        c = self.columns
+        return pd.DataFrame({
+            'Timestamp': np.asarray(c['Timestamp']).view('datetime64[ns]'),
+            'Price': c['Price'] * self.tick_size,
+            'Size': c['Size'].astype(np.int64),
+            'Side': SIDE_NAMES[c['Side']],
+        })
+
+    def row_at(self, timestamp):
+        """Row of the latest book at or before timestamp (-1 if none)."""
+        ts = pd.Timestamp(timestamp).value if not isinstance(timestamp, (int, np.integer)) else int(timestamp)
+        return int(np.searchsorted(self.timestamps, ts, side='right')) - 1
+
+    def _levels(self, i):
+        """{ticks: size} per side of row i: nearest keyframe + deltas (or the cached previous book)."""
+        c = self.columns
+        interval = self.header['keyframe_interval']
+        key_row = i - i % interval
+        cached = self._cache
+        if cached is not None and key_row <= cached[0] <= i:
+            row, levels = cached[0], (dict(cached[1][0]), dict(cached[1][1]))
+        else:
+            k = i // interval
+            ref = int(c['Price'][key_row])
+            levels = ()
+            for book in ('Bid', 'Ask'):
+                n = int(c[f'Key{book}Count'][k])
+                ticks = (ref + c[f'Key{book}Offset'][k, :n].astype(np.int64)).tolist()
+                levels += (dict(zip(ticks, c[f'Key{book}Size'][k, :n].tolist())),)
+            row = key_row
+
+        if row < i:
+            start, end = int(c['DeltaStart'][row + 1]), int(c['DeltaStart'][i + 1])
+            d_rows = np.searchsorted(c['DeltaStart'][row + 1:i + 2], np.arange(start, end), side='right') + row
+            d_ticks = c['Price'][d_rows].astype(np.int64) + c['DeltaOffset'][start:end]
+            for side, tick, size in zip(c['DeltaSide'][start:end].tolist(), d_ticks.tolist(),
+                                        c['DeltaSize'][start:end].tolist()):
+                if size < 0:
+                    levels[side].pop(tick, None)
+                else:
+                    levels[side][tick] = size
+
+        self._cache = (i, levels)
+        return levels
+
+    def book(self, i):
+        """(bid_prices, bid_sizes, ask_prices, ask_sizes) of row i (bids high->low, asks low->high)."""
+        bid, ask = self._levels(i)
+        bid_ticks = np.array(sorted(bid, reverse=True), dtype=np.int64)
+        ask_ticks = np.array(sorted(ask), dtype=np.int64)
+        return (bid_ticks * self.tick_size, np.array([bid[t] for t in bid_ticks.tolist()], dtype=np.int64),
+                ask_ticks * self.tick_size, np.array([ask[t] for t in ask_ticks.tolist()], dtype=np.int64))
+
+    def book_at(self, timestamp):
+        """Order book at a timestamp (latest row at or before it); empty arrays if none."""
+        i = self.row_at(timestamp)
+        if i < 0:
+            empty = np.zeros(0)
+            return empty, empty.astype(np.int64), empty, empty.astype(np.int64)
+        return self.book(i)
+
+    def __getitem__(self, i):
+        bid_px, bid_sz, ask_px, ask_sz = self.book(i)
+        return (dict(zip(map(str, bid_px.tolist()), bid_sz.tolist())),
+                dict(zip(map(str, ask_px.tolist()), ask_sz.tolist())))
+
+
+def open_dom(path, tick_size=DEFAULT_TICK_SIZE, build=True, verbose=True):
+    """
+    Open the DOM store of a ts_and_dom CSV, building it when missing or stale.
+
+    Args:
+        path: CSV path or `.dom` store path
+        tick_size: tick size used when the store has to be built
+        build: build/refresh the store from the CSV when missing or stale
+        verbose: print load source and load time
+    """
+    path = Path(path)
+    store_path = path if path.suffix == STORE_SUFFIX else store_path_for(path)
+
+    start = time.perf_counter()
+    if not _store_is_fresh(path, store_path):
+        if not build:
+            raise FileNotFoundError(f"No existe DOM store actualizado: {store_path}")
+        convert_csv(path, store_path, tick_size=tick_size)
+        if verbose:
+            print(f"  DOM store creado: {store_path} ({time.perf_counter() - start:.2f}s)")
+        start = time.perf_counter()
+
+    dom = DomStore(store_path)
+    if verbose:
+        print(f"  DOM: {store_path} ({len(dom):,} filas, depth {dom.depth}, "
+              f"{time.perf_counter() - start:.3f}s)")
+    return dom
+
+
+def _parse_with_json(csv_path):
+    """Reference parser (brace counting + json.loads), as plot_dom.py used to do."""
+    rows = []
+    with open(csv_path, 'r') as f:
+        f.readline()
+        for line in f:
+            parts = line.strip().split(',', 4)
+            if len(parts) < 5:
+                continue
+            rest = parts[4]
+            depth = 0
+            split_idx = 0
+            for i, char in enumerate(rest):
+                if char == '{':
+                    depth += 1
+                elif char == '}':
+                    depth -= 1
+                    if depth == 0:
+                        split_idx = i + 1
+                        break
+            rows.append((parts[0], float(parts[1]), int(parts[2]), parts[3],
+                         json.loads(rest[:split_idx]), json.loads(rest[split_idx + 1:])))
+    return rows
+
+
+def benchmark(csv_path, tick_size=DEFAULT_TICK_SIZE):
+    """Report json parse vs fast parse vs store open + full book read."""
+    start = time.perf_counter()
+    rows = _parse_with_json(csv_path)
+    json_sec = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parsed = parse_dom_csv(csv_path)
+    fast_sec = time.perf_counter() - start
+
+    store_path = write_store(parsed, store_path_for(csv_path), tick_size=tick_size, source=Path(csv_path).name)
+
+    start = time.perf_counter()
+    dom = DomStore(store_path)
+    books = [dom[i] for i in range(len(dom))]
+    store_sec = time.perf_counter() - start
+
+    mismatches = sum(1 for row, book in zip(rows, books) if (row[4], row[5]) != book)
+    csv_mb = Path(csv_path).stat().st_size / 1e6
+    store_mb = store_path.stat().st_size / 1e6
+    print(f"{csv_path}: {len(dom):,} rows, depth {dom.depth}")
+    print(f"  CSV + json.loads  {csv_mb:8.2f} MB  {json_sec:8.3f}s")
+    print(f"  Fast parser                   {fast_sec:8.3f}s")
+    print(f"  Store {store_mb:8.2f} MB  {store_sec:8.3f}s  (open + all books as dicts, {store_path})")
+    print(f"  Book mismatches vs json: {mismatches}")
+    return dom
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Uso: python dom_store.py <ts_and_dom.csv> [...]")
+        sys.exit(1)
+    for csv_file in sys.argv[1:]:
+        benchmark(csv_file)
@@ -0,0 +1,223 @@
+"""
+Content-addressed on-disk cache for multi-stage pipelines.
+
+Each stage output is stored under a key that hashes:
+
+    - the key of its input (file content digest for the first stage,
+      the previous stage key for the rest)
+    - the stage parameters
+    - the source code of the stage function (and of the helpers it depends on)
+
+so editing a parameter or a function only invalidates that stage and the ones
+after it. Keys are chained, so a pipeline run resolves every key up front,
+loads the last cached stage and only executes the stages that follow it.
+
+Entries are pickled DataFrames (`<stage>-<key>.pkl`) in one directory. A hit
+refreshes the file mtime; when the directory grows above `max_bytes` the least
+recently used entries are deleted first.
+
+Usage:
+    from stage_cache import Stage, StageCache, file_digest
+
+    cache = StageCache('data/.stage_cache', max_bytes=2 * 1024**3)
+    df = cache.run_pipeline(file_digest(DATA_FILE), [
+        Stage(load_and_prepare_data, {'filepath': DATA_FILE}),
+        Stage(detect_anomalies, {'threshold': 3.0}),
+    ])
+
+    python stage_cache.py data/.stage_cache   # list entries (most recent first)
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+CACHE_FORMAT = 1
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+ENTRY_SUFFIX = '.pkl'
+_HASH_CHUNK = 1 << 20
+
+
+def file_digest(path):
+    """SHA-256 of a file's content (input key of the first stage)."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def code_digest(func, deps=()):
+    """SHA-256 of the source of a stage function and the helpers (functions or modules) it uses."""
+    digest = hashlib.sha256()
+    for f in (func, *deps):
+        digest.update(inspect.getsource(f).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class Stage:
+    """
+    One pipeline step.
+
+    The first stage of a pipeline is called as func(**params); every other
+    stage as func(previous_output, **params).
+
+    Args:
+        func: stage function
+        params: keyword arguments (part of the cache key)
+        deps: helper functions or modules whose source is also part of the key
+        name: entry name prefix (default: func.__name__)
+    """
+
+    def __init__(self, func, params=None, deps=(), name=None):
+        self.func = func
+        self.params = dict(params or {})
+        self.deps = tuple(deps)
+        self.name = name or func.__name__
+
+    def key(self, input_key):
+        payload = json.dumps({
+            'format': CACHE_FORMAT,
+            'stage': self.name,
+            'input': input_key,
+            'params': self.params,
+            'code': code_digest(self.func, self.deps),
+        }, sort_keys=True, default=repr)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def __call__(self, previous=None, first=False):
+        if first:
+            return self.func(**self.params)
+        return self.func(previous, **self.params)
+
+
+class StageCache:
+    """Directory of pickled stage outputs with LRU size-based eviction."""
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES, verbose=True):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = int(max_bytes)
+        self.verbose = verbose
+
+    def path_for(self, name, key):
+        return self.cache_dir / f'{name}-{key[:32]}{ENTRY_SUFFIX}'
+
+    def entries(self):
+        """(path, size, mtime) of every entry, most recently used first."""
+        if not self.cache_dir.exists():
+            return []
+        found = []
+        for path in self.cache_dir.glob(f'*{ENTRY_SUFFIX}'):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            found.append((path, st.st_size, st.st_mtime))
+        return sorted(found, key=lambda e: e[2], reverse=True)
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def get(self, name, key):
+        """Cached output or None; a hit marks the entry as most recently used."""
+        path = self.path_for(name, key)
+        if not path.exists():
+            return None
+        try:
+            value = pd.read_pickle(path)
+        except Exception:
+            # Entrada corrupta (escritura interrumpida): se recalcula
+            path.unlink(missing_ok=True)
+            return None
+        os.utime(path)
+        return value
+
+    def put(self, name, key, value):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self.path_for(name, key)
+        # Unique temporary name: concurrent runs of the same stage never share a file
+        with tempfile.NamedTemporaryFile(dir=self.cache_dir, prefix=path.name + '.', suffix='.tmp',
+                                         delete=False) as f:
+            tmp_path = Path(f.name)
+            try:
+                pd.to_pickle(value, f)
+            except BaseException:
+                f.close()
+                tmp_path.unlink(missing_ok=True)
+                raise
+        os.replace(tmp_path, path)
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep=None):
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for path, size, _ in reversed(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        if removed and self.verbose:
+            print(f"  Cache: {removed} entradas eliminadas (LRU), {total / 1e6:.1f} MB en uso")
+        return removed
+
+    def run_pipeline(self, source_key, stages):
+        """
+        Run stages in order, reusing every cached output.
+
+        Keys are chained from source_key, so the last cached stage is loaded
+        directly and only the stages after it are executed (and stored).
+
+        Args:
+            source_key: key of the pipeline input (e.g. file_digest(path))
+            stages: list of Stage
+
+        Returns:
+            Output of the last stage.
+        """
+        keys = []
+        key = source_key
+        for stage in stages:
+            key = stage.key(key)
+            keys.append(key)
+
+        # Última etapa en caché: las anteriores no hace falta cargarlas
+        value = None
+        first_missing = 0
+        for i in range(len(stages) - 1, -1, -1):
+            start = time.perf_counter()
+            value = self.get(stages[i].name, keys[i])
+            if value is not None:
+                first_missing = i + 1
+                if self.verbose:
+                    print(f"  Cache: {stages[i].name} ({keys[i][:8]}, {time.perf_counter() - start:.2f}s)"
+                          + (f", {i} etapas previas omitidas" if i else ""))
+                break
+
+        for i in range(first_missing, len(stages)):
+            value = stages[i](value, first=(i == 0))
+            self.put(stages[i].name, keys[i], value)
+        return value
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Uso: python stage_cache.py <cache_dir>")
+        sys.exit(1)
+    cache = StageCache(sys.argv[1])
+    for entry_path, entry_size, entry_mtime in cache.entries():
+        print(f"  {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry_mtime))}  "
+              f"{entry_size / 1e6:8.2f} MB  {entry_path.name}")
+    print(f"Total: {cache.size() / 1e6:.1f} MB")
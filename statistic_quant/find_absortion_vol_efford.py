@@ -9,6 +9,13 @@ Absorción = Volumen anormalmente alto que NO produce el movimiento de precio es
 
 import pandas as pd
 import numpy as np
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+import tick_store
+from tick_store import load_ticks
+from stage_cache import Stage, StageCache, file_digest
 
 # Configuración
 SYMBOL = 'NQ'  # Cambiar a 'ES' para E-mini S&P 500
@@ -30,6 +37,9 @@ ANOMALY_THRESHOLD = 3.0      # Solo top 5% volúmenes
 
 # Parámetros de densidad
 DENSITY_WINDOW_SEC = 180     # Ventana para calcular densidad (3 minutos)
+# Ventanas adicionales para comparar filtros de densidad (MODO_2/MODO_3 en strat_OM_3)
+# Cada ventana genera bid_density_{w}s, ask_density_{w}s y net_density_{w}s
+DENSITY_COMPARE_WINDOWS_SEC = [60, 120, 300]
 
 # Parámetro para detección de señales FAKE
 # Una señal es "fake" si aparece otra más fuerte en los próximos X segundos
@@ -39,12 +49,17 @@ DENSITY_WINDOW_SEC = 180     # Ventana para calcular densidad (3 minutos)
 FAKE_DETECTION_LOOKAHEAD_SEC = 30  # 30 segundos (configuración óptima)
 # ==============================================================================
 
+# Caché de etapas en disco (clave = contenido del CSV + parámetros + código de cada etapa)
+# Cambiar un parámetro solo recalcula esa etapa y las siguientes
+USE_STAGE_CACHE = True
+STAGE_CACHE_DIR = 'data/.stage_cache'
+STAGE_CACHE_MAX_MB = 2048  # Al superarlo se borran las entradas usadas hace más tiempo (LRU)
+
 
 def load_and_prepare_data(filepath):
     """Carga datos y prepara para análisis."""
     print(f"Cargando {filepath}...")
-    df = pd.read_csv(filepath, sep=';', decimal=',')
-    df['Timestamp'] = pd.to_datetime(df['Timestamp'])
+    df = load_ticks(filepath, columns=['Timestamp', 'Precio', 'Volumen', 'Lado'])
     df = df.sort_values('Timestamp').reset_index(drop=True)
 
     print(f"  Registros: {len(df):,}")
@@ -131,11 +146,128 @@ def compute_volume_stats_simple(df, window_minutes=5):
     return df
 
 
+def compute_volume_stats_incremental(df, window_minutes=5):
+    """
+    Mismas estadísticas que compute_volume_stats_simple en una sola pasada O(n).
+
+    Por cada lado recorre las filas ordenadas por tiempo con dos punteros
+    (entrada/salida de la ventana [t - window, t]) y mantiene:
+    - volumen acumulado y nº de filas por nivel de precio
+    - suma y suma de cuadrados de los volúmenes por nivel (media y std muestral)
+
+    Produce las columnas vol_current_price, vol_mean, vol_std y vol_zscore
+    con los mismos valores que la versión simple (salvo tolerancia float).
+    """
+    print(f"\nCalculando estadísticas de volumen incrementales (ventana {window_minutes}min)...")
+
+    df = df.copy(deep=False)  # Solo se añaden columnas: las de entrada no se copian
+    window_sec = window_minutes * 60
+
+    # Convertir a timestamp numérico
+    df['time_sec'] = (df['TimeBin'] - df['TimeBin'].min()).dt.total_seconds()
+
+    n = len(df)
+    vol_current_out = np.zeros(n)
+    vol_mean_out = np.full(n, np.nan)
+    vol_std_out = np.full(n, np.nan)
+    vol_zscore_out = np.zeros(n)
+
+    time_all = df['time_sec'].to_numpy(dtype=np.float64)
+    precio_all = df['Precio'].to_numpy()
+    volumen_all = df['Volumen'].to_numpy(dtype=np.float64)
+
+    for lado in ['BID', 'ASK']:
+        # Posiciones del lado ordenadas por tiempo (estable: respeta el orden original)
+        pos = np.flatnonzero((df['Lado'] == lado).to_numpy())  # Lado en texto o categórico
+        pos = pos[np.argsort(time_all[pos], kind='stable')]
+        m = len(pos)
+
+        print(f"  Procesando {lado} ({m:,} registros)...")
+
+        if m == 0:
+            continue
+
+        t = time_all[pos]
+        vols = volumen_all[pos]
+        # Nivel de precio -> índice entero para acumular en arrays
+        price_idx = pd.factorize(precio_all[pos])[0]
+        n_levels = price_idx.max() + 1
+
+        level_vol = np.zeros(n_levels)             # Volumen acumulado por nivel en ventana
+        level_rows = np.zeros(n_levels, dtype=np.int64)  # Filas por nivel en ventana
+
+        sum_vol = 0.0     # Σ volumen por nivel
+        sum_sq = 0.0      # Σ (volumen por nivel)²
+        n_active = 0      # Niveles con al menos una fila en ventana
+        n_rows = 0        # Filas en ventana
+
+        left = 0
+        right = 0
+
+        for i in range(m):
+            t_i = t[i]
+
+            # Entrar: todas las filas con time_sec <= t (incluye mismo TimeBin)
+            while right < m and t[right] <= t_i:
+                p = price_idx[right]
+                v = vols[right]
+                old = level_vol[p]
+                new = old + v
+                level_vol[p] = new
+                sum_vol += v
+                sum_sq += new * new - old * old
+                if level_rows[p] == 0:
+                    n_active += 1
+                level_rows[p] += 1
+                n_rows += 1
+                right += 1
+
+            # Salir: filas con time_sec < t - window
+            while t[left] < t_i - window_sec:
+                p = price_idx[left]
+                v = vols[left]
+                old = level_vol[p]
+                new = old - v
+                level_vol[p] = new
+                sum_vol -= v
+                sum_sq += new * new - old * old
+                level_rows[p] -= 1
+                if level_rows[p] == 0:
+                    n_active -= 1
+                    level_vol[p] = 0.0
+                n_rows -= 1
+                left += 1
+
+            if n_rows < 5 or n_active < 3:
+                continue
+
+            vol_mean = sum_vol / n_active
+            # Varianza muestral (ddof=1), igual que Series.std()
+            var = (n_active * sum_sq - sum_vol * sum_vol) / (n_active * (n_active - 1))
+            vol_std = np.sqrt(var) if var > 0 else 0.0
+            vol_current = level_vol[price_idx[i]]
+
+            idx = pos[i]
+            vol_current_out[idx] = vol_current
+            vol_mean_out[idx] = vol_mean
+            vol_std_out[idx] = vol_std
+
+            if vol_std > 0:
+                vol_zscore_out[idx] = (vol_current - vol_mean) / vol_std
+
+    df['vol_current_price'] = vol_current_out
+    df['vol_mean'] = vol_mean_out
+    df['vol_std'] = vol_std_out
+    df['vol_zscore'] = vol_zscore_out
+
+    return df
+
+
 def detect_anomalies(df, threshold=1.5):
     """Marca volúmenes anormales basado en Z-score."""
     print(f"\nDetectando anomalías (threshold={threshold} std)...")
 
-    df = df.copy()
+    df = df.copy(deep=False)  # Solo se añaden columnas: las de entrada no se copian
     df['is_anomaly'] = df['vol_zscore'].abs() >= threshold
 
     # Diagnóstico
@@ -226,6 +358,96 @@ def detect_fake_signals(df, look_ahead_sec=300):
     return df
 
 
+def _first_greater_within(values, end):
+    """
+    Para cada i devuelve el primer j en [i+1, end[i]) con values[j] > values[i], o -1.
+
+    Usa una sparse table de máximos (niveles 2^k) y un salto binario
+    descendente vectorizado sobre todos los i a la vez: O(n log n) sin bucles por fila.
+    """
+    n = len(values)
+    result = np.full(n, -1, dtype=np.int64)
+    if n == 0:
+        return result
+
+    # Sparse table: table[k][x] = max(values[x : x + 2^k]), +inf fuera de rango
+    table = [values.astype(np.float64)]
+    k = 1
+    while (1 << k) <= n:
+        prev = table[-1]
+        half = 1 << (k - 1)
+        level = np.full(n, np.inf)
+        level[:n - (1 << k) + 1] = np.maximum(prev[:n - (1 << k) + 1], prev[half:n - half + 1])
+        table.append(level)
+        k += 1
+
+    pos = np.arange(1, n + 1, dtype=np.int64)  # Candidato inicial: i + 1
+
+    # Avanzar pos mientras el bloque [pos, pos + 2^k) no supere values[i]
+    for k in range(len(table) - 1, -1, -1):
+        step = 1 << k
+        can_jump = pos + step <= end
+        idx = np.minimum(pos, n - 1)
+        block_max = table[k][idx]
+        jump = can_jump & (block_max <= values)
+        pos = np.where(jump, pos + step, pos)
+
+    found = pos < end
+    result[found] = pos[found]
+    return result
+
+
+def detect_fake_signals_vectorized(df, look_ahead_sec=300):
+    """
+    Misma lógica que detect_fake_signals usando arrays ordenados.
+
+    Para cada señal busca la primera señal posterior del mismo lado con z-score
+    MAYOR dentro de look_ahead_sec:
+    - np.searchsorted da el final de la ventana look-ahead de cada señal
+    - _first_greater_within localiza la primera señal más fuerte en ese rango
+
+    Escribe fake_bid_vol, fake_ask_vol e invalidated_by_zscore en bloque.
+    """
+    print(f"\nDetectando señales FAKE vectorizado (ventana look-ahead: {look_ahead_sec}s)...")
+
+    df = df.copy(deep=False)  # Solo se añaden columnas: las de entrada no se copian
+    df['fake_bid_vol'] = False
+    df['fake_ask_vol'] = False
+    df['invalidated_by_zscore'] = np.nan  # Z-score de la señal que invalidó esta
+
+    for lado in ['BID', 'ASK']:
+        col_name = 'bid_vol' if lado == 'BID' else 'ask_vol'
+        fake_col_name = 'fake_bid_vol' if lado == 'BID' else 'fake_ask_vol'
+
+        # Mismo orden que la versión con bucles
+        signals_df = df[(df['Lado'] == lado) & (df[col_name] == True)]
+        signals_df = signals_df.sort_values('time_sec')
+
+        if len(signals_df) == 0:
+            continue
+
+        print(f"  Analizando {len(signals_df):,} señales {lado}...")
+
+        times = signals_df['time_sec'].to_numpy(dtype=np.float64)
+        zscores = signals_df['vol_zscore'].to_numpy(dtype=np.float64)
+        indices = signals_df.index.to_numpy()
+
+        # Fin (exclusivo) de la ventana: primera señal con time > t + look_ahead
+        end = np.searchsorted(times, times + look_ahead_sec, side='right')
+        invalidator = _first_greater_within(zscores, end)
+
+        is_fake = invalidator >= 0
+        fake_idx = indices[is_fake]
+        df.loc[fake_idx, fake_col_name] = True
+        df.loc[fake_idx, 'invalidated_by_zscore'] = zscores[invalidator[is_fake]]
+
+        fake_count = int(is_fake.sum())
+        print(f"    Señales FAKE detectadas: {fake_count} ({fake_count/len(signals_df)*100:.1f}%)")
+        print(f"    Señales REALES: {len(signals_df) - fake_count} ({(len(signals_df)-fake_count)/len(signals_df)*100:.1f}%)")
+
+    return df
+
+
 # Función detect_absorption eliminada - se reevaluará el método
 
 
@@ -297,6 +519,58 @@ def compute_density(df, density_window_sec=120):
     return df
 
 
+def compute_density_fast(df, density_window_sec=120):
+    """
+    Misma densidad que compute_density en tiempo lineal (sumas acumuladas).
+
+    Para cada registro cuenta bid_vol/ask_vol en [t - half, t + half] como
+    diferencia de sumas acumuladas, con los límites obtenidos por np.searchsorted
+    sobre time_sec en una sola llamada vectorizada.
+
+    Args:
+        df: DataFrame con columnas time_sec, bid_vol, ask_vol
+        density_window_sec: Ventana en segundos, o lista de ventanas.
+            - Escalar: columnas bid_density, ask_density, net_density
+            - Lista: un juego de columnas por ventana con sufijo _{w}s
+              (bid_density_60s, ask_density_60s, net_density_60s, ...)
+    """
+    multi = isinstance(density_window_sec, (list, tuple, np.ndarray))
+    windows = list(density_window_sec) if multi else [density_window_sec]
+
+    print(f"\nCalculando densidad de volumen extremo rápida (ventanas {windows}s)...")
+
+    df = df.copy(deep=False)  # Solo se añaden columnas: las de entrada no se copian
+
+    # Ordenar por tiempo (estable) para searchsorted; las cuentas no dependen del orden
+    time_sec = df['time_sec'].to_numpy(dtype=np.float64)
+    order = np.argsort(time_sec, kind='stable')
+    time_sorted = time_sec[order]
+
+    # Sumas acumuladas con 0 inicial: count(lo, hi) = cum[hi] - cum[lo]
+    bid_cum = np.concatenate(([0], np.cumsum(df['bid_vol'].to_numpy(dtype=np.int64)[order])))
+    ask_cum = np.concatenate(([0], np.cumsum(df['ask_vol'].to_numpy(dtype=np.int64)[order])))
+
+    for window in windows:
+        half_window = window / 2
+
+        lo = np.searchsorted(time_sorted, time_sec - half_window, side='left')
+        hi = np.searchsorted(time_sorted, time_sec + half_window, side='right')
+
+        bid_density = bid_cum[hi] - bid_cum[lo]
+        ask_density = ask_cum[hi] - ask_cum[lo]
+
+        suffix = f'_{window}s' if multi else ''
+        df[f'bid_density{suffix}'] = bid_density
+        df[f'ask_density{suffix}'] = ask_density
+        df[f'net_density{suffix}'] = ask_density - bid_density
+
+        if len(df) > 0:
+            print(f"  Ventana {window}s: BID max={bid_density.max()}, ASK max={ask_density.max()}, "
+                  f"NET media={(ask_density - bid_density).mean():.2f}")
+
+    return df
+
+
 def print_summary(df):
     """Imprime resumen de resultados."""
     print("\n" + "="*80)
@@ -370,15 +644,30 @@ def main():
     print(f"Parámetros:")
     print(f"  Ventana: {WINDOW_MINUTES}min")
     print(f"  Threshold: {ANOMALY_THRESHOLD} std")
-    print(f"  Ventana densidad: {DENSITY_WINDOW_SEC}s")
+    print(f"  Ventana densidad: {DENSITY_WINDOW_SEC}s (comparación: {DENSITY_COMPARE_WINDOWS_SEC})")
     print(f"  Look-ahead para detección fake: {FAKE_DETECTION_LOOKAHEAD_SEC}s")
     print("="*80)
 
-    df = load_and_prepare_data(DATA_FILE)
-    df = compute_volume_stats_simple(df, window_minutes=WINDOW_MINUTES)
-    df = detect_anomalies(df, threshold=ANOMALY_THRESHOLD)
-    df = detect_fake_signals(df, look_ahead_sec=FAKE_DETECTION_LOOKAHEAD_SEC)
-    df = compute_density(df, density_window_sec=DENSITY_WINDOW_SEC)
+    stages = [
+        # Todo tick_store en la clave: formato y decodificación del store cambian los datos cargados
+        Stage(load_and_prepare_data, {'filepath': DATA_FILE}, deps=(tick_store,)),
+        Stage(compute_volume_stats_incremental, {'window_minutes': WINDOW_MINUTES}),
+        Stage(detect_anomalies, {'threshold': ANOMALY_THRESHOLD}),
+        Stage(detect_fake_signals_vectorized, {'look_ahead_sec': FAKE_DETECTION_LOOKAHEAD_SEC},
+              deps=(_first_greater_within,)),
+        Stage(compute_density_fast, {'density_window_sec': DENSITY_WINDOW_SEC}),
+    ]
+    if DENSITY_COMPARE_WINDOWS_SEC:
+        stages.append(Stage(compute_density_fast, {'density_window_sec': DENSITY_COMPARE_WINDOWS_SEC},
+                            name='compute_density_fast_compare'))
+
+    if USE_STAGE_CACHE:
+        cache = StageCache(STAGE_CACHE_DIR, max_bytes=STAGE_CACHE_MAX_MB * 1024 ** 2)
+        df = cache.run_pipeline(file_digest(DATA_FILE), stages)
+    else:
+        df = None
+        for i, stage in enumerate(stages):
+            df = stage(df, first=(i == 0))
 
     print_summary(df)
 
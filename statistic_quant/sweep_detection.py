@@ -0,0 +1,251 @@
+"""
+Barrido de parámetros del pipeline de detección de absorción en paralelo.
+
+Recorre la rejilla WINDOW_MINUTES x ANOMALY_THRESHOLD x FAKE_DETECTION_LOOKAHEAD_SEC
+x DENSITY_WINDOW_SEC y, para cada combinación, cuenta señales (BID/ASK, fake, reales)
+y hace backtest de strat_OM_3 (TP/SL, EOD, modos de filtro) con backtest_engine.
+
+Las etapas compartidas se calculan una sola vez:
+- Resampleo a bins de 500ms: una vez para toda la rejilla
+- Z-scores (compute_volume_stats_incremental): una vez por WINDOW_MINUTES
+
+Cada etapa se guarda con tick_store.write_columns en un directorio temporal y los
+procesos del pool la abren con map_columns (memmap de solo lectura). El DataFrame
+de cada worker se construye sobre esas vistas sin copiarlas (Lado es un
+categórico sobre los códigos int8 del fichero) y las etapas de detección solo
+añaden columnas sobre copias superficiales: los datos de entrada se comparten
+por la page cache del sistema y cada worker solo reserva las columnas que
+calcula. A los workers solo se les pasa la ruta y los parámetros.
+Cada tarea del pool es (ventana, threshold, look-ahead) y recorre dentro todas
+las ventanas de densidad (la etapa más barata).
+
+Uso:
+    python statistic_quant/sweep_detection.py [workers]
+"""
+
+import contextlib
+import io
+import itertools
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(Path(__file__).resolve().parent))
+sys.path.append(str(ROOT))
+sys.path.append(str(ROOT / 'strat_OM_3'))
+import backtest_engine
+import strat_fabio_vol_not_fake as strat
+from find_absortion_vol_efford import (
+    load_and_prepare_data,
+    compute_volume_stats_incremental,
+    detect_anomalies,
+    detect_fake_signals_vectorized,
+    compute_density_fast,
+    DATA_FILE,
+)
+from tick_store import SIDE_CODES, map_columns, write_columns
+
+# ==============================================================================
+# REJILLA DE PARÁMETROS
+# ==============================================================================
+WINDOW_MINUTES_GRID = [1, 2, 5]
+ANOMALY_THRESHOLD_GRID = [2.0, 2.5, 3.0]
+FAKE_LOOKAHEAD_GRID = [30, 45, 60]
+DENSITY_WINDOW_GRID = [60, 120, 180, 300]
+
+# Modos de filtro de strat_OM_3 evaluados en cada combinación
+# (MODO_1 no usa densidad; MODO_2/MODO_3 dependen de DENSITY_WINDOW_SEC)
+FILTER_MODES = ['MODO_1', 'MODO_2', 'MODO_3']
+
+MAX_WORKERS = None  # None = os.cpu_count()
+OUTPUT_FILE = 'outputs/sweep_detection_results.csv'
+# ==============================================================================
+
+BINNED_FILE = 'binned_500ms.cols'
+SIDE_DTYPE = pd.CategoricalDtype(list(SIDE_CODES))  # Códigos 0 = BID, 1 = ASK (-1 = otro)
+
+
+def _zscore_file(stage_dir, window_minutes):
+    return Path(stage_dir) / f'vol_zscore_{window_minutes}m.cols'
+
+
+def save_binned_stage(df, stage_dir):
+    """Guarda el resultado del resampleo como fichero de columnas (memory-mappeable)."""
+    write_columns(Path(stage_dir) / BINNED_FILE, {
+        'TimeBin': df['TimeBin'].to_numpy().astype('datetime64[ns]').view(np.int64),
+        'Precio': df['Precio'].to_numpy(dtype=np.float64),
+        'Volumen': df['Volumen'].to_numpy(dtype=np.int64),
+        'Lado': df['Lado'].map(SIDE_CODES).fillna(-1).to_numpy(dtype=np.int8),
+        # Mismo time_sec que compute_volume_stats_incremental
+        'time_sec': (df['TimeBin'] - df['TimeBin'].min()).dt.total_seconds().to_numpy(),
+    })
+
+
+def load_binned_stage(stage_dir, window_minutes=None):
+    """
+    DataFrame de bins de 500ms sobre las columnas memory-mapped, sin copiarlas
+    (con window_minutes añade vol_zscore de esa ventana, también mapeado).
+    """
+    stage_dir = Path(stage_dir)
+    _, cols = map_columns(stage_dir / BINNED_FILE)
+    data = {
+        'TimeBin': cols['TimeBin'].view('datetime64[ns]'),
+        'Precio': cols['Precio'],
+        'Volumen': cols['Volumen'],
+        'Lado': pd.Categorical.from_codes(cols['Lado'], dtype=SIDE_DTYPE),
+        'time_sec': cols['time_sec'],
+    }
+    if window_minutes is not None:
+        data['vol_zscore'] = map_columns(_zscore_file(stage_dir, window_minutes))[1]['vol_zscore']
+    return pd.DataFrame(data, copy=False)
+
+
+def zscore_task(stage_dir, window_minutes):
+    """Worker: z-scores de una ventana, guardados en vol_zscore_{w}m.cols."""
+    df = load_binned_stage(stage_dir)
+    with contextlib.redirect_stdout(io.StringIO()):
+        df = compute_volume_stats_incremental(df, window_minutes=window_minutes)
+    write_columns(_zscore_file(stage_dir, window_minutes), {'vol_zscore': df['vol_zscore'].to_numpy()})
+    return window_minutes
+
+
+def signal_counts(df):
+    """Número de señales BID/ASK, fake y reales de un DataFrame detectado."""
+    bid = df['bid_vol'].to_numpy(dtype=bool)
+    ask = df['ask_vol'].to_numpy(dtype=bool)
+    fake_bid = df['fake_bid_vol'].to_numpy(dtype=bool)
+    fake_ask = df['fake_ask_vol'].to_numpy(dtype=bool)
+    return {
+        'bid_signals': int(bid.sum()),
+        'ask_signals': int(ask.sum()),
+        'fake_bid': int(fake_bid.sum()),
+        'fake_ask': int(fake_ask.sum()),
+        'real_bid': int((bid & ~fake_bid).sum()),
+        'real_ask': int((ask & ~fake_ask).sum()),
+    }
+
+
+def backtest_stats(df, filter_mode):
+    """Métricas del backtest de strat_OM_3 sobre las señales detectadas."""
+    long_signal, short_signal = strat.build_signals(df, filter_mode=filter_mode)
+    ledger = backtest_engine.run_backtest(
+        df['TimeBin'], df['Precio'], long_signal, short_signal,
+        tp_points=strat.TP_POINTS, sl_points=strat.SL_POINTS, eod_time=strat.EOD_TIME,
+        close_at_end=False,
+        point_value=strat.POINT_VALUE, contracts=strat.CONTRACTS,
+    )
+    return backtest_engine.ledger_stats(ledger)
+
+
+def combo_task(stage_dir, window_minutes, threshold, look_ahead_sec, density_windows, filter_modes):
+    """
+    Worker: anomalías + fake para (ventana, threshold, look-ahead) y, por cada
+    ventana de densidad, densidades + backtest de cada modo de filtro.
+
+    Returns:
+        Lista de filas (dict) de la tabla de resultados.
+    """
+    df = load_binned_stage(stage_dir, window_minutes)
+
+    rows = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        df = detect_anomalies(df, threshold=threshold)
+        df = detect_fake_signals_vectorized(df, look_ahead_sec=look_ahead_sec)
+        counts = signal_counts(df)
+        for density_window in density_windows:
+            df_density = compute_density_fast(df, density_window_sec=density_window)
+            for filter_mode in filter_modes:
+                rows.append({
+                    'window_minutes': window_minutes,
+                    'anomaly_threshold': threshold,
+                    'lookahead_sec': look_ahead_sec,
+                    'density_window_sec': density_window,
+                    'filter_mode': filter_mode,
+                    **counts,
+                    **backtest_stats(df_density, filter_mode),
+                })
+    return rows
+
+
+def run_sweep(data_file=DATA_FILE,
+              window_grid=WINDOW_MINUTES_GRID,
+              threshold_grid=ANOMALY_THRESHOLD_GRID,
+              lookahead_grid=FAKE_LOOKAHEAD_GRID,
+              density_grid=DENSITY_WINDOW_GRID,
+              filter_modes=FILTER_MODES,
+              max_workers=MAX_WORKERS):
+    """
+    Ejecuta la rejilla completa y devuelve la tabla de resultados
+    (una fila por combinación y modo de filtro).
+    """
+    n_combos = len(window_grid) * len(threshold_grid) * len(lookahead_grid) * len(density_grid)
+    print("=" * 80)
+    print("BARRIDO DE PARÁMETROS - DETECCIÓN DE ABSORCIÓN")
+    print("=" * 80)
+    print(f"  WINDOW_MINUTES: {window_grid}")
+    print(f"  ANOMALY_THRESHOLD: {threshold_grid}")
+    print(f"  FAKE_DETECTION_LOOKAHEAD_SEC: {lookahead_grid}")
+    print(f"  DENSITY_WINDOW_SEC: {density_grid}")
+    print(f"  Modos de filtro: {filter_modes}")
+    print(f"  Combinaciones: {n_combos:,} ({n_combos * len(filter_modes):,} backtests)")
+    print(f"  Workers: {max_workers or os.cpu_count()}")
+    print("=" * 80)
+
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix='sweep_detection_') as stage_dir:
+        # Etapa compartida 1: bins de 500ms (una vez)
+        save_binned_stage(load_and_prepare_data(data_file), stage_dir)
+
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            # Etapa compartida 2: z-scores (una vez por ventana, en paralelo)
+            print(f"\nCalculando z-scores para {len(window_grid)} ventanas...")
+            for future in as_completed([pool.submit(zscore_task, stage_dir, w) for w in window_grid]):
+                print(f"  Ventana {future.result()}min lista ({time.perf_counter() - start:.1f}s)")
+
+            # Resto de etapas + backtest por combinación
+            tasks = list(itertools.product(window_grid, threshold_grid, lookahead_grid))
+            print(f"\nEjecutando {len(tasks)} tareas (x{len(density_grid)} ventanas de densidad)...")
+            futures = [pool.submit(combo_task, stage_dir, w, th, la, list(density_grid), list(filter_modes))
+                       for w, th, la in tasks]
+            rows = []
+            for done, future in enumerate(as_completed(futures), 1):
+                rows.extend(future.result())
+                if done % 10 == 0 or done == len(futures):
+                    print(f"  {done}/{len(futures)} tareas ({time.perf_counter() - start:.1f}s)")
+
+    results = pd.DataFrame(rows).sort_values(
+        ['window_minutes', 'anomaly_threshold', 'lookahead_sec', 'density_window_sec', 'filter_mode']
+    ).reset_index(drop=True)
+    print(f"\nBarrido completado en {time.perf_counter() - start:.1f}s")
+    return results
+
+
+def print_top(results, n=10):
+    """Imprime las mejores combinaciones por profit total."""
+    print("\n" + "=" * 80)
+    print(f"TOP {n} COMBINACIONES (por total_profit)")
+    print("=" * 80)
+    cols = ['window_minutes', 'anomaly_threshold', 'lookahead_sec', 'density_window_sec', 'filter_mode',
+            'real_bid', 'real_ask', 'trades', 'total_profit', 'win_rate', 'profit_factor', 'max_drawdown']
+    print(results.nlargest(n, 'total_profit')[cols].to_string(index=False))
+
+
+def main(max_workers=MAX_WORKERS):
+    results = run_sweep(max_workers=max_workers)
+    print_top(results)
+
+    os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
+    results.to_csv(OUTPUT_FILE, sep=';', decimal=',', index=False)
+    print(f"\nResultados guardados en {OUTPUT_FILE}")
+    return results
+
+
+if __name__ == "__main__":
+    main(max_workers=int(sys.argv[1]) if len(sys.argv) > 1 else MAX_WORKERS)
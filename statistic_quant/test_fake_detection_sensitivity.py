@@ -16,9 +16,9 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent))
 from find_absortion_vol_efford import (
     load_and_prepare_data,
-    compute_volume_stats_simple,
+    compute_volume_stats_incremental,
     detect_anomalies,
-    detect_fake_signals,
+    detect_fake_signals_vectorized,
     DATA_FILE,
     WINDOW_MINUTES,
     ANOMALY_THRESHOLD
@@ -47,7 +47,7 @@ def test_fake_detection(look_ahead_values=[30, 45, 60]):
     df = load_and_prepare_data(DATA_FILE)
 
     print("\n[2/4] Calculando estadísticas de volumen...")
-    df = compute_volume_stats_simple(df, window_minutes=WINDOW_MINUTES)
+    df = compute_volume_stats_incremental(df, window_minutes=WINDOW_MINUTES)
 
     print("\n[3/4] Detectando anomalías...")
     df = detect_anomalies(df, threshold=ANOMALY_THRESHOLD)
@@ -73,7 +73,7 @@ def test_fake_detection(look_ahead_values=[30, 45, 60]):
         print(f"{'='*80}")
 
         # Detectar señales fake con este parámetro
-        df_test = detect_fake_signals(df.copy(), look_ahead_sec=look_ahead_sec)
+        df_test = detect_fake_signals_vectorized(df.copy(), look_ahead_sec=look_ahead_sec)
 
         # Calcular estadísticas
         fake_bid = df_test['fake_bid_vol'].sum()
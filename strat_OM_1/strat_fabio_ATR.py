@@ -13,10 +13,16 @@ Gestión:
 - Cierre automático al final del día (EOD)
 """
 
+import os
+import sys
+from datetime import datetime, time
+from pathlib import Path
+
 import pandas as pd
 import numpy as np
-from datetime import datetime, time
-import os
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+import backtest_engine
 
 # ========== CONFIGURACIÓN ==========
 SYMBOL = 'NQ'
@@ -91,208 +97,26 @@ def calculate_atr(df, period=14):
 def run_backtest(df):
     """
     Ejecuta backtest de la estrategia.
+
+    LONG con bid_abs, SHORT con ask_abs; las filas sin ATR se ignoran.
+    La gestión TP/SL/EOD la hace backtest_engine.run_backtest.
     """
     print("\n" + "="*70)
     print("BACKTESTING ESTRATEGIA DE ABSORCIÓN CON ATR")
     print("="*70)
 
-    trades = []
-    position = None  # None, 'LONG', 'SHORT'
-    entry_price = None
-    entry_time = None
-    entry_atr = None
-    tp_price = None
-    sl_price = None
-
-    total_rows = len(df)
-
-    for idx, row in df.iterrows():
-        current_time = row['TimeBin']
-        current_price = row['Precio']
-        current_atr = row['atr']
-        bid_abs = row.get('bid_abs', False)
-        ask_abs = row.get('ask_abs', False)
-
-        # Skip si no hay ATR calculado aún
-        if pd.isna(current_atr):
-            continue
-
-        # === GESTIÓN DE POSICIÓN ABIERTA ===
-        if position is not None:
-
-            # Verificar cierre EOD
-            if current_time.time() >= EOD_TIME:
-                exit_price = current_price
-                exit_time = current_time
-
-                if position == 'LONG':
-                    profit_points = exit_price - entry_price
-                else:  # SHORT
-                    profit_points = entry_price - exit_price
-
-                profit_dollars = profit_points * POINT_VALUE * CONTRACTS
-
-                trades.append({
-                    'entry_time': entry_time,
-                    'entry_price': entry_price,
-                    'exit_time': exit_time,
-                    'exit_price': exit_price,
-                    'side': position,
-                    'tp_price': tp_price,
-                    'sl_price': sl_price,
-                    'atr_entry': entry_atr,
-                    'resultado': 'EOD',
-                    'profit_points': round(profit_points, 2),
-                    'profit_dollars': round(profit_dollars, 2),
-                    'contracts': CONTRACTS
-                })
-
-                position = None
-                continue
-
-            # Verificar TP
-            if position == 'LONG' and current_price >= tp_price:
-                profit_points = tp_price - entry_price
-                profit_dollars = profit_points * POINT_VALUE * CONTRACTS
-
-                trades.append({
-                    'entry_time': entry_time,
-                    'entry_price': entry_price,
-                    'exit_time': current_time,
-                    'exit_price': tp_price,
-                    'side': position,
-                    'tp_price': tp_price,
-                    'sl_price': sl_price,
-                    'atr_entry': entry_atr,
-                    'resultado': 'TARGET',
-                    'profit_points': round(profit_points, 2),
-                    'profit_dollars': round(profit_dollars, 2),
-                    'contracts': CONTRACTS
-                })
-
-                position = None
-                continue
-
-            elif position == 'SHORT' and current_price <= tp_price:
-                profit_points = entry_price - tp_price
-                profit_dollars = profit_points * POINT_VALUE * CONTRACTS
-
-                trades.append({
-                    'entry_time': entry_time,
-                    'entry_price': entry_price,
-                    'exit_time': current_time,
-                    'exit_price': tp_price,
-                    'side': position,
-                    'tp_price': tp_price,
-                    'sl_price': sl_price,
-                    'atr_entry': entry_atr,
-                    'resultado': 'TARGET',
-                    'profit_points': round(profit_points, 2),
-                    'profit_dollars': round(profit_dollars, 2),
-                    'contracts': CONTRACTS
-                })
-
-                position = None
-                continue
-
-            # Verificar SL
-            if position == 'LONG' and current_price <= sl_price:
-                profit_points = sl_price - entry_price
-                profit_dollars = profit_points * POINT_VALUE * CONTRACTS
-
-                trades.append({
-                    'entry_time': entry_time,
-                    'entry_price': entry_price,
-                    'exit_time': current_time,
-                    'exit_price': sl_price,
-                    'side': position,
-                    'tp_price': tp_price,
-                    'sl_price': sl_price,
-                    'atr_entry': entry_atr,
-                    'resultado': 'STOP',
-                    'profit_points': round(profit_points, 2),
-                    'profit_dollars': round(profit_dollars, 2),
-                    'contracts': CONTRACTS
-                })
-
-                position = None
-                continue
-
-            elif position == 'SHORT' and current_price >= sl_price:
-                profit_points = entry_price - sl_price
-                profit_dollars = profit_points * POINT_VALUE * CONTRACTS
-
-                trades.append({
-                    'entry_time': entry_time,
-                    'entry_price': entry_price,
-                    'exit_time': current_time,
-                    'exit_price': sl_price,
-                    'side': position,
-                    'tp_price': tp_price,
-                    'sl_price': sl_price,
-                    'atr_entry': entry_atr,
-                    'resultado': 'STOP',
-                    'profit_points': round(profit_points, 2),
-                    'profit_dollars': round(profit_dollars, 2),
-                    'contracts': CONTRACTS
-                })
-
-                position = None
-                continue
-
-        # === SEÑALES DE ENTRADA ===
-        if position is None:
-
-            # LONG: BID Absorption (círculo rojo)
-            if bid_abs:
-                position = 'LONG'
-                entry_price = current_price
-                entry_time = current_time
-                entry_atr = current_atr
-                tp_price = entry_price + TP_POINTS  # TP fijo en puntos
-                sl_price = entry_price - SL_POINTS  # SL fijo en puntos
-
-            # SHORT: ASK Absorption (círculo verde)
-            elif ask_abs:
-                position = 'SHORT'
-                entry_price = current_price
-                entry_time = current_time
-                entry_atr = current_atr
-                tp_price = entry_price - TP_POINTS  # TP fijo en puntos
-                sl_price = entry_price + SL_POINTS  # SL fijo en puntos
-
-        # Progreso
-        if (idx + 1) % 10000 == 0:
-            print(f"  Procesado {idx + 1:,}/{total_rows:,} ({(idx+1)/total_rows*100:.1f}%)")
-
-    # Cerrar posición abierta al final del backtest
-    if position is not None:
-        exit_price = df.iloc[-1]['Precio']
-        exit_time = df.iloc[-1]['TimeBin']
-
-        if position == 'LONG':
-            profit_points = exit_price - entry_price
-        else:
-            profit_points = entry_price - exit_price
-
-        profit_dollars = profit_points * POINT_VALUE * CONTRACTS
-
-        trades.append({
-            'entry_time': entry_time,
-            'entry_price': entry_price,
-            'exit_time': exit_time,
-            'exit_price': exit_price,
-            'side': position,
-            'tp_price': tp_price,
-            'sl_price': sl_price,
-            'atr_entry': entry_atr,
-            'resultado': 'EOD',
-            'profit_points': round(profit_points, 2),
-            'profit_dollars': round(profit_dollars, 2),
-            'contracts': CONTRACTS
-        })
-
-    return pd.DataFrame(trades)
+    ledger = backtest_engine.run_backtest(
+        df['TimeBin'], df['Precio'],
+        long_signal=df['bid_abs'].astype(bool),
+        short_signal=df['ask_abs'].astype(bool),
+        tp_points=TP_POINTS, sl_points=SL_POINTS,
+        active=df['atr'].notna(),  # Skip si no hay ATR calculado aún
+        eod_time=EOD_TIME,
+        point_value=POINT_VALUE, contracts=CONTRACTS,
+    )
+    print(f"  Procesado {len(df):,} filas: {len(ledger):,} trades")
+
+    return ledger.to_frame(labels={backtest_engine.END_OF_DATA: 'EOD'}, extra={'atr_entry': df['atr']})
 
 
 def generate_statistics(trades_df):
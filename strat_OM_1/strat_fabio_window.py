@@ -22,10 +22,16 @@ Gestión:
 - Cierre automático al final del día (EOD)
 """
 
+import os
+import sys
+from datetime import datetime, time
+from pathlib import Path
+
 import pandas as pd
 import numpy as np
-from datetime import datetime, time
-import os
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+import backtest_engine
 
 # ========== CONFIGURACIÓN ==========
 SYMBOL = 'NQ'
@@ -37,6 +43,11 @@ OUTPUT_FILE = 'outputs/tracking_record_window.csv'
 # FUTURE_WINDOW_SEC = 30 en el script de detección (ACTUALIZADO - ventana rápida)
 SIGNAL_DELAY_SEC = 15 # Segundos de retraso para corregir look-ahead bias
 
+# Barrido de retrasos (python strat_OM_1/strat_fabio_window.py --delays)
+# Un backtest sin bias por retraso, sobre los mismos datos cargados una vez
+DELAY_GRID = [0, 15, 30, 45, 60, 90]
+DELAY_OUTPUT_FILE = 'outputs/sweep_delay_window.csv'
+
 # Parámetros de la estrategia
 ATR_PERIOD = 14  # Solo para referencia
 
@@ -55,6 +66,12 @@ SL_POINTS = 2.0  # Stop Loss: 2 puntos = -$40 por trade
 # Ratio R:R = 1.0:1 (equilibrado, mayor probabilidad de hit)
 # ==============================================================================
 
+# ========== BARRIDO TP/SL (python strat_OM_1/strat_fabio_window.py --sweep) ==========
+# Todas las combinaciones se resuelven sobre los mismos ticks en una sola pasada
+TP_GRID = [1.0, 1.5, 2.0, 2.5, 3.0, 4.0]
+SL_GRID = [1.0, 1.5, 2.0, 2.5, 3.0]
+SWEEP_OUTPUT_FILE = 'outputs/sweep_tp_sl_window.csv'
+
 # Configuración del instrumento
 TICK_SIZE = 0.25  # NQ tick size
 POINT_VALUE = 20  # 1 punto NQ = $20
@@ -111,6 +128,37 @@ def calculate_atr(df, period=14):
     return df_with_atr
 
 
+def shifted_signal_masks(df, delays, columns=('bid_abs', 'ask_abs')):
+    """
+    Señales desplazadas para varios retrasos a la vez, sin bucles por señal.
+
+    Cada señal en t se mueve a la primera fila con time_sec >= t + delay. Esa
+    fila es la primera en la que el máximo acumulado de time_sec alcanza
+    t + delay, así que un solo searchsorted resuelve todas las señales y todos
+    los retrasos (también si TimeBin no estuviera ordenado).
+
+    Args:
+        df: DataFrame con TimeBin y las columnas de señal
+        delays: lista de retrasos en segundos
+
+    Returns:
+        {columna: array bool [len(delays), len(df)]} con las señales desplazadas
+    """
+    delays = np.atleast_1d(np.asarray(delays, dtype=np.float64))
+    time_sec = (df['TimeBin'] - df['TimeBin'].min()).dt.total_seconds().to_numpy()
+    reach = np.maximum.accumulate(time_sec)
+    n = len(df)
+
+    masks = {}
+    for col in columns:
+        t_original = time_sec[df[col].to_numpy(dtype=bool)]
+        target_idx = np.searchsorted(reach, np.add.outer(delays, t_original), side='left')
+        shifted = np.zeros((len(delays), n + 1), dtype=bool)  # Columna n = fuera de ventana
+        shifted[np.arange(len(delays))[:, None], target_idx] = True
+        masks[col] = shifted[:, :n]
+    return masks
+
+
 def shift_signals(df, delay_seconds=60):
     """
     CORRECCIÓN DE LOOK-AHEAD BIAS:
@@ -131,41 +179,16 @@ def shift_signals(df, delay_seconds=60):
     print(f"  Desplazando señales {delay_seconds}s hacia adelante")
 
     df = df.copy()
-    df['time_sec'] = (df['TimeBin'] - df['TimeBin'].min()).dt.total_seconds()
 
     # Contar señales originales
     original_bid_abs = df['bid_abs'].sum()
     original_ask_abs = df['ask_abs'].sum()
     print(f"  Señales originales: BID={original_bid_abs}, ASK={original_ask_abs}")
 
-    # Crear nuevas columnas desplazadas
-    df['bid_abs_shifted'] = False
-    df['ask_abs_shifted'] = False
-
-    # Para cada señal original, marcarla delay_seconds después
-    for idx in df[df['bid_abs']].index:
-        t_original = df.loc[idx, 'time_sec']
-        t_target = t_original + delay_seconds
-
-        # Buscar la fila más cercana a t_target
-        future_mask = df['time_sec'] >= t_target
-        if future_mask.any():
-            target_idx = df[future_mask].index[0]
-            df.loc[target_idx, 'bid_abs_shifted'] = True
-
-    for idx in df[df['ask_abs']].index:
-        t_original = df.loc[idx, 'time_sec']
-        t_target = t_original + delay_seconds
-
-        # Buscar la fila más cercana a t_target
-        future_mask = df['time_sec'] >= t_target
-        if future_mask.any():
-            target_idx = df[future_mask].index[0]
-            df.loc[target_idx, 'ask_abs_shifted'] = True
-
     # Reemplazar columnas originales con las desplazadas
-    df['bid_abs'] = df['bid_abs_shifted']
-    df['ask_abs'] = df['ask_abs_shifted']
+    masks = shifted_signal_masks(df, [delay_seconds])
+    df['bid_abs'] = masks['bid_abs'][0]
+    df['ask_abs'] = masks['ask_abs'][0]
 
     # Contar señales después del shift
     shifted_bid_abs = df['bid_abs'].sum()
@@ -173,217 +196,101 @@ def shift_signals(df, delay_seconds=60):
     print(f"  Señales después del shift: BID={shifted_bid_abs}, ASK={shifted_ask_abs}")
     print(f"  Señales perdidas (fuera de ventana): BID={original_bid_abs - shifted_bid_abs}, ASK={original_ask_abs - shifted_ask_abs}")
 
-    # Limpiar columnas temporales
-    df = df.drop(columns=['time_sec', 'bid_abs_shifted', 'ask_abs_shifted'])
-
     return df
 
 
+def engine_inputs(df):
+    """
+    Señales y filas para backtest_engine: LONG con bid_abs, SHORT con ask_abs;
+    las filas sin ATR se ignoran.
+    """
+    return dict(
+        times=df['TimeBin'], prices=df['Precio'],
+        long_signal=df['bid_abs'].astype(bool),
+        short_signal=df['ask_abs'].astype(bool),
+        active=df['atr'].notna(),  # Skip si no hay ATR calculado aún
+        eod_time=EOD_TIME,
+        point_value=POINT_VALUE, contracts=CONTRACTS,
+    )
+
+
 def run_backtest(df):
     """
     Ejecuta backtest de la estrategia CON CORRECCIÓN DE BIAS.
+
+    La gestión TP/SL/EOD la hace backtest_engine.run_backtest.
     """
     print("\n" + "="*70)
     print("BACKTESTING ESTRATEGIA CON CORRECCIÓN DE LOOK-AHEAD BIAS")
     print("="*70)
 
-    trades = []
-    position = None  # None, 'LONG', 'SHORT'
-    entry_price = None
-    entry_time = None
-    entry_atr = None
-    tp_price = None
-    sl_price = None
-
-    total_rows = len(df)
-
-    for idx, row in df.iterrows():
-        current_time = row['TimeBin']
-        current_price = row['Precio']
-        current_atr = row['atr']
-        bid_abs = row.get('bid_abs', False)
-        ask_abs = row.get('ask_abs', False)
-
-        # Skip si no hay ATR calculado aún
-        if pd.isna(current_atr):
-            continue
-
-        # === GESTIÓN DE POSICIÓN ABIERTA ===
-        if position is not None:
-
-            # Verificar cierre EOD
-            if current_time.time() >= EOD_TIME:
-                exit_price = current_price
-                exit_time = current_time
-
-                if position == 'LONG':
-                    profit_points = exit_price - entry_price
-                else:  # SHORT
-                    profit_points = entry_price - exit_price
-
-                profit_dollars = profit_points * POINT_VALUE * CONTRACTS
-
-                trades.append({
-                    'entry_time': entry_time,
-                    'entry_price': entry_price,
-                    'exit_time': exit_time,
-                    'exit_price': exit_price,
-                    'side': position,
-                    'tp_price': tp_price,
-                    'sl_price': sl_price,
-                    'atr_entry': entry_atr,
-                    'resultado': 'EOD',
-                    'profit_points': round(profit_points, 2),
-                    'profit_dollars': round(profit_dollars, 2),
-                    'contracts': CONTRACTS
-                })
-
-                position = None
-                continue
-
-            # Verificar TP
-            if position == 'LONG' and current_price >= tp_price:
-                profit_points = tp_price - entry_price
-                profit_dollars = profit_points * POINT_VALUE * CONTRACTS
-
-                trades.append({
-                    'entry_time': entry_time,
-                    'entry_price': entry_price,
-                    'exit_time': current_time,
-                    'exit_price': tp_price,
-                    'side': position,
-                    'tp_price': tp_price,
-                    'sl_price': sl_price,
-                    'atr_entry': entry_atr,
-                    'resultado': 'TARGET',
-                    'profit_points': round(profit_points, 2),
-                    'profit_dollars': round(profit_dollars, 2),
-                    'contracts': CONTRACTS
-                })
-
-                position = None
-                continue
-
-            elif position == 'SHORT' and current_price <= tp_price:
-                profit_points = entry_price - tp_price
-                profit_dollars = profit_points * POINT_VALUE * CONTRACTS
-
-                trades.append({
-                    'entry_time': entry_time,
-                    'entry_price': entry_price,
-                    'exit_time': current_time,
-                    'exit_price': tp_price,
-                    'side': position,
-                    'tp_price': tp_price,
-                    'sl_price': sl_price,
-                    'atr_entry': entry_atr,
-                    'resultado': 'TARGET',
-                    'profit_points': round(profit_points, 2),
-                    'profit_dollars': round(profit_dollars, 2),
-                    'contracts': CONTRACTS
-                })
-
-                position = None
-                continue
-
-            # Verificar SL
-            if position == 'LONG' and current_price <= sl_price:
-                profit_points = sl_price - entry_price
-                profit_dollars = profit_points * POINT_VALUE * CONTRACTS
-
-                trades.append({
-                    'entry_time': entry_time,
-                    'entry_price': entry_price,
-                    'exit_time': current_time,
-                    'exit_price': sl_price,
-                    'side': position,
-                    'tp_price': tp_price,
-                    'sl_price': sl_price,
-                    'atr_entry': entry_atr,
-                    'resultado': 'STOP',
-                    'profit_points': round(profit_points, 2),
-                    'profit_dollars': round(profit_dollars, 2),
-                    'contracts': CONTRACTS
-                })
-
-                position = None
-                continue
-
-            elif position == 'SHORT' and current_price >= sl_price:
-                profit_points = entry_price - sl_price
-                profit_dollars = profit_points * POINT_VALUE * CONTRACTS
-
-                trades.append({
-                    'entry_time': entry_time,
-                    'entry_price': entry_price,
-                    'exit_time': current_time,
-                    'exit_price': sl_price,
-                    'side': position,
-                    'tp_price': tp_price,
-                    'sl_price': sl_price,
-                    'atr_entry': entry_atr,
-                    'resultado': 'STOP',
-                    'profit_points': round(profit_points, 2),
-                    'profit_dollars': round(profit_dollars, 2),
-                    'contracts': CONTRACTS
-                })
-
-                position = None
-                continue
-
-        # === SEÑALES DE ENTRADA (CON SEÑALES CORREGIDAS) ===
-        if position is None:
-
-            # LONG: BID Absorption (señal ahora disponible en el momento correcto)
-            if bid_abs:
-                position = 'LONG'
-                entry_price = current_price
-                entry_time = current_time
-                entry_atr = current_atr
-                tp_price = entry_price + TP_POINTS
-                sl_price = entry_price - SL_POINTS
-
-            # SHORT: ASK Absorption (señal ahora disponible en el momento correcto)
-            elif ask_abs:
-                position = 'SHORT'
-                entry_price = current_price
-                entry_time = current_time
-                entry_atr = current_atr
-                tp_price = entry_price - TP_POINTS
-                sl_price = entry_price + SL_POINTS
-
-        # Progreso
-        if (idx + 1) % 10000 == 0:
-            print(f"  Procesado {idx + 1:,}/{total_rows:,} ({(idx+1)/total_rows*100:.1f}%)")
-
-    # Cerrar posición abierta al final del backtest
-    if position is not None:
-        exit_price = df.iloc[-1]['Precio']
-        exit_time = df.iloc[-1]['TimeBin']
-
-        if position == 'LONG':
-            profit_points = exit_price - entry_price
-        else:
-            profit_points = entry_price - exit_price
-
-        profit_dollars = profit_points * POINT_VALUE * CONTRACTS
-
-        trades.append({
-            'entry_time': entry_time,
-            'entry_price': entry_price,
-            'exit_time': exit_time,
-            'exit_price': exit_price,
-            'side': position,
-            'tp_price': tp_price,
-            'sl_price': sl_price,
-            'atr_entry': entry_atr,
-            'resultado': 'EOD',
-            'profit_points': round(profit_points, 2),
-            'profit_dollars': round(profit_dollars, 2),
-            'contracts': CONTRACTS
-        })
-
-    return pd.DataFrame(trades)
+    ledger = backtest_engine.run_backtest(**engine_inputs(df), tp_points=TP_POINTS, sl_points=SL_POINTS)
+    print(f"  Procesado {len(df):,} filas: {len(ledger):,} trades")
+
+    return ledger.to_frame(labels={backtest_engine.END_OF_DATA: 'EOD'}, extra={'atr_entry': df['atr']})
+
+
+def run_sweep(df):
+    """
+    Barrido de TP_GRID x SL_GRID sobre las mismas señales y ticks.
+
+    Returns:
+        DataFrame con una fila por combinación (tp_points, sl_points, trades,
+        total_profit, win_rate, max_drawdown, ...), guardado en SWEEP_OUTPUT_FILE.
+    """
+    print("\n" + "="*70)
+    print(f"BARRIDO TP/SL: {len(TP_GRID)} TP x {len(SL_GRID)} SL")
+    print("="*70)
+
+    start = datetime.now()
+    table = backtest_engine.sweep_brackets(**engine_inputs(df), tp_grid=TP_GRID, sl_grid=SL_GRID)
+    print(f"  {len(table)} combinaciones en {(datetime.now() - start).total_seconds():.2f}s")
+
+    print("\nProfit total ($) por TP (filas) y SL (columnas):")
+    print(table.pivot(index='tp_points', columns='sl_points', values='total_profit').to_string())
+
+    best = table.sort_values('total_profit', ascending=False).head(5)
+    print("\nMejores combinaciones:")
+    print(best[['tp_points', 'sl_points', 'trades', 'total_profit', 'win_rate', 'max_drawdown']].to_string(index=False))
+
+    path = backtest_engine.save_sweep(table, SWEEP_OUTPUT_FILE)
+    print(f"\nBarrido guardado en {path}")
+    return table
+
+
+def run_delay_sweep(df):
+    """
+    Backtest sin bias para cada retraso de DELAY_GRID.
+
+    Las señales de todos los retrasos se desplazan en una sola llamada
+    (shifted_signal_masks); el ATR y los datos se reutilizan.
+
+    Returns:
+        DataFrame con una fila por retraso (delay_sec, señales y métricas),
+        guardado en DELAY_OUTPUT_FILE.
+    """
+    print("\n" + "="*70)
+    print(f"BARRIDO DE RETRASOS: {DELAY_GRID} s (TP={TP_POINTS}, SL={SL_POINTS})")
+    print("="*70)
+
+    masks = shifted_signal_masks(df, DELAY_GRID)
+    inputs = engine_inputs(df)
+    results = []
+    for k, delay in enumerate(DELAY_GRID):
+        inputs.update(long_signal=masks['bid_abs'][k], short_signal=masks['ask_abs'][k])
+        ledger = backtest_engine.run_backtest(**inputs, tp_points=TP_POINTS, sl_points=SL_POINTS)
+        results.append({'delay_sec': delay,
+                        'bid_signals': int(masks['bid_abs'][k].sum()),
+                        'ask_signals': int(masks['ask_abs'][k].sum()),
+                        **backtest_engine.ledger_stats(ledger)})
+
+    table = pd.DataFrame(results)
+    print(table[['delay_sec', 'bid_signals', 'ask_signals', 'trades', 'total_profit', 'win_rate',
+                 'max_drawdown']].to_string(index=False))
+
+    path = backtest_engine.save_sweep(table, DELAY_OUTPUT_FILE)
+    print(f"\nBarrido guardado en {path}")
+    return table
 
 
 def generate_statistics(trades_df):
@@ -478,9 +385,13 @@ def generate_statistics(trades_df):
     print("\n" + "="*70)
 
 
-def main():
+def main(sweep=False, delay_sweep=False):
     """
     Función principal.
+
+    Args:
+        sweep: si es True, ejecuta el barrido TP/SL en lugar del backtest único
+        delay_sweep: si es True, ejecuta el barrido de DELAY_GRID
     """
     print("="*70)
     print("ESTRATEGIA CON CORRECCIÓN DE LOOK-AHEAD BIAS")
@@ -520,12 +431,18 @@ def main():
     if missing:
         raise ValueError(f"Columnas faltantes: {missing}")
 
+    if delay_sweep:
+        return run_delay_sweep(calculate_atr(df, period=ATR_PERIOD))
+
     # PASO CRÍTICO: Aplicar corrección de look-ahead bias
     df = shift_signals(df, delay_seconds=SIGNAL_DELAY_SEC)
 
     # Calcular ATR
     df = calculate_atr(df, period=ATR_PERIOD)
 
+    if sweep:
+        return run_sweep(df)
+
     # Ejecutar backtest
     trades_df = run_backtest(df)
 
@@ -551,6 +468,10 @@ def main():
 
 
 if __name__ == "__main__":
+    if '--sweep' in sys.argv or '--delays' in sys.argv:
+        main(sweep='--sweep' in sys.argv, delay_sweep='--delays' in sys.argv)
+        sys.exit(0)
+
     trades_result = main()
 
     # ========== VISUALIZACIÓN AUTOMÁTICA DE TRADES ==========
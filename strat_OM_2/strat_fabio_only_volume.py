@@ -26,10 +26,16 @@ Gestión:
 - Cierre automático al final del día (EOD)
 """
 
+import os
+import sys
+from datetime import datetime, time
+from pathlib import Path
+
 import pandas as pd
 import numpy as np
-from datetime import datetime, time
-import os
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+import backtest_engine
 
 # ========== CONFIGURACIÓN ==========
 STRAT_NAME = 'strat_fabio_only_volume'
@@ -110,6 +116,38 @@ def load_data(filepath):
     return df
 
 
+def build_signals(df):
+    """
+    Señales de entrada según FILTER_MODE.
+
+    Returns:
+        (long_signal, short_signal): Series booleanas por fila. SHORT solo se
+        evalúa en filas sin círculo rojo (bid_vol).
+    """
+    bid_vol = df['bid_vol'].astype(bool)
+    ask_vol = df['ask_vol'].astype(bool)
+
+    if FILTER_MODE == "MODO_1":
+        # Sin filtro adicional
+        long_ok = short_ok = True
+    elif FILTER_MODE == "MODO_2":
+        # Filtro por densidad individual
+        long_ok = df['bid_density'] > DENSITY_THRESHOLD
+        short_ok = df['ask_density'] > DENSITY_THRESHOLD
+    elif FILTER_MODE == "MODO_3":
+        # Filtro por net_density (área roja = más BID, área verde = más ASK)
+        long_ok = df['net_density'] < -NET_DENSITY_THRESHOLD
+        short_ok = df['net_density'] > NET_DENSITY_THRESHOLD
+    else:
+        long_ok = short_ok = False
+
+    # LONG: Círculo rojo (bid_vol = True)
+    long_signal = bid_vol & long_ok
+    # SHORT: Círculo verde (ask_vol = True)
+    short_signal = ~bid_vol & ask_vol & short_ok
+    return long_signal, short_signal
+
+
 def run_backtest(df):
     """Ejecuta backtest de la estrategia de volumen extremo."""
     print("\n" + "="*70)
@@ -124,228 +162,24 @@ def run_backtest(df):
         print(f"  Threshold net_density: {NET_DENSITY_THRESHOLD}")
     print("="*70)
 
-    trades = []
-    position = None  # None, 'LONG', 'SHORT'
-    entry_price = None
-    entry_time = None
-    tp_price = None
-    sl_price = None
-    entry_density_bid = None
-    entry_density_ask = None
-    entry_net_density = None
-
-    for idx, row in df.iterrows():
-        current_time = row['TimeBin']
-        current_price = row['Precio']
-        bid_vol = row.get('bid_vol', False)
-        ask_vol = row.get('ask_vol', False)
-
-        # Obtener métricas según el modo
-        bid_density = row.get('bid_density', 0)
-        ask_density = row.get('ask_density', 0)
-        net_density = row.get('net_density', 0)
-
-        # === GESTIÓN DE POSICIÓN ABIERTA ===
-        if position is not None:
-
-            # Verificar cierre EOD
-            if current_time.time() >= EOD_TIME:
-                exit_price = current_price
-                exit_time = current_time
-
-                if position == 'LONG':
-                    profit_points = exit_price - entry_price
-                else:  # SHORT
-                    profit_points = entry_price - exit_price
-
-                profit_dollars = profit_points * POINT_VALUE * CONTRACTS
-
-                trades.append({
-                    'entry_time': entry_time,
-                    'entry_price': entry_price,
-                    'exit_time': exit_time,
-                    'exit_price': exit_price,
-                    'side': position,
-                    'tp_price': tp_price,
-                    'sl_price': sl_price,
-                    'entry_bid_density': entry_density_bid,
-                    'entry_ask_density': entry_density_ask,
-                    'entry_net_density': entry_net_density,
-                    'filter_mode': FILTER_MODE,
-                    'resultado': 'EOD',
-                    'profit_points': round(profit_points, 2),
-                    'profit_dollars': round(profit_dollars, 2),
-                    'contracts': CONTRACTS
-                })
-
-                position = None
-                continue
-
-            # Verificar TP
-            if position == 'LONG' and current_price >= tp_price:
-                profit_points = tp_price - entry_price
-                profit_dollars = profit_points * POINT_VALUE * CONTRACTS
-
-                trades.append({
-                    'entry_time': entry_time,
-                    'entry_price': entry_price,
-                    'exit_time': current_time,
-                    'exit_price': tp_price,
-                    'side': position,
-                    'tp_price': tp_price,
-                    'sl_price': sl_price,
-                    'entry_bid_density': entry_density_bid,
-                    'entry_ask_density': entry_density_ask,
-                    'entry_net_density': entry_net_density,
-                    'filter_mode': FILTER_MODE,
-                    'resultado': 'TP',
-                    'profit_points': round(profit_points, 2),
-                    'profit_dollars': round(profit_dollars, 2),
-                    'contracts': CONTRACTS
-                })
-
-                position = None
-                continue
-
-            elif position == 'SHORT' and current_price <= tp_price:
-                profit_points = entry_price - tp_price
-                profit_dollars = profit_points * POINT_VALUE * CONTRACTS
-
-                trades.append({
-                    'entry_time': entry_time,
-                    'entry_price': entry_price,
-                    'exit_time': current_time,
-                    'exit_price': tp_price,
-                    'side': position,
-                    'tp_price': tp_price,
-                    'sl_price': sl_price,
-                    'entry_bid_density': entry_density_bid,
-                    'entry_ask_density': entry_density_ask,
-                    'entry_net_density': entry_net_density,
-                    'filter_mode': FILTER_MODE,
-                    'resultado': 'TP',
-                    'profit_points': round(profit_points, 2),
-                    'profit_dollars': round(profit_dollars, 2),
-                    'contracts': CONTRACTS
-                })
-
-                position = None
-                continue
-
-            # Verificar SL
-            if position == 'LONG' and current_price <= sl_price:
-                profit_points = sl_price - entry_price
-                profit_dollars = profit_points * POINT_VALUE * CONTRACTS
-
-                trades.append({
-                    'entry_time': entry_time,
-                    'entry_price': entry_price,
-                    'exit_time': current_time,
-                    'exit_price': sl_price,
-                    'side': position,
-                    'tp_price': tp_price,
-                    'sl_price': sl_price,
-                    'entry_bid_density': entry_density_bid,
-                    'entry_ask_density': entry_density_ask,
-                    'entry_net_density': entry_net_density,
-                    'filter_mode': FILTER_MODE,
-                    'resultado': 'SL',
-                    'profit_points': round(profit_points, 2),
-                    'profit_dollars': round(profit_dollars, 2),
-                    'contracts': CONTRACTS
-                })
-
-                position = None
-                continue
-
-            elif position == 'SHORT' and current_price >= sl_price:
-                profit_points = entry_price - sl_price
-                profit_dollars = profit_points * POINT_VALUE * CONTRACTS
-
-                trades.append({
-                    'entry_time': entry_time,
-                    'entry_price': entry_price,
-                    'exit_time': current_time,
-                    'exit_price': sl_price,
-                    'side': position,
-                    'tp_price': tp_price,
-                    'sl_price': sl_price,
-                    'entry_bid_density': entry_density_bid,
-                    'entry_ask_density': entry_density_ask,
-                    'entry_net_density': entry_net_density,
-                    'filter_mode': FILTER_MODE,
-                    'resultado': 'SL',
-                    'profit_points': round(profit_points, 2),
-                    'profit_dollars': round(profit_dollars, 2),
-                    'contracts': CONTRACTS
-                })
-
-                position = None
-                continue
-
-        # === SEÑALES DE ENTRADA ===
-        if position is None:
-
-            # === SEÑALES DE ENTRADA SEGÚN MODO ===
-
-            # LONG: Círculo rojo (bid_vol = True)
-            if bid_vol:
-                long_signal = False
-
-                if FILTER_MODE == "MODO_1":
-                    # Sin filtro adicional
-                    long_signal = True
-
-                elif FILTER_MODE == "MODO_2":
-                    # Filtro por densidad individual
-                    if bid_density > DENSITY_THRESHOLD:
-                        long_signal = True
-
-                elif FILTER_MODE == "MODO_3":
-                    # Filtro por net_density (área roja, más BID que ASK)
-                    if net_density < -NET_DENSITY_THRESHOLD:
-                        long_signal = True
-
-                if long_signal:
-                    position = 'LONG'
-                    entry_price = current_price
-                    entry_time = current_time
-                    tp_price = entry_price + TP_POINTS
-                    sl_price = entry_price - SL_POINTS
-                    entry_density_bid = bid_density
-                    entry_density_ask = ask_density
-                    entry_net_density = net_density
-
-            # SHORT: Círculo verde (ask_vol = True)
-            elif ask_vol:
-                short_signal = False
-
-                if FILTER_MODE == "MODO_1":
-                    # Sin filtro adicional
-                    short_signal = True
-
-                elif FILTER_MODE == "MODO_2":
-                    # Filtro por densidad individual
-                    if ask_density > DENSITY_THRESHOLD:
-                        short_signal = True
-
-                elif FILTER_MODE == "MODO_3":
-                    # Filtro por net_density (área verde, más ASK que BID)
-                    if net_density > NET_DENSITY_THRESHOLD:
-                        short_signal = True
-
-                if short_signal:
-                    position = 'SHORT'
-                    entry_price = current_price
-                    entry_time = current_time
-                    tp_price = entry_price - TP_POINTS
-                    sl_price = entry_price + SL_POINTS
-                    entry_density_bid = bid_density
-                    entry_density_ask = ask_density
-                    entry_net_density = net_density
+    long_signal, short_signal = build_signals(df)
+    ledger = backtest_engine.run_backtest(
+        df['TimeBin'], df['Precio'], long_signal, short_signal,
+        tp_points=TP_POINTS, sl_points=SL_POINTS, eod_time=EOD_TIME,
+        close_at_end=False,  # Las posiciones abiertas al final de los datos no se cierran
+        point_value=POINT_VALUE, contracts=CONTRACTS,
+    )
 
     # Convertir a DataFrame
-    df_trades = pd.DataFrame(trades)
+    df_trades = ledger.to_frame(
+        labels={backtest_engine.TARGET: 'TP', backtest_engine.STOP: 'SL'},
+        extra={
+            'entry_bid_density': df['bid_density'] if 'bid_density' in df.columns else 0,
+            'entry_ask_density': df['ask_density'] if 'ask_density' in df.columns else 0,
+            'entry_net_density': df['net_density'] if 'net_density' in df.columns else 0,
+            'filter_mode': FILTER_MODE,
+        },
+    )
 
     # Agregar columna de profit acumulado
     if len(df_trades) > 0:
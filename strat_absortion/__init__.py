@@ -1,4 +1,7 @@
 from .rolling_profile import RollingMarketProfile
+from .compact_profile import CompactRollingMarketProfile
+from .profile_cube import ProfileCube, build_profile_cube, load_or_build_cube
 from .tick import Tick, Side
 
-__all__ = ["RollingMarketProfile", "Tick", "Side"]
+__all__ = ["RollingMarketProfile", "CompactRollingMarketProfile", "ProfileCube", "build_profile_cube",
+           "load_or_build_cube", "Tick", "Side"]
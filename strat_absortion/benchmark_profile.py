@@ -0,0 +1,56 @@
+"""
+Speed comparison: RollingMarketProfile (dict) vs CompactRollingMarketProfile (arrays).
+
+Feeds the same NQ ticks to both profiles, checks that profile() matches at
+regular checkpoints and prints ticks/s for each implementation.
+
+    python strat_absortion/benchmark_profile.py [csv_path]
+"""
+import sys
+import time
+from datetime import timedelta
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from tick_store import load_ticks
+from rolling_profile import RollingMarketProfile
+from compact_profile import CompactRollingMarketProfile
+
+# ============ CONFIGURATION ============
+csv_path = sys.argv[1] if len(sys.argv) > 1 else "data/time_and_sales_nq.csv"
+WINDOW_SECONDS = 60
+CHECK_EVERY = 5000  # Compare profiles every N ticks
+# =======================================
+
+df = load_ticks(csv_path, columns=["Timestamp", "Precio", "Volumen", "Lado"])
+timestamps = list(df["Timestamp"])
+prices = df["Precio"].tolist()
+volumes = df["Volumen"].tolist()
+sides = df["Lado"].tolist()
+n = len(df)
+
+
+def run(profile_cls):
+    mp = profile_cls(window=timedelta(seconds=WINDOW_SECONDS))
+    snapshots = []
+    start = time.perf_counter()
+    for i in range(n):
+        mp.update(timestamps[i], prices[i], volumes[i], sides[i])
+        if (i + 1) % CHECK_EVERY == 0:
+            snapshots.append(mp.profile())
+    elapsed = time.perf_counter() - start
+    snapshots.append(mp.profile())
+    return elapsed, snapshots, mp
+
+
+dict_sec, dict_snaps, dict_mp = run(RollingMarketProfile)
+compact_sec, compact_snaps, compact_mp = run(CompactRollingMarketProfile)
+
+mismatches = sum(1 for a, b in zip(dict_snaps, compact_snaps) if a != b)
+
+print(f"\n{n:,} ticks, window {WINDOW_SECONDS}s")
+print(f"  RollingMarketProfile (dict):    {dict_sec:8.3f}s  ({n / dict_sec:,.0f} ticks/s)")
+print(f"  CompactRollingMarketProfile:    {compact_sec:8.3f}s  ({n / compact_sec:,.0f} ticks/s)")
+print(f"  Speedup: {dict_sec / compact_sec:.1f}x")
+print(f"  Checkpoints: {len(dict_snaps)} | profile() mismatches: {mismatches}")
+print(f"  top_prices(3): dict={list(dict_mp.top_prices(3))} compact={list(compact_mp.top_prices(3))}")
@@ -0,0 +1,619 @@
+import heapq
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from tick import Side
+from utils import parse_ts, parse_num
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_ONE_US = timedelta(microseconds=1)
+_SIDE_INDEX = {"BID": 0, "ASK": 1}
+
+
+def _to_ns(ts) -> int:
+    """Timestamp -> int64 nanoseconds since epoch (naive times are UTC, as in parse_ts)."""
+    if isinstance(ts, (int, np.integer)):
+        return int(ts)
+    if isinstance(ts, np.datetime64):
+        return int(ts.astype("datetime64[ns]").astype(np.int64))
+    value = getattr(ts, "value", None)  # pandas.Timestamp
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    return (parse_ts(ts) - _EPOCH) // _ONE_US * 1000
+
+
+def _side_index(side) -> int:
+    idx = _SIDE_INDEX.get(side)
+    if idx is None:
+        idx = 1 if str(side).upper() == "ASK" else 0
+    return idx
+
+
+class _MaxTree:
+    """
+    Max segment tree over level columns (leaf i = column i), stored in a list.
+
+    Point updates stop as soon as an ancestor keeps its value; queries walk one
+    root-to-leaf path (O(log L)). Ties resolve to the lowest column (lowest price).
+    """
+
+    def __init__(self, values: np.ndarray):
+        size = 1
+        while size < len(values):
+            size *= 2
+        tree = np.zeros(2 * size)
+        tree[size:size + len(values)] = values
+        width = size
+        while width > 1:
+            half = width // 2
+            tree[half:width] = np.maximum(tree[width:2 * width:2], tree[width + 1:2 * width:2])
+            width = half
+        self.size = size
+        self.tree = tree.tolist()
+
+    def set(self, i: int, value: float) -> None:
+        t = self.tree
+        i += self.size
+        t[i] = value
+        i //= 2
+        while i:
+            left, right = t[2 * i], t[2 * i + 1]
+            v = left if left >= right else right
+            if t[i] == v:
+                break
+            t[i] = v
+            i //= 2
+
+    def argmax(self) -> int:
+        """Column with the largest positive value (lowest on ties), or -1."""
+        t = self.tree
+        if t[1] <= 0:
+            return -1
+        i = 1
+        while i < self.size:
+            i = 2 * i if t[2 * i] >= t[2 * i + 1] else 2 * i + 1
+        return i - self.size
+
+    def first_positive(self) -> int:
+        t = self.tree
+        if t[1] <= 0:
+            return -1
+        i = 1
+        while i < self.size:
+            i = 2 * i if t[2 * i] > 0 else 2 * i + 1
+        return i - self.size
+
+    def last_positive(self) -> int:
+        t = self.tree
+        if t[1] <= 0:
+            return -1
+        i = 1
+        while i < self.size:
+            i = 2 * i + 1 if t[2 * i + 1] > 0 else 2 * i
+        return i - self.size
+
+    def range_max(self, lo: int, hi: int) -> float:
+        """Largest value in columns [lo, hi] (inclusive), 0 if the range is empty."""
+        t = self.tree
+        best = 0.0
+        lo += self.size
+        hi += self.size + 1
+        while lo < hi:
+            if lo & 1:
+                best = t[lo] if t[lo] > best else best
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                best = t[hi] if t[hi] > best else best
+            lo //= 2
+            hi //= 2
+        return best
+
+    def top(self, n: int) -> List[int]:
+        """Columns of the n largest positive values (best-first search, O(n log L))."""
+        t = self.tree
+        out: List[int] = []
+        heap = [(-t[1], 1)] if t[1] > 0 else []
+        while heap and len(out) < n:
+            neg, i = heapq.heappop(heap)
+            if i >= self.size:
+                out.append(i - self.size)
+                continue
+            for child in (2 * i, 2 * i + 1):
+                if t[child] > 0:
+                    heapq.heappush(heap, (-t[child], child))
+        return out
+
+
+class _Fenwick:
+    """
+    Fenwick (binary indexed) tree of sums over level columns, stored in a list.
+
+    add / prefix are O(log L); find(k) descends the tree to the column holding
+    the k-th unit of mass, which on an indicator tree is the k-th active level.
+    """
+
+    def __init__(self, values: np.ndarray):
+        n = len(values)
+        tree = [0.0] + np.asarray(values, dtype=np.float64).tolist()
+        for i in range(1, n + 1):
+            j = i + (i & -i)
+            if j <= n:
+                tree[j] += tree[i]
+        self.n = n
+        self.tree = tree
+        step = 1
+        while step * 2 <= n:
+            step *= 2
+        self.step = step
+
+    def add(self, i: int, delta: float) -> None:
+        t = self.tree
+        i += 1
+        while i <= self.n:
+            t[i] += delta
+            i += i & -i
+
+    def prefix(self, i: int) -> float:
+        """Sum of columns [0, i)."""
+        t = self.tree
+        total = 0.0
+        while i > 0:
+            total += t[i]
+            i -= i & -i
+        return total
+
+    def find(self, k: float) -> int:
+        """Smallest column c with prefix(c + 1) >= k (k >= 1)."""
+        t = self.tree
+        pos = 0
+        step = self.step
+        while step:
+            nxt = pos + step
+            if nxt <= self.n and t[nxt] < k:
+                pos = nxt
+                k -= t[nxt]
+            step //= 2
+        return pos
+
+
+class CompactRollingMarketProfile:
+    """
+    Array-backed variant of RollingMarketProfile with the same public API.
+
+    Prices are mapped to integer tick offsets; volumes and trade counts per
+    side live in preallocated NumPy arrays indexed by offset, and the rolling
+    window is a ring buffer of parallel arrays (timestamp ns, tick level, side,
+    volume) instead of Tick dataclasses. profile() returns levels sorted by price.
+
+    Max segment trees over the level columns (BID, ASK, Total) answer POC,
+    highest/lowest active price and max-BID/max-ASK level in O(log L). Levels
+    touched by update/expire are marked dirty and the trees are refreshed on
+    the next query, so bursts of ticks on the same level cost one tree update.
+
+    Once shape_metrics() is used, Fenwick trees of active-level count, BID and
+    ASK volume are kept alongside (same dirty levels), so the d/p-shape half
+    split (k-th active level, half sums and maxima) also costs O(log L).
+    """
+
+    def __init__(
+        self,
+        window: timedelta = timedelta(seconds=60),
+        price_tick: Optional[float] = 0.25,
+        levels: int = 1024,
+        capacity: int = 4096,
+    ):
+        self.window = window
+        self.price_tick = price_tick or 0.25
+        self._window_ns = window // _ONE_US * 1000
+
+        # Per-level state: row 0 = BID, row 1 = ASK; column = level - _base
+        self._base: Optional[int] = None
+        self._vol = np.zeros((2, levels), dtype=np.float64)
+        self._cnt = np.zeros((2, levels), dtype=np.int64)
+
+        # Ring buffer of ticks in the window
+        self._t_ts = np.zeros(capacity, dtype=np.int64)
+        self._t_level = np.zeros(capacity, dtype=np.int64)
+        self._t_side = np.zeros(capacity, dtype=np.uint8)
+        self._t_vol = np.zeros(capacity, dtype=np.float64)
+        self._head = 0
+        self._size = 0
+
+        # Indexed structures for extreme / top-N queries (built lazily)
+        self._trees: Optional[Tuple[_MaxTree, _MaxTree, _MaxTree]] = None
+        self._dirty = set()
+        self._sums: Optional[Tuple[_Fenwick, _Fenwick, _Fenwick]] = None  # active, BID, ASK
+
+    # ----- Internal helpers -----
+
+    def _level(self, price) -> int:
+        px = price if isinstance(price, (float, int)) else parse_num(price)
+        return int(round(px / self.price_tick))
+
+    def _price(self, level: int) -> float:
+        return round(level * self.price_tick, 10)
+
+    def _offset(self, level: int) -> int:
+        """Column of a tick level, growing/re-centering the level arrays if needed."""
+        if self._base is None:
+            self._base = level - self._vol.shape[1] // 2
+        off = level - self._base
+        n_levels = self._vol.shape[1]
+        if 0 <= off < n_levels:
+            return off
+
+        lo = min(self._base, level)
+        hi = max(self._base + n_levels, level + 1)
+        new_levels = n_levels
+        while new_levels < (hi - lo) * 2:
+            new_levels *= 2
+        new_base = lo - (new_levels - (hi - lo)) // 2
+        shift = self._base - new_base
+
+        vol = np.zeros((2, new_levels), dtype=np.float64)
+        cnt = np.zeros((2, new_levels), dtype=np.int64)
+        vol[:, shift:shift + n_levels] = self._vol
+        cnt[:, shift:shift + n_levels] = self._cnt
+        self._vol, self._cnt, self._base = vol, cnt, new_base
+        self._trees = None  # Columns moved: rebuild on next query
+        self._sums = None
+        return level - new_base
+
+    def _lookup(self, price) -> int:
+        """Column of a price, or -1 if it is outside the level arrays."""
+        if self._base is None:
+            return -1
+        off = self._level(price) - self._base
+        return off if 0 <= off < self._vol.shape[1] else -1
+
+    def _grow_ticks(self) -> None:
+        cap = len(self._t_ts)
+        order = (self._head + np.arange(self._size)) % cap
+        for name in ("_t_ts", "_t_level", "_t_side", "_t_vol"):
+            old = getattr(self, name)
+            new = np.zeros(cap * 2, dtype=old.dtype)
+            new[: self._size] = old[order]
+            setattr(self, name, new)
+        self._head = 0
+
+    def _expire(self, now_ns: int) -> None:
+        cutoff = now_ns - self._window_ns
+        cap = len(self._t_ts)
+        t_ts, t_level, t_side, t_vol = self._t_ts, self._t_level, self._t_side, self._t_vol
+        vol, cnt, base = self._vol, self._cnt, self._base
+        while self._size and t_ts[self._head] < cutoff:
+            h = self._head
+            off = t_level[h] - base
+            sd = t_side[h]
+            vol[sd, off] -= t_vol[h]
+            cnt[sd, off] -= 1
+            self._dirty.add(int(off))
+            self._head = (h + 1) % cap
+            self._size -= 1
+
+    def _refresh_trees(self) -> Tuple[_MaxTree, _MaxTree, _MaxTree]:
+        """Bring the BID/ASK/Total trees up to date with the dirty levels."""
+        bid, ask = self._vol
+        if self._trees is None or len(self._dirty) > len(bid) // 8:
+            self._trees = (_MaxTree(bid), _MaxTree(ask), _MaxTree(bid + ask))
+            if self._sums is not None:
+                self._sums = self._build_sums()
+        else:
+            bid_tree, ask_tree, total_tree = self._trees
+            sums = self._sums
+            size = bid_tree.size
+            for off in self._dirty:
+                b = float(bid[off])
+                a = float(ask[off])
+                if sums is not None:
+                    # Deltas against the previous leaves of the max trees
+                    old_b = bid_tree.tree[size + off]
+                    old_a = ask_tree.tree[size + off]
+                    if b != old_b:
+                        sums[1].add(off, b - old_b)
+                    if a != old_a:
+                        sums[2].add(off, a - old_a)
+                    was_active = old_b > 0 or old_a > 0
+                    if (b > 0 or a > 0) != was_active:
+                        sums[0].add(off, -1.0 if was_active else 1.0)
+                bid_tree.set(off, b)
+                ask_tree.set(off, a)
+                total_tree.set(off, b + a)
+        self._dirty.clear()
+        return self._trees
+
+    def _build_sums(self) -> Tuple[_Fenwick, _Fenwick, _Fenwick]:
+        bid, ask = self._vol
+        return _Fenwick((bid > 0) | (ask > 0)), _Fenwick(bid), _Fenwick(ask)
+
+    def _level_result(self, off: int, row: Optional[int] = None) -> Optional[Tuple[float, float]]:
+        if off < 0:
+            return None
+        if row is None:
+            value = self._vol[0, off] + self._vol[1, off]
+        else:
+            value = self._vol[row, off]
+        return self._price(self._base + off), float(value)
+
+    # ----- Public API -----
+
+    def update(self, timestamp, price, volume, side: Side) -> None:
+        ts = _to_ns(timestamp)
+        level = self._level(price)
+        vol = float(volume) if isinstance(volume, (int, float)) else float(parse_num(volume))
+        sd = _side_index(side)
+
+        self._expire(ts)
+        off = self._offset(level)
+
+        if self._size == len(self._t_ts):
+            self._grow_ticks()
+        tail = (self._head + self._size) % len(self._t_ts)
+        self._t_ts[tail] = ts
+        self._t_level[tail] = level
+        self._t_side[tail] = sd
+        self._t_vol[tail] = vol
+        self._size += 1
+
+        self._vol[sd, off] += vol
+        self._cnt[sd, off] += 1
+        self._dirty.add(off)
+
+    def update_many(self, ts_ns, price, volume, side, sample_times=None) -> Optional[List[Dict[float, Dict[str, float]]]]:
+        """
+        Apply a batch of pre-parsed ticks in one step (no per-tick parsing).
+
+        Args:
+            ts_ns: int64 nanoseconds (or datetime64) per tick, non-decreasing and
+                not earlier than the last tick already in the profile
+            price: float prices
+            volume: volumes
+            side: side codes (0 = BID, 1 = ASK) or 'BID'/'ASK' strings
+            sample_times: optional sorted times (ns or datetime64). For each one
+                returns the profile() the tick-by-tick update() would hold after
+                the last tick <= sample time (window anchored at that tick).
+                Sample times before the batch return the state at batch start.
+
+        Returns:
+            List of profile dicts (one per sample time) or None.
+        """
+        ts_ns = np.asarray(ts_ns)
+        if ts_ns.dtype.kind == "M":
+            ts_ns = ts_ns.astype("datetime64[ns]").view(np.int64)
+        ts_ns = ts_ns.astype(np.int64, copy=False)
+        levels = np.rint(np.asarray(price, dtype=np.float64) / self.price_tick).astype(np.int64)
+        vols = np.asarray(volume, dtype=np.float64)
+        side = np.asarray(side)
+        if side.dtype.kind in "OUS":
+            sides = (np.char.upper(side.astype(str)) == "ASK").astype(np.uint8)
+        else:
+            sides = side.astype(np.uint8)
+
+        n_new = len(ts_ns)
+        if n_new and (np.any(np.diff(ts_ns) < 0) or (self._size and ts_ns[0] < self._last_ts())):
+            raise ValueError("update_many requiere timestamps ordenados y posteriores al último tick")
+
+        # Window ticks already in the ring (oldest first) + new batch
+        cap = len(self._t_ts)
+        order = (self._head + np.arange(self._size)) % cap
+        n_old = self._size
+        all_ts = np.concatenate((self._t_ts[order], ts_ns))
+        all_level = np.concatenate((self._t_level[order], levels))
+        all_side = np.concatenate((self._t_side[order], sides))
+        all_vol = np.concatenate((self._t_vol[order], vols))
+
+        if n_new:
+            self._offset(int(levels.min()))
+            self._offset(int(levels.max()))
+
+        snapshots = None
+        if sample_times is not None:
+            snapshots = self._snapshots(all_ts, all_level, all_side, all_vol, n_old, sample_times)
+
+        if n_new == 0:
+            return snapshots
+
+        # Keep ticks inside the window of the last tick
+        keep_from = int(np.searchsorted(all_ts, all_ts[-1] - self._window_ns, side="left"))
+
+        # Remove expired old ticks, add surviving new ones
+        n_levels = self._vol.shape[1]
+        expired = slice(0, min(keep_from, n_old))
+        added = slice(max(keep_from, n_old), len(all_ts))
+        for rows, sign in ((expired, -1), (added, 1)):
+            offs = all_level[rows] - self._base
+            sds = all_side[rows]
+            for sd in (0, 1):
+                mask = sds == sd
+                self._vol[sd] += sign * np.bincount(offs[mask], weights=all_vol[rows][mask], minlength=n_levels)
+                self._cnt[sd] += sign * np.bincount(offs[mask], minlength=n_levels)
+            if self._trees is not None:
+                self._dirty.update(np.unique(offs).tolist())
+
+        # Rebuild the ring buffer with the surviving ticks
+        size = len(all_ts) - keep_from
+        new_cap = cap
+        while new_cap < size:
+            new_cap *= 2
+        if new_cap != cap:
+            self._t_ts = np.zeros(new_cap, dtype=np.int64)
+            self._t_level = np.zeros(new_cap, dtype=np.int64)
+            self._t_side = np.zeros(new_cap, dtype=np.uint8)
+            self._t_vol = np.zeros(new_cap, dtype=np.float64)
+        self._t_ts[:size] = all_ts[keep_from:]
+        self._t_level[:size] = all_level[keep_from:]
+        self._t_side[:size] = all_side[keep_from:]
+        self._t_vol[:size] = all_vol[keep_from:]
+        self._head = 0
+        self._size = size
+
+        return snapshots
+
+    def _last_ts(self) -> int:
+        return int(self._t_ts[(self._head + self._size - 1) % len(self._t_ts)])
+
+    def _snapshots(self, all_ts, all_level, all_side, all_vol, n_old, sample_times):
+        sample = np.asarray(sample_times)
+        if sample.dtype.kind == "M":
+            sample = sample.astype("datetime64[ns]").view(np.int64)
+        sample = sample.astype(np.int64, copy=False)
+
+        # Exclusive end: ticks processed up to each sample (never before batch start)
+        end = np.maximum(np.searchsorted(all_ts, sample, side="right"), n_old)
+        last_ts = all_ts[np.maximum(end - 1, 0)] if len(all_ts) else np.zeros(len(sample), dtype=np.int64)
+        start = np.searchsorted(all_ts, last_ts - self._window_ns, side="left")
+
+        n_levels = self._vol.shape[1]
+        offs_all = all_level - self._base if len(all_ts) else all_level
+        out = []
+        for s, e in zip(start.tolist(), end.tolist()):
+            if e <= s:
+                out.append({})
+                continue
+            offs = offs_all[s:e]
+            sds = all_side[s:e]
+            v = all_vol[s:e]
+            lo = int(offs.min())
+            bid = np.bincount(offs[sds == 0] - lo, weights=v[sds == 0], minlength=int(offs.max()) - lo + 1)
+            ask = np.bincount(offs[sds == 1] - lo, weights=v[sds == 1], minlength=len(bid))
+            snap: Dict[float, Dict[str, float]] = {}
+            for i in np.flatnonzero((bid > 0) | (ask > 0)).tolist():
+                b = float(bid[i])
+                a = float(ask[i])
+                snap[self._price(self._base + lo + i)] = {"BID": b, "ASK": a, "Total": b + a}
+            out.append(snap)
+        return out
+
+    def profile(self) -> Dict[float, Dict[str, float]]:
+        out: Dict[float, Dict[str, float]] = {}
+        if self._base is None:
+            return out
+        bid_all, ask_all = self._vol
+        for off in np.flatnonzero((bid_all > 0) | (ask_all > 0)).tolist():
+            bid = float(bid_all[off])
+            ask = float(ask_all[off])
+            out[self._price(self._base + off)] = {"BID": bid, "ASK": ask, "Total": bid + ask}
+        return out
+
+    def price_level(self, price) -> Optional[Dict[str, float]]:
+        off = self._lookup(price)
+        if off < 0 or (self._cnt[0, off] <= 0 and self._cnt[1, off] <= 0):
+            return None
+        bid = float(self._vol[0, off])
+        ask = float(self._vol[1, off])
+        return {"BID": bid, "ASK": ask, "Total": bid + ask}
+
+    def get_volume(self, price, side: Side) -> float:
+        off = self._lookup(price)
+        if off < 0:
+            return 0.0
+        return float(self._vol[_side_index(side), off])
+
+    def get_trade_count(self, price, side: Optional[Side] = None) -> int:
+        off = self._lookup(price)
+        if off < 0:
+            return 0
+        if side is None:
+            return int(self._cnt[0, off] + self._cnt[1, off])
+        return int(self._cnt[_side_index(side), off])
+
+    def get_bid_count(self, price) -> int:
+        return self.get_trade_count(price, "BID")
+
+    def get_ask_count(self, price) -> int:
+        return self.get_trade_count(price, "ASK")
+
+    def get_max_ask(self) -> Optional[Tuple[float, float]]:
+        """Highest price with ASK volume -> (price, ASK volume)."""
+        if self._base is None:
+            return None
+        return self._level_result(self._refresh_trees()[1].last_positive(), 1)
+
+    def get_min_bid(self) -> Optional[Tuple[float, float]]:
+        """Lowest price with BID volume -> (price, BID volume)."""
+        if self._base is None:
+            return None
+        return self._level_result(self._refresh_trees()[0].first_positive(), 0)
+
+    def poc(self) -> Optional[Tuple[float, float]]:
+        """Point of Control: price with the largest total volume (lowest on ties)."""
+        if self._base is None:
+            return None
+        return self._level_result(self._refresh_trees()[2].argmax())
+
+    def highest_price(self) -> Optional[float]:
+        """Highest price with volume in the window."""
+        if self._base is None:
+            return None
+        off = self._refresh_trees()[2].last_positive()
+        return self._price(self._base + off) if off >= 0 else None
+
+    def lowest_price(self) -> Optional[float]:
+        """Lowest price with volume in the window."""
+        if self._base is None:
+            return None
+        off = self._refresh_trees()[2].first_positive()
+        return self._price(self._base + off) if off >= 0 else None
+
+    def max_ask_level(self) -> Optional[Tuple[float, float]]:
+        """Price with the largest ASK volume (lowest on ties) -> (price, ASK volume)."""
+        if self._base is None:
+            return None
+        return self._level_result(self._refresh_trees()[1].argmax(), 1)
+
+    def max_bid_level(self) -> Optional[Tuple[float, float]]:
+        """Price with the largest BID volume (lowest on ties) -> (price, BID volume)."""
+        if self._base is None:
+            return None
+        return self._level_result(self._refresh_trees()[0].argmax(), 0)
+
+    def shape_metrics(self) -> Optional[Dict[str, float]]:
+        """
+        Half-split statistics used by the d-Shape / p-Shape criteria, in O(log L).
+
+        With n active levels sorted by price, the lower half is the first
+        ceil(n/2) levels and the upper half the last ceil(n/2) (the middle level
+        belongs to both when n is odd), as in plot_deep.evaluate_profile_shape.
+
+        Returns:
+            dict with num_price_levels, total_bid, total_ask, lower_bid_volume,
+            upper_ask_volume, max_lower_bid, max_upper_ask, min_price, max_price
+            (None when the window is empty).
+        """
+        if self._base is None:
+            return None
+        if self._sums is None:
+            self._refresh_trees()
+            self._sums = self._build_sums()
+        bid_tree, ask_tree, total_tree = self._refresh_trees()
+        active, bid_sums, ask_sums = self._sums
+
+        n = int(round(active.prefix(active.n)))
+        if n == 0:
+            return None
+        first = total_tree.first_positive()
+        last = total_tree.last_positive()
+        lower_end = active.find(n - n // 2)  # Column of the ceil(n/2)-th active level
+        upper_start = active.find(n // 2 + 1)  # Column of the (n//2 + 1)-th active level
+
+        total_bid = bid_sums.prefix(bid_sums.n)
+        total_ask = ask_sums.prefix(ask_sums.n)
+        return {
+            "num_price_levels": n,
+            "total_bid": total_bid,
+            "total_ask": total_ask,
+            "lower_bid_volume": bid_sums.prefix(lower_end + 1),
+            "upper_ask_volume": total_ask - ask_sums.prefix(upper_start),
+            "max_lower_bid": bid_tree.range_max(first, lower_end),
+            "max_upper_ask": ask_tree.range_max(upper_start, last),
+            "min_price": self._price(self._base + first),
+            "max_price": self._price(self._base + last),
+        }
+
+    def top_prices(self, n: int = 10) -> Iterable[Tuple[float, float]]:
+        if self._base is None:
+            return []
+        return [self._level_result(off) for off in self._refresh_trees()[2].top(n)]
@@ -0,0 +1,102 @@
+"""
+Single-pass DOM + market profile snapshots for plot_dom.py.
+
+One pass over the trades builds every rolling profile snapshot (profile cube)
+and, for each snapshot, the row of the latest order book at or before it.
+Nothing is replayed per snapshot, so the precompute is linear in the number
+of trades + snapshots instead of quadratic.
+
+The snapshots are saved as one .npz (cube arrays + book row per snapshot);
+the viewer seeks into them through a lazy frame sequence:
+
+    frames[i] -> (timestamp, profile dict, close, dom_bid, dom_ask)
+
+where dom_bid / dom_ask come from `books[book_row[i]]` ({} before the first trade).
+"""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from profile_cube import ProfileCube, build_profile_cube
+
+
+class DomSnapshots:
+    """Profile cube plus the order-book row that is current at each snapshot."""
+
+    def __init__(self, cube: ProfileCube, book_row):
+        self.cube = cube
+        self.book_row = np.asarray(book_row, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.cube)
+
+    def frames(self, books) -> "DomFrames":
+        """
+        Lazy (timestamp, profile, close, dom_bid, dom_ask) sequence.
+
+        Args:
+            books: sequence indexed by trade row returning (dom_bid, dom_ask)
+        """
+        return DomFrames(self, books)
+
+    def save(self, path) -> Path:
+        path = Path(path)
+        tmp_path = path.with_name(path.name + ".tmp.npz")
+        np.savez(tmp_path, book_row=self.book_row, **self.cube.to_arrays())
+        tmp_path.replace(path)
+        return path
+
+    @classmethod
+    def load(cls, path) -> "DomSnapshots":
+        with np.load(path) as data:
+            return cls(ProfileCube.from_arrays(data, source=path), data["book_row"])
+
+
+class DomFrames:
+    """Read-only sequence view of DomSnapshots; profiles and books are built on access."""
+
+    def __init__(self, snapshots: DomSnapshots, books):
+        self.snapshots = snapshots
+        self.books = books
+
+    def __len__(self) -> int:
+        return len(self.snapshots)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[k] for k in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        cube = self.snapshots.cube
+        row = int(self.snapshots.book_row[i])
+        dom_bid, dom_ask = self.books[row] if row >= 0 else ({}, {})
+        return (pd.Timestamp(int(cube.sample_ts[i])), cube.profile(i), cube.close_price(i),
+                dom_bid, dom_ask)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def build_dom_snapshots(ts_ns, price, size, side, sample_ts, window_sec: float,
+                        price_tick: float = 0.25) -> DomSnapshots:
+    """
+    Build profile + order-book snapshots in one pass over time-sorted trades.
+
+    Args:
+        ts_ns: trade timestamps (int64 ns or datetime64), sorted ascending
+        price, size, side: trade price, size and 'BID'/'ASK' side
+        sample_ts: snapshot times (int64 ns or datetime64)
+        window_sec: market profile rolling window in seconds
+    """
+    cube = build_profile_cube(ts_ns, price, size, side, sample_ts,
+                              window_ns=int(window_sec * 1e9), price_tick=price_tick)
+    ts = np.asarray(ts_ns)
+    if ts.dtype.kind == "M":
+        ts = ts.astype("datetime64[ns]").view(np.int64)
+    # Latest order book = last trade row at or before each snapshot (-1 = none yet)
+    book_row = np.searchsorted(ts.astype(np.int64, copy=False), cube.sample_ts, side="right") - 1
+    return DomSnapshots(cube, book_row)
@@ -1,10 +1,11 @@
 import pandas as pd
+import numpy as np
 import matplotlib
 
 matplotlib.use("Agg")  # Use non-interactive backend
 import matplotlib.pyplot as plt
 from datetime import timedelta
-from rolling_profile import RollingMarketProfile
+from compact_profile import CompactRollingMarketProfile
 import os
 
 # Create output directory for plots
@@ -214,7 +215,7 @@ print(f"  Madrid time equivalent: 15:30 - 22:00 (CEST, 6 hours ahead)")
 print("=" * 80)
 
 # Create rolling market profile with 60-second window
-mp = RollingMarketProfile(window=timedelta(seconds=60))
+mp = CompactRollingMarketProfile(window=timedelta(seconds=60))
 
 # Track detected patterns
 detection_count = 0
@@ -232,12 +233,23 @@ print(f"  - BID_AT_LOW: Heavy BID volume at lowest price + current price at low"
 print(f"  - Price tolerance: 0.25 (1 tick)")
 print("=" * 80)
 
+# Pre-parsed tick arrays (no per-row lookups or string parsing)
+tick_times = df["Timestamp"].tolist()
+tick_ns = df["Timestamp"].to_numpy().astype("datetime64[ns]").view(np.int64)
+tick_prices = df["Precio"].to_numpy(dtype=float)
+tick_volumes = df["Volumen"].to_numpy()
+tick_sides = df["Lado"].to_numpy()
+prices_list = tick_prices.tolist()
+volumes_list = tick_volumes.tolist()
+sides_list = tick_sides.tolist()
+ns_list = tick_ns.tolist()
+
 # Process each tick
-for idx, row in df.iterrows():
-    mp.update(row["Timestamp"], row["Precio"], row["Volumen"], row["Lado"])
+for i in range(len(df)):
+    mp.update(ns_list[i], prices_list[i], volumes_list[i], sides_list[i])
 
-    current_time = row["Timestamp"]
-    current_price = float(str(row["Precio"]).replace(",", "."))
+    current_time = tick_times[i]
+    current_price = prices_list[i]
 
     # Skip warmup period (first 2 minutes)
     if (current_time - start_time) < WARMUP_PERIOD:
@@ -249,45 +261,21 @@ for idx, row in df.iterrows():
         if time_since_last < COOLDOWN_PERIOD:
             continue  # Skip detection, still in cooldown
 
-    # Get current profile
-    profile = mp.profile()
-
-    if not profile:
-        continue
+    # Profile extremes from the indexed structures (O(log n), no full profile per tick)
+    highest_price = mp.highest_price()
+    lowest_price = mp.lowest_price()
 
-    # Get all prices
-    prices = sorted(profile.keys())
-    if len(prices) < 2:
+    # Need at least 2 price levels
+    if highest_price is None or highest_price == lowest_price:
         continue
 
-    highest_price = prices[-1]
-    lowest_price = prices[0]
+    # Max ASK level (lowest price on ties)
+    max_ask = mp.max_ask_level()
+    max_ask_price, max_ask_volume = max_ask if max_ask else (None, 0)
 
-    # Get ASK volumes and find max
-    ask_volumes = {p: profile[p]["ASK"] for p in prices if profile[p]["ASK"] > 0}
-    if ask_volumes:
-        max_ask_price = max(ask_volumes, key=ask_volumes.get)
-        max_ask_volume = ask_volumes[max_ask_price]
-    else:
-        max_ask_price = None
-        max_ask_volume = 0
-
-    # Get BID volumes and find max
-    bid_volumes = {p: profile[p]["BID"] for p in prices if profile[p]["BID"] > 0}
-    if bid_volumes:
-        max_bid_price = min(
-            bid_volumes,
-            key=lambda p: (
-                p if bid_volumes[p] == max(bid_volumes.values()) else float("inf")
-            ),
-        )
-        # Find the price with maximum BID volume
-        max_bid_volume = max(bid_volumes.values())
-        prices_with_max_bid = [p for p, v in bid_volumes.items() if v == max_bid_volume]
-        max_bid_price = min(prices_with_max_bid) if prices_with_max_bid else None
-    else:
-        max_bid_price = None
-        max_bid_volume = 0
+    # Max BID level (lowest price on ties)
+    max_bid = mp.max_bid_level()
+    max_bid_price, max_bid_volume = max_bid if max_bid else (None, 0)
 
     # Check conditions:
     # 1. Maximum ASK volume is at the highest price AND current price is at the high
@@ -325,6 +313,12 @@ for idx, row in df.iterrows():
     if condition_met:
         detection_count += 1
 
+        # Full profile only when a pattern is detected
+        profile = mp.profile()
+        prices = sorted(profile.keys())
+        ask_volumes = {p: profile[p]["ASK"] for p in prices if profile[p]["ASK"] > 0}
+        bid_volumes = {p: profile[p]["BID"] for p in prices if profile[p]["BID"] > 0}
+
         # Calculate time since last detection
         time_since_str = ""
         if last_detection_time is not None:
@@ -335,7 +329,7 @@ for idx, row in df.iterrows():
         last_detection_time = current_time
 
         print(f"\n{'=' * 80}")
-        print(f"DETECTION #{detection_count} at {row['Timestamp']}{time_since_str}")
+        print(f"DETECTION #{detection_count} at {current_time}{time_since_str}")
         print(f"Pattern: {condition_type}")
         print(
             f"Current Price: {current_price:.2f} | Profile Range: {lowest_price:.2f} - {highest_price:.2f}"
@@ -345,13 +339,13 @@ for idx, row in df.iterrows():
 
         # Compute market profile 1 minute after detection
         time_after = current_time + timedelta(seconds=60)
-        mp_after = RollingMarketProfile(window=timedelta(seconds=60))
-
-        ticks_until_after = df[df["Timestamp"] <= time_after]
-        for _, r in ticks_until_after.iterrows():
-            mp_after.update(r["Timestamp"], r["Precio"], r["Volumen"], r["Lado"])
-
-        profile_after = mp_after.profile()
+        mp_after = CompactRollingMarketProfile(window=timedelta(seconds=60))
+        time_after_ns = np.datetime64(time_after, "ns").astype(np.int64)
+        k_after = np.searchsorted(tick_ns, time_after_ns, side="right")
+        profile_after = mp_after.update_many(
+            tick_ns[:k_after], tick_prices[:k_after], tick_volumes[:k_after], tick_sides[:k_after],
+            sample_times=[time_after_ns],
+        )[0]
 
         # Create plot
         print(f"Creating visualization...")
@@ -1,8 +1,10 @@
 import pandas as pd
 import numpy as np
 from datetime import timedelta, datetime
-from rolling_profile import RollingMarketProfile
+from profile_cube import load_or_build_cube
+from shape_detector import detect_signals, save_signals
 import csv
+import sys
 from pathlib import Path
 
 # Use TkAgg backend for better compatibility
@@ -33,56 +35,23 @@ PRICE_POSITION_THRESHOLD = 0.25  # Price must be in lower/upper 33% of the profi
 #csv_path = "data/time_and_sales_nq_30min.csv"
 csv_path = "data/time_and_sales_nq.csv"
 
-print("Loading data...")
-df = pd.read_csv(csv_path, sep=";", decimal=",")
-df["Timestamp"] = pd.to_datetime(df["Timestamp"])
+# Rolling profiles for every 0.5s snapshot come from the profile cube
+# (built once with cumulative sums and cached next to the CSV as .npz)
+print("Loading market profile cube...")
+cube = load_or_build_cube(csv_path, window_sec=PROFILE_FREQUENCY, step="500ms")
 
-# Pre-compute market profiles with 10-second aggregation
-# FIXED: Create ONE RollingMarketProfile and process ticks sequentially
-print("Pre-computing market profiles...")
-profiles_data = []
+# Lazy (timestamp, profile, close) frames: profile dicts are built on access
+profiles_data = cube.frames()
 
-# Generate timestamps every 0.5 seconds for aggregation
-start_time = df["Timestamp"].min()
-end_time = df["Timestamp"].max()
-timestamps = pd.date_range(start=start_time, end=end_time, freq="500ms")
-
-# Create a SINGLE RollingMarketProfile instance
-mp = RollingMarketProfile(window=timedelta(seconds=PROFILE_FREQUENCY))
-
-total_ticks = len(df)
-tick_idx = 0
-last_known_price = None
-
-for i, ts in enumerate(timestamps):
-    if i % 50 == 0:
-        print(f"  Processing {i}/{len(timestamps)}... (tick {tick_idx}/{total_ticks})")
-
-    # Process all ticks up to this timestamp
-    while tick_idx < total_ticks and df.iloc[tick_idx]["Timestamp"] <= ts:
-        row = df.iloc[tick_idx]
-        mp.update(row["Timestamp"], row["Precio"], row["Volumen"], row["Lado"])
-        last_known_price = row["Precio"]  # Track last known price
-        tick_idx += 1
-
-    # Get closing price (last known price up to this timestamp)
-    closing_price = last_known_price
-
-    # Get the current profile (rolling window automatically maintained)
-    profile = mp.profile()
-    profiles_data.append((ts, profile, closing_price))
-
-print(f"Pre-computed {len(profiles_data)} profiles (processed {tick_idx} ticks)")
+print(f"Loaded {len(profiles_data)} profiles ({cube.width} price levels per snapshot)")
 
 # Determine starting index
 if STARTING_TIME is not None:
-    starting_ts = pd.to_datetime(STARTING_TIME)
-    # Find closest timestamp
-    start_idx = 0
-    for i, (ts, _, _) in enumerate(profiles_data):
-        if ts >= starting_ts:
-            start_idx = i
-            break
+    starting_ns = pd.to_datetime(STARTING_TIME).value
+    # First snapshot at or after STARTING_TIME (first frame if none)
+    start_idx = int(np.searchsorted(cube.sample_ts, starting_ns, side="left"))
+    if start_idx >= len(profiles_data):
+        start_idx = 0
     print(f"Starting at timestamp: {profiles_data[start_idx][0]} (index {start_idx})")
 else:
     start_idx = max(0, min(STARTING_INDEX, len(profiles_data) - 1))
@@ -744,80 +713,16 @@ print("\nClose the window to exit.")
 
 # Detect and save d-Shape and p-Shape signals to CSV
 print("\nDetecting d-Shape and p-Shape patterns...")
-output_dir = Path("outputs")
-output_dir.mkdir(exist_ok=True)
-
-# Generate filename with timestamp
-timestamp_str = datetime.now().strftime("%Y%m%d_%H%M%S")
-csv_path_output = output_dir / f"db_shapes_{timestamp_str}.csv"
-
-signals = []
-for i, (timestamp, profile, closing_price) in enumerate(profiles_data):
-    if not profile or closing_price is None:
-        continue
-
-    # Get previous close for pattern detection
-    previous_close = None
-    if i > 0:
-        _, _, previous_close = profiles_data[i - 1]
-
-    # Evaluate profile shape
-    shape = evaluate_profile_shape(profile, closing_price, previous_close)
-
-    # Only save d-Shape and p-Shape signals (not balanced)
-    if shape in ['d_shape', 'p_shape']:
-        # Calculate profile statistics
-        active_prices = []
-        for price in sorted(profile.keys()):
-            bid_vol = profile[price].get('BID', 0)
-            ask_vol = profile[price].get('ASK', 0)
-            if bid_vol > 0 or ask_vol > 0:
-                active_prices.append(price)
-
-        total_bid = sum(profile[p].get('BID', 0) for p in active_prices)
-        total_ask = sum(profile[p].get('ASK', 0) for p in active_prices)
-
-        # Split into halves
-        mid_point = len(active_prices) // 2
-        lower_prices = active_prices[:mid_point + (1 if len(active_prices) % 2 == 1 else 0)]
-        upper_prices = active_prices[mid_point:]
-
-        lower_bid = sum(profile[p].get('BID', 0) for p in lower_prices)
-        upper_ask = sum(profile[p].get('ASK', 0) for p in upper_prices)
-
-        max_lower_bid = max([profile[p].get('BID', 0) for p in lower_prices]) if lower_prices else 0
-        max_upper_ask = max([profile[p].get('ASK', 0) for p in upper_prices]) if upper_prices else 0
-
-        # Price change
-        price_change = closing_price - previous_close if previous_close is not None else 0
-        price_change_pct = (price_change / previous_close * 100) if previous_close is not None and previous_close != 0 else 0
-
-        signals.append({
-            'timestamp': timestamp,
-            'shape': shape,
-            'close_price': closing_price,
-            'previous_close': previous_close,
-            'price_change': price_change,
-            'price_change_pct': price_change_pct,
-            'total_bid': total_bid,
-            'total_ask': total_ask,
-            'bid_ask_ratio': total_bid / total_ask if total_ask > 0 else 0,
-            'num_price_levels': len(active_prices),
-            'lower_bid_volume': lower_bid,
-            'upper_ask_volume': upper_ask,
-            'max_lower_bid': max_lower_bid,
-            'max_upper_ask': max_upper_ask,
-            'bid_concentration': lower_bid / total_bid if total_bid > 0 else 0,
-            'ask_concentration': upper_ask / total_ask if total_ask > 0 else 0,
-        })
+signals = detect_signals(cube, density_shape=DENSITY_SHAPE, min_price_levels=MIN_PRICE_LEVELS,
+                         min_bid_ask_size=MIN_BID_ASK_SIZE,
+                         price_position_threshold=PRICE_POSITION_THRESHOLD)
 
 # Save to CSV
-if signals:
-    df_signals = pd.DataFrame(signals)
-    df_signals.to_csv(csv_path_output, index=False, sep=';', decimal=',')
+if len(signals) > 0:
+    csv_path_output = save_signals(signals)
     print(f"Saved {len(signals)} signals to {csv_path_output}")
-    print(f"  - d-Shape signals: {len([s for s in signals if s['shape'] == 'd_shape'])}")
-    print(f"  - p-Shape signals: {len([s for s in signals if s['shape'] == 'p_shape'])}")
+    print(f"  - d-Shape signals: {int((signals['shape'] == 'd_shape').sum())}")
+    print(f"  - p-Shape signals: {int((signals['shape'] == 'p_shape').sum())}")
 else:
     print("No d-Shape or p-Shape signals detected")
 
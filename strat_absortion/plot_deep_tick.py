@@ -1,10 +1,15 @@
 import pandas as pd
 import numpy as np
 from datetime import timedelta, datetime
-from rolling_profile import RollingMarketProfile
+from compact_profile import CompactRollingMarketProfile
+from shape_detector import classify_shapes, EMPTY_SHAPE_METRICS
 import csv
+import sys
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from tick_store import load_ticks
+
 # Use TkAgg backend for better compatibility
 import matplotlib
 matplotlib.use('TkAgg')
@@ -34,41 +39,54 @@ PRICE_POSITION_THRESHOLD = 0.25  # Price must be in lower/upper 33% of the profi
 csv_path = "data/time_and_sales_nq.csv"
 
 print("Loading data...")
-df = pd.read_csv(csv_path, sep=";", decimal=",")
-df["Timestamp"] = pd.to_datetime(df["Timestamp"])
+df = load_ticks(csv_path, columns=["Timestamp", "Precio", "Volumen", "Lado"])
 
 # Pre-compute market profiles for EACH UNIQUE TICK TIMESTAMP
-# FIXED: Create ONE RollingMarketProfile and process ticks sequentially
+# ONE CompactRollingMarketProfile fed tick by tick from pre-parsed lists; the
+# d/p-shape half-split metrics come from its Fenwick trees in O(log n) per frame
 print("Pre-computing market profiles...")
 profiles_data = []
+frame_metrics = []
+
+# Create a SINGLE rolling profile instance
+mp = CompactRollingMarketProfile(window=timedelta(seconds=PROFILE_FREQUENCY))
 
-# Create a SINGLE RollingMarketProfile instance
-mp = RollingMarketProfile(window=timedelta(seconds=PROFILE_FREQUENCY))
+tick_ts = df["Timestamp"].to_numpy().astype("datetime64[ns]").view(np.int64)
+tick_ts_list = tick_ts.tolist()
+tick_price = df["Precio"].tolist()
+tick_volume = df["Volumen"].tolist()
+tick_side = df["Lado"].tolist()
 
-# Get unique timestamps from actual ticks (keeps original tick precision)
-timestamps = df["Timestamp"].unique()
-timestamps_sorted = sorted(timestamps)
+# Last tick of each unique timestamp (keeps original tick precision)
+frame_end = np.flatnonzero(np.append(tick_ts[1:] != tick_ts[:-1], True)).tolist()
 
 total_ticks = len(df)
 tick_idx = 0
 
-for i, ts in enumerate(timestamps_sorted):
+for i, end in enumerate(frame_end):
     if i % 50 == 0:
-        print(f"  Processing {i}/{len(timestamps_sorted)}... (tick {tick_idx}/{total_ticks})")
+        print(f"  Processing {i}/{len(frame_end)}... (tick {tick_idx}/{total_ticks})")
 
     # Add all ticks that have this exact timestamp
-    while tick_idx < total_ticks and df.iloc[tick_idx]["Timestamp"] == ts:
-        row = df.iloc[tick_idx]
-        mp.update(row["Timestamp"], row["Precio"], row["Volumen"], row["Lado"])
-        closing_price = row["Precio"]  # Last price at this exact timestamp
+    while tick_idx <= end:
+        mp.update(tick_ts_list[tick_idx], tick_price[tick_idx], tick_volume[tick_idx], tick_side[tick_idx])
         tick_idx += 1
+    closing_price = tick_price[end]  # Last price at this exact timestamp
 
     # Get the current profile (rolling window automatically maintained)
-    profile = mp.profile()
-    profiles_data.append((ts, profile, closing_price))
+    profiles_data.append((pd.Timestamp(tick_ts_list[end]), mp.profile(), closing_price))
+    frame_metrics.append(mp.shape_metrics() or EMPTY_SHAPE_METRICS)
 
 print(f"Pre-computed {len(profiles_data)} profiles (processed {tick_idx} ticks)")
 
+# Shape of every frame (same criteria as evaluate_profile_shape, evaluated once)
+frame_close = np.array([close for _, _, close in profiles_data], dtype=np.float64)
+frame_shapes = classify_shapes(pd.DataFrame(frame_metrics, columns=list(EMPTY_SHAPE_METRICS)),
+                               frame_close, np.concatenate([[np.nan], frame_close[:-1]]),
+                               density_shape=DENSITY_SHAPE, min_price_levels=MIN_PRICE_LEVELS,
+                               min_bid_ask_size=MIN_BID_ASK_SIZE,
+                               price_position_threshold=PRICE_POSITION_THRESHOLD)
+
 # Determine starting index
 if STARTING_TIME is not None:
     starting_ts = pd.to_datetime(STARTING_TIME)
@@ -289,8 +307,8 @@ def plot_single_profile(ax, index, title_prefix="", y_limits=None, common_prices
     if index > 0 and index - 1 < len(profiles_data):
         _, _, previous_close = profiles_data[index - 1]
 
-    # Evaluate profile shape with current and previous close prices
-    profile_tag = evaluate_profile_shape(profile, closing_price, previous_close)
+    # Profile shape (pre-computed from the rolling profile's shape metrics)
+    profile_tag = frame_shapes[index]
 
     # Title with closing price (only time, no date) - simplified, single line
     close_str = f' | Close: {closing_price:.2f}' if closing_price is not None else ''
@@ -373,8 +391,8 @@ def plot_price_line(index):
                     if hist_idx > 0 and hist_idx - 1 < len(profiles_data):
                         _, _, previous_close_sig = profiles_data[hist_idx - 1]
 
-                    # Evaluate shape
-                    shape = evaluate_profile_shape(profile_sig, close_sig, previous_close_sig)
+                    # Pre-computed shape
+                    shape = frame_shapes[hist_idx]
 
                     # Calculate profile statistics for tooltip
                     if shape in ['d_shape', 'p_shape']:
@@ -756,8 +774,8 @@ for i, (timestamp, profile, closing_price) in enumerate(profiles_data):
     if i > 0:
         _, _, previous_close = profiles_data[i - 1]
 
-    # Evaluate profile shape
-    shape = evaluate_profile_shape(profile, closing_price, previous_close)
+    # Pre-computed profile shape
+    shape = frame_shapes[i]
 
     # Only save d-Shape and p-Shape signals (not balanced)
     if shape in ['d_shape', 'p_shape']:
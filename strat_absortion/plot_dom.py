@@ -1,8 +1,12 @@
 import pandas as pd
 import numpy as np
-import json
+import sys
 from datetime import timedelta
-from rolling_profile import RollingMarketProfile
+from pathlib import Path
+from dom_snapshots import DomSnapshots, build_dom_snapshots
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from dom_store import open_dom
 
 # Use TkAgg backend for better compatibility
 import matplotlib
@@ -16,60 +20,13 @@ STARTING_TIME = None  # Set to a specific time like "2025-10-20 18:09:00" or Non
 PROFILE_WINDOW = 5  # Market profile rolling window in seconds
 # =======================================
 
-# Load data with custom parser (JSON not quoted in CSV)
+# Load trades + order book from the binary DOM store (built from the CSV on first run)
 csv_path = "data/ts_and_dom.csv"
 print("Loading data with order book...")
 
-# Read file line by line since JSON contains commas
-data_rows = []
-with open(csv_path, 'r') as f:
-    header = f.readline().strip()  # Skip header
-    for line in f:
-        # Split only on first 4 commas to get: Timestamp, Price, Size, Side
-        parts = line.strip().split(',', 4)
-        if len(parts) >= 5:
-            timestamp = parts[0]
-            price = float(parts[1])
-            size = int(parts[2])
-            side = parts[3]
-
-            # Rest of line contains the two JSON objects
-            rest = parts[4]
-
-            # Find where first JSON ends (count braces)
-            brace_count = 0
-            split_idx = 0
-            for i, char in enumerate(rest):
-                if char == '{':
-                    brace_count += 1
-                elif char == '}':
-                    brace_count -= 1
-                    if brace_count == 0:
-                        split_idx = i + 1
-                        break
-
-            dom_bid_str = rest[:split_idx]
-            dom_ask_str = rest[split_idx+1:]  # Skip comma between JSONs
-
-            try:
-                dom_bid = json.loads(dom_bid_str)
-                dom_ask = json.loads(dom_ask_str)
-
-                data_rows.append({
-                    'Timestamp': timestamp,
-                    'Price': price,
-                    'Size': size,
-                    'Side': side,
-                    'DOM_BID_parsed': dom_bid,
-                    'DOM_ASK_parsed': dom_ask
-                })
-            except json.JSONDecodeError as e:
-                print(f"Warning: Failed to parse JSON on line, skipping: {e}")
-                continue
-
-print(f"Loaded {len(data_rows)} rows")
-df = pd.DataFrame(data_rows)
-df["Timestamp"] = pd.to_datetime(df["Timestamp"])
+dom = open_dom(csv_path)
+df = dom.trades()
+print(f"Loaded {len(df)} rows")
 
 # Generate timestamps every 1 second
 start_time = df["Timestamp"].min()
@@ -77,44 +34,31 @@ end_time = df["Timestamp"].max()
 timestamps = pd.date_range(start=start_time, end=end_time, freq="1s")
 
 # Pre-compute market profiles and order book snapshots for all timestamps
+# Single pass: one profile cube over all trades + the latest book row per snapshot,
+# cached next to the CSV so the viewer can seek into it on the next run
 print("Pre-computing market profiles and order book snapshots...")
-profiles_data = []
-
-for i, ts in enumerate(timestamps):
-    if i % 50 == 0:
-        print(f"  Processing {i}/{len(timestamps)}...")
-
-    # Market Profile
-    mp = RollingMarketProfile(window=timedelta(seconds=PROFILE_WINDOW))
-    ticks_until = df[df["Timestamp"] <= ts]
-
-    # Get closing price and latest order book
-    if len(ticks_until) > 0:
-        last_row = ticks_until.iloc[-1]
-        closing_price = float(last_row["Price"])
-        dom_bid = last_row["DOM_BID_parsed"]
-        dom_ask = last_row["DOM_ASK_parsed"]
-    else:
-        closing_price = None
-        dom_bid = {}
-        dom_ask = {}
-
-    for _, row in ticks_until.iterrows():
-        mp.update(row["Timestamp"], row["Price"], row["Size"], row["Side"])
+snapshots_path = Path(csv_path).with_name(f"{Path(csv_path).stem}.dom_snapshots_{PROFILE_WINDOW}s.npz")
+if snapshots_path.exists() and snapshots_path.stat().st_mtime >= Path(csv_path).stat().st_mtime:
+    snapshots = DomSnapshots.load(snapshots_path)
+    print(f"  Loaded snapshots from {snapshots_path}")
+else:
+    snapshots = build_dom_snapshots(df["Timestamp"].to_numpy(), df["Price"].to_numpy(), df["Size"].to_numpy(),
+                                    df["Side"].to_numpy(), timestamps.to_numpy(), window_sec=PROFILE_WINDOW)
+    snapshots.save(snapshots_path)
+    print(f"  Saved snapshots to {snapshots_path}")
 
-    profile = mp.profile()
-    profiles_data.append((ts, profile, closing_price, dom_bid, dom_ask))
+# Order book per trade row, decoded lazily from the store by the frames
+profiles_data = snapshots.frames(dom)
 
 print(f"Pre-computed {len(profiles_data)} profiles with order book data")
 
 # Determine starting index
 if STARTING_TIME is not None:
-    starting_ts = pd.to_datetime(STARTING_TIME)
-    start_idx = 0
-    for i, (ts, _, _, _, _) in enumerate(profiles_data):
-        if ts >= starting_ts:
-            start_idx = i
-            break
+    starting_ns = pd.to_datetime(STARTING_TIME).value
+    # First snapshot at or after STARTING_TIME (first frame if none)
+    start_idx = int(np.searchsorted(snapshots.cube.sample_ts, starting_ns, side="left"))
+    if start_idx >= len(profiles_data):
+        start_idx = 0
     print(f"Starting at timestamp: {profiles_data[start_idx][0]} (index {start_idx})")
 else:
     start_idx = max(0, min(STARTING_INDEX, len(profiles_data) - 1))
@@ -0,0 +1,261 @@
+"""
+Profile cube: rolling market profiles for many snapshot times in one pass.
+
+Instead of feeding ticks one by one and copying a profile dict per frame, the
+cube computes every snapshot with cumulative sums along time: for a window of
+ticks [start, end) the volume per (level, side) is P[end] - P[start], where P
+is the running per-level volume. Snapshots are processed in chunks so P is
+only evaluated at the window boundaries of the chunk, never per tick.
+
+Snapshot semantics match CompactRollingMarketProfile.update_many(sample_times=...):
+the window covers the ticks with ts >= last_ts - window, where last_ts is the
+last tick at or before the sample time.
+
+Layout (dense, relative to the lowest level of each snapshot):
+
+    sample_ts  int64   [S]          snapshot times (ns)
+    lo_level   int64   [S]          lowest tick level of the window
+    volumes    uint32  [S, W, 2]    volume per relative level, side (0=BID, 1=ASK)
+    close      float64 [S]          last price at or before the sample (NaN = none)
+
+Usage:
+    python strat_absortion/profile_cube.py data/time_and_sales_nq.csv [window_sec] [step]
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from tick_store import load_ticks
+
+CUBE_FORMAT = 1
+CHUNK_SNAPSHOTS = 512
+
+
+class ProfileCube:
+    """Dense (snapshot x price level x side) volumes of a rolling market profile."""
+
+    def __init__(self, sample_ts, lo_level, volumes, close, window_ns: int, price_tick: float):
+        self.sample_ts = np.asarray(sample_ts, dtype=np.int64)
+        self.lo_level = np.asarray(lo_level, dtype=np.int64)
+        self.volumes = np.asarray(volumes)
+        self.close = np.asarray(close, dtype=np.float64)
+        self.window_ns = int(window_ns)
+        self.price_tick = float(price_tick)
+
+    def __len__(self) -> int:
+        return len(self.sample_ts)
+
+    @property
+    def width(self) -> int:
+        return self.volumes.shape[1]
+
+    def prices(self, i: int) -> np.ndarray:
+        """Prices of the W relative levels of snapshot i."""
+        return np.round((self.lo_level[i] + np.arange(self.width)) * self.price_tick, 10)
+
+    def profile(self, i: int) -> Dict[float, Dict[str, float]]:
+        """Snapshot i as a profile dict (same format as RollingMarketProfile.profile())."""
+        vols = self.volumes[i]
+        snap: Dict[float, Dict[str, float]] = {}
+        for j in np.flatnonzero(vols.any(axis=1)).tolist():
+            b = float(vols[j, 0])
+            a = float(vols[j, 1])
+            snap[round((int(self.lo_level[i]) + j) * self.price_tick, 10)] = {"BID": b, "ASK": a, "Total": b + a}
+        return snap
+
+    def close_price(self, i: int) -> Optional[float]:
+        c = self.close[i]
+        return None if np.isnan(c) else float(c)
+
+    def frames(self) -> "ProfileFrames":
+        """Lazy (timestamp, profile, close) sequence; profiles are built on access."""
+        return ProfileFrames(self)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Arrays written to the .npz file (also used by files that embed a cube)."""
+        return {"sample_ts": self.sample_ts, "lo_level": self.lo_level, "volumes": self.volumes,
+                "close": self.close, "meta": np.array([CUBE_FORMAT, self.window_ns], dtype=np.int64),
+                "price_tick": np.array(self.price_tick)}
+
+    @classmethod
+    def from_arrays(cls, data, source="profile cube") -> "ProfileCube":
+        fmt, window_ns = data["meta"].tolist()
+        if fmt != CUBE_FORMAT:
+            raise ValueError(f"{source}: unsupported profile cube format {fmt}")
+        return cls(data["sample_ts"], data["lo_level"], data["volumes"], data["close"],
+                   window_ns, float(data["price_tick"]))
+
+    def save(self, path) -> Path:
+        path = Path(path)
+        # Unique temporary name: concurrent builders of the same cube never share a file
+        with tempfile.NamedTemporaryFile(dir=path.parent, prefix=path.name + ".", suffix=".tmp",
+                                         delete=False) as f:
+            tmp_path = Path(f.name)
+            try:
+                np.savez(f, **self.to_arrays())
+            except BaseException:
+                f.close()
+                tmp_path.unlink(missing_ok=True)
+                raise
+        tmp_path.replace(path)
+        return path
+
+    @classmethod
+    def load(cls, path) -> "ProfileCube":
+        with np.load(path) as data:
+            return cls.from_arrays(data, source=path)
+
+
+class ProfileFrames:
+    """Read-only sequence view of a cube as (pd.Timestamp, profile dict, close) tuples."""
+
+    def __init__(self, cube: ProfileCube):
+        self.cube = cube
+
+    def __len__(self) -> int:
+        return len(self.cube)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[k] for k in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        cube = self.cube
+        return pd.Timestamp(int(cube.sample_ts[i])), cube.profile(i), cube.close_price(i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def build_profile_cube(ts_ns, price, volume, side, sample_ts, window_ns: int,
+                       price_tick: float = 0.25, chunk: int = CHUNK_SNAPSHOTS) -> ProfileCube:
+    """
+    Build the profile cube for a sorted tick stream.
+
+    Args:
+        ts_ns: tick timestamps (int64 ns or datetime64), sorted ascending
+        price: tick prices
+        volume: tick volumes
+        side: 'BID'/'ASK' labels or 0/1 codes
+        sample_ts: snapshot times (int64 ns or datetime64)
+        window_ns: rolling window length in nanoseconds
+        price_tick: tick size used to map prices to levels
+        chunk: snapshots processed per cumulative-sum block
+    """
+    ts = np.asarray(ts_ns)
+    if ts.dtype.kind == "M":
+        ts = ts.astype("datetime64[ns]").view(np.int64)
+    ts = ts.astype(np.int64, copy=False)
+    sample = np.asarray(sample_ts)
+    if sample.dtype.kind == "M":
+        sample = sample.astype("datetime64[ns]").view(np.int64)
+    sample = sample.astype(np.int64, copy=False)
+    if len(ts) > 1 and np.any(np.diff(ts) < 0):
+        raise ValueError("build_profile_cube requires ticks sorted by timestamp")
+
+    price = np.asarray(price, dtype=np.float64)
+    level = np.rint(price / price_tick).astype(np.int64)
+    vol = np.asarray(volume)
+    sd = np.asarray(side)
+    if sd.dtype.kind not in "iub":
+        sd = (np.char.upper(sd.astype(str)) == "ASK")
+    sd = sd.astype(np.int64)
+
+    n_samples = len(sample)
+    end = np.searchsorted(ts, sample, side="right")
+    last_ts = ts[np.maximum(end - 1, 0)] if len(ts) else np.zeros(n_samples, dtype=np.int64)
+    start = np.where(end > 0, np.searchsorted(ts, last_ts - window_ns, side="left"), 0)
+
+    lo_level = np.zeros(n_samples, dtype=np.int64)
+    blocks = []  # (snapshot rows, volumes trimmed to the chunk's widest window)
+    for c0 in range(0, n_samples, chunk):
+        c1 = min(c0 + chunk, n_samples)
+        s, e = start[c0:c1], end[c0:c1]
+        rows = np.flatnonzero(e > s)
+        if len(rows) == 0:
+            continue
+        t0, t1 = int(s[rows].min()), int(e[rows].max())
+        lv0 = int(level[t0:t1].min())
+        span = int(level[t0:t1].max()) - lv0 + 1
+
+        # cum[k] = per-(level, side) volume of ticks [t0, bounds[k])
+        bounds = np.unique(np.concatenate([s[rows], e[rows]]))
+        seg = np.searchsorted(bounds, np.arange(t0, t1), side="right") - 1
+        key = (seg * span + (level[t0:t1] - lv0)) * 2 + sd[t0:t1]
+        seg_vol = np.bincount(key, weights=vol[t0:t1], minlength=len(bounds) * span * 2)
+        cum = np.zeros((len(bounds), span, 2), dtype=np.int64)
+        np.cumsum(np.rint(seg_vol).astype(np.int64).reshape(len(bounds), span, 2)[:-1], axis=0, out=cum[1:])
+
+        # Window difference, then trim each window to its active level range
+        window_vol = cum[np.searchsorted(bounds, e[rows])] - cum[np.searchsorted(bounds, s[rows])]
+        active = window_vol.any(axis=2)
+        has_active = active.any(axis=1)
+        first = np.where(has_active, active.argmax(axis=1), 0)
+        last = np.where(has_active, span - 1 - active[:, ::-1].argmax(axis=1), 0)
+        w = int((last - first).max()) + 1
+        cols = np.minimum(first[:, None] + np.arange(w)[None, :], span - 1)
+        trimmed = np.take_along_axis(window_vol, cols[:, :, None], axis=1)
+        trimmed[np.arange(w)[None, :] > (last - first)[:, None]] = 0
+        lo_level[c0 + rows] = lv0 + first
+        blocks.append((c0 + rows, trimmed))
+
+    width = max((blk.shape[1] for _, blk in blocks), default=1)
+    volumes = np.zeros((n_samples, width, 2), dtype=np.uint32)
+    for rows, blk in blocks:
+        volumes[rows, :blk.shape[1]] = blk
+
+    close = np.full(n_samples, np.nan)
+    has_tick = end > 0
+    close[has_tick] = price[end[has_tick] - 1]
+    return ProfileCube(sample, lo_level, volumes, close, window_ns, price_tick)
+
+
+def cube_path_for(csv_path, window_sec: float, step: str, price_tick: float = 0.25) -> Path:
+    """Path of the cached cube that belongs to a CSV, window, snapshot step and tick size."""
+    csv_path = Path(csv_path)
+    return csv_path.with_name(f"{csv_path.stem}.cube_{window_sec:g}s_{step}_tick{price_tick:g}.npz")
+
+
+def load_or_build_cube(csv_path, window_sec: float = 5, step: str = "500ms",
+                       price_tick: float = 0.25, verbose: bool = True) -> ProfileCube:
+    """
+    Load the cached cube for a T&S CSV, building (and saving) it when missing or stale.
+
+    Snapshots are taken every `step` (pandas frequency) from the first to the last tick.
+    """
+    cube_path = cube_path_for(csv_path, window_sec, step, price_tick)
+    start = time.perf_counter()
+    if cube_path.exists() and cube_path.stat().st_mtime >= Path(csv_path).stat().st_mtime:
+        cube = ProfileCube.load(cube_path)
+        if verbose:
+            print(f"  Profile cube: {cube_path} ({len(cube):,} snapshots, {time.perf_counter() - start:.2f}s)")
+        return cube
+
+    df = load_ticks(csv_path, columns=["Timestamp", "Precio", "Volumen", "Lado"], verbose=verbose)
+    sample_ts = pd.date_range(start=df["Timestamp"].min(), end=df["Timestamp"].max(), freq=step)
+    cube = build_profile_cube(df["Timestamp"].to_numpy(), df["Precio"].to_numpy(), df["Volumen"].to_numpy(),
+                              df["Lado"].to_numpy(), sample_ts.to_numpy(),
+                              window_ns=int(window_sec * 1e9), price_tick=price_tick)
+    cube.save(cube_path)
+    if verbose:
+        print(f"  Profile cube built: {cube_path} ({len(cube):,} snapshots x {cube.width} levels, "
+              f"{cube.volumes.nbytes / 1e6:.1f} MB, {time.perf_counter() - start:.2f}s)")
+    return cube
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python strat_absortion/profile_cube.py <time_and_sales.csv> [window_sec] [step]")
+        sys.exit(1)
+    load_or_build_cube(sys.argv[1],
+                       window_sec=float(sys.argv[2]) if len(sys.argv) > 2 else 5,
+                       step=sys.argv[3] if len(sys.argv) > 3 else "500ms")
@@ -0,0 +1,259 @@
+"""
+Headless d-Shape / p-Shape detector over the profile cube (no matplotlib).
+
+Applies the same criteria as evaluate_profile_shape() in plot_deep.py to every
+snapshot of a ProfileCube at once: active levels, half split, half sums/maxima
+and price position are computed as array operations over (snapshot x level),
+and the signals are written with the same columns as plot_deep's export.
+
+Usage:
+    python strat_absortion/shape_detector.py data/time_and_sales_nq.csv [window_sec] [step]
+"""
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from compact_profile import CompactRollingMarketProfile
+from profile_cube import ProfileCube, load_or_build_cube
+
+# ============ CONFIGURATION (same defaults as plot_deep.py) ============
+PROFILE_FREQUENCY = 5  # Rolling window in seconds
+DENSITY_SHAPE = 0.70  # 70% of volume must be concentrated in the zone
+MIN_PRICE_LEVELS = 10  # Minimum number of active price levels
+MIN_BID_ASK_SIZE = 20  # Minimum absolute size of largest BID/ASK bar
+PRICE_POSITION_THRESHOLD = 0.25  # Price must be in lower/upper 25% of the profile range
+CHUNK_SNAPSHOTS = 8192  # Snapshots evaluated per block (bounds memory on full days)
+# =======================================================================
+
+SIGNAL_COLUMNS = [
+    'timestamp', 'shape', 'close_price', 'previous_close', 'price_change', 'price_change_pct',
+    'total_bid', 'total_ask', 'bid_ask_ratio', 'num_price_levels', 'lower_bid_volume',
+    'upper_ask_volume', 'max_lower_bid', 'max_upper_ask', 'bid_concentration', 'ask_concentration',
+]
+
+
+EMPTY_SHAPE_METRICS = {
+    'num_price_levels': 0, 'total_bid': 0.0, 'total_ask': 0.0, 'lower_bid_volume': 0.0,
+    'upper_ask_volume': 0.0, 'max_lower_bid': 0.0, 'max_upper_ask': 0.0, 'min_price': 0.0, 'max_price': 0.0,
+}
+
+
+def _safe_div(num, den):
+    out = np.zeros(np.broadcast(num, den).shape)
+    np.divide(num, den, out=out, where=den != 0)
+    return out
+
+
+def compute_shape_metrics(cube: ProfileCube, chunk: int = CHUNK_SNAPSHOTS) -> pd.DataFrame:
+    """
+    Per-snapshot profile statistics used by the shape criteria.
+
+    Halves follow plot_deep: with n active levels sorted by price the lower half
+    is the first ceil(n/2) levels and the upper half the last ceil(n/2) (the
+    middle level belongs to both when n is odd).
+    """
+    n = len(cube)
+    cols = {name: np.zeros(n) for name in ('total_bid', 'total_ask', 'lower_bid_volume', 'upper_ask_volume',
+                                           'max_lower_bid', 'max_upper_ask', 'min_price', 'max_price')}
+    num_levels = np.zeros(n, dtype=np.int64)
+
+    for c0 in range(0, n, chunk):
+        c1 = min(c0 + chunk, n)
+        vols = cube.volumes[c0:c1].astype(np.float64)
+        bid, ask = vols[:, :, 0], vols[:, :, 1]
+        active = (bid > 0) | (ask > 0)
+        n_active = active.sum(axis=1)
+        rank = np.cumsum(active, axis=1) - 1  # Position of each active level among active levels
+
+        lower = active & (rank < (n_active - n_active // 2)[:, None])
+        upper = active & (rank >= (n_active // 2)[:, None])
+
+        sl = slice(c0, c1)
+        num_levels[sl] = n_active
+        cols['total_bid'][sl] = bid.sum(axis=1)
+        cols['total_ask'][sl] = ask.sum(axis=1)
+        cols['lower_bid_volume'][sl] = np.where(lower, bid, 0).sum(axis=1)
+        cols['upper_ask_volume'][sl] = np.where(upper, ask, 0).sum(axis=1)
+        cols['max_lower_bid'][sl] = np.where(lower, bid, 0).max(axis=1)
+        cols['max_upper_ask'][sl] = np.where(upper, ask, 0).max(axis=1)
+
+        has = n_active > 0
+        first = np.where(has, active.argmax(axis=1), 0)
+        last = np.where(has, active.shape[1] - 1 - active[:, ::-1].argmax(axis=1), 0)
+        lo = cube.lo_level[sl]
+        cols['min_price'][sl] = np.round((lo + first) * cube.price_tick, 10)
+        cols['max_price'][sl] = np.round((lo + last) * cube.price_tick, 10)
+
+    metrics = pd.DataFrame(cols)
+    metrics.insert(0, 'num_price_levels', num_levels)
+    return metrics
+
+
+def classify_shapes(metrics: pd.DataFrame, close, previous_close,
+                    density_shape: float = DENSITY_SHAPE,
+                    min_price_levels: int = MIN_PRICE_LEVELS,
+                    min_bid_ask_size: float = MIN_BID_ASK_SIZE,
+                    price_position_threshold: float = PRICE_POSITION_THRESHOLD) -> np.ndarray:
+    """
+    Vectorized evaluate_profile_shape() over per-frame metrics.
+
+    Args:
+        metrics: DataFrame with the columns of compute_shape_metrics()
+        close: close price per frame (NaN = none)
+        previous_close: close of the previous frame (NaN = none)
+
+    Returns:
+        object array of 'd_shape' / 'p_shape' / 'balanced' per frame.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    previous_close = np.asarray(previous_close, dtype=np.float64)
+    total_bid = metrics['total_bid'].to_numpy()
+    total_ask = metrics['total_ask'].to_numpy()
+    price_range = (metrics['max_price'] - metrics['min_price']).to_numpy()
+    price_position = _safe_div(close - metrics['min_price'].to_numpy(), price_range)
+
+    # Same early exits as evaluate_profile_shape (NaN close/previous compare as False)
+    valid = (
+        ~np.isnan(close) & ~np.isnan(previous_close) &
+        (metrics['num_price_levels'].to_numpy() >= min_price_levels) &
+        (total_bid + total_ask != 0) & (price_range != 0)
+    )
+
+    is_d_shape = valid & (total_bid > 0) & (
+        (metrics['max_lower_bid'].to_numpy() >= min_bid_ask_size) &
+        (_safe_div(metrics['lower_bid_volume'].to_numpy(), total_bid) >= density_shape) &
+        (price_position <= price_position_threshold) &
+        (close < previous_close)
+    )
+    is_p_shape = valid & (total_ask > 0) & ~is_d_shape & (
+        (metrics['max_upper_ask'].to_numpy() >= min_bid_ask_size) &
+        (_safe_div(metrics['upper_ask_volume'].to_numpy(), total_ask) >= density_shape) &
+        (price_position >= (1 - price_position_threshold)) &
+        (close > previous_close)
+    )
+
+    shapes = np.full(len(metrics), 'balanced', dtype=object)
+    shapes[is_d_shape] = 'd_shape'
+    shapes[is_p_shape] = 'p_shape'
+    return shapes
+
+
+def detect_shapes(cube: ProfileCube, metrics: pd.DataFrame = None, **criteria):
+    """
+    Vectorized evaluate_profile_shape() for every snapshot of the cube.
+
+    Returns:
+        (shapes, metrics): object array of 'd_shape' / 'p_shape' / 'balanced'
+        per snapshot and the metrics DataFrame it was computed from.
+    """
+    if metrics is None:
+        metrics = compute_shape_metrics(cube)
+    previous_close = np.concatenate([[np.nan], cube.close[:-1]])
+    return classify_shapes(metrics, cube.close, previous_close, **criteria), metrics
+
+
+def tick_shape_metrics(ts_ns, price, volume, side, window_sec: float = PROFILE_FREQUENCY,
+                       price_tick: float = 0.25):
+    """
+    Shape metrics at full tick resolution: one frame per unique tick timestamp.
+
+    Ticks are fed one by one to CompactRollingMarketProfile and the half-split
+    metrics are read from its Fenwick/max trees after the last tick of each
+    timestamp, in O(log L) per frame, so this is also what a live feed would do.
+
+    Returns:
+        (frame_ts, close, metrics): int64 ns per frame, last price of the frame
+        and the metrics DataFrame (columns of compute_shape_metrics()).
+    """
+    ts = np.asarray(ts_ns)
+    if ts.dtype.kind == "M":
+        ts = ts.astype("datetime64[ns]").view(np.int64)
+    ts = ts.astype(np.int64, copy=False)
+    price = np.asarray(price, dtype=np.float64)
+
+    mp = CompactRollingMarketProfile(window=timedelta(seconds=window_sec), price_tick=price_tick)
+    frame_end = np.flatnonzero(np.append(ts[1:] != ts[:-1], True)) if len(ts) else np.zeros(0, dtype=np.int64)
+    ts_list, price_list = ts.tolist(), price.tolist()
+    volume_list, side_list = np.asarray(volume).tolist(), np.asarray(side).tolist()
+
+    rows = []
+    i = 0
+    for end in frame_end.tolist():
+        while i <= end:
+            mp.update(ts_list[i], price_list[i], volume_list[i], side_list[i])
+            i += 1
+        rows.append(mp.shape_metrics() or EMPTY_SHAPE_METRICS)
+
+    metrics = pd.DataFrame(rows, columns=list(EMPTY_SHAPE_METRICS))
+    return ts[frame_end], price[frame_end], metrics
+
+
+def detect_signals(cube: ProfileCube, **criteria) -> pd.DataFrame:
+    """d-Shape / p-Shape signals with the columns of plot_deep's db_shapes export."""
+    shapes, metrics = detect_shapes(cube, **criteria)
+    idx = np.flatnonzero(shapes != 'balanced')
+
+    m = metrics.iloc[idx].reset_index(drop=True)
+    close = cube.close[idx]
+    previous_close = cube.close[idx - 1]
+    price_change = close - previous_close
+
+    signals = pd.DataFrame({
+        'timestamp': pd.to_datetime(cube.sample_ts[idx]),
+        'shape': shapes[idx],
+        'close_price': close,
+        'previous_close': previous_close,
+        'price_change': price_change,
+        'price_change_pct': _safe_div(price_change, previous_close) * 100,
+        'total_bid': m['total_bid'],
+        'total_ask': m['total_ask'],
+        'bid_ask_ratio': _safe_div(m['total_bid'].to_numpy(), m['total_ask'].to_numpy()),
+        'num_price_levels': m['num_price_levels'],
+        'lower_bid_volume': m['lower_bid_volume'],
+        'upper_ask_volume': m['upper_ask_volume'],
+        'max_lower_bid': m['max_lower_bid'],
+        'max_upper_ask': m['max_upper_ask'],
+        'bid_concentration': _safe_div(m['lower_bid_volume'].to_numpy(), m['total_bid'].to_numpy()),
+        'ask_concentration': _safe_div(m['upper_ask_volume'].to_numpy(), m['total_ask'].to_numpy()),
+    })
+    return signals[SIGNAL_COLUMNS]
+
+
+def save_signals(signals: pd.DataFrame, output_dir="outputs", timestamp_str=None) -> Path:
+    """Write signals to outputs/db_shapes_YYYYMMDD_HHMMSS.csv (';' separator, ',' decimal)."""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(exist_ok=True)
+    if timestamp_str is None:
+        timestamp_str = datetime.now().strftime("%Y%m%d_%H%M%S")
+    csv_path_output = output_dir / f"db_shapes_{timestamp_str}.csv"
+    signals.to_csv(csv_path_output, index=False, sep=';', decimal=',')
+    return csv_path_output
+
+
+def main(csv_path, window_sec=PROFILE_FREQUENCY, step="500ms"):
+    start = time.perf_counter()
+    cube = load_or_build_cube(csv_path, window_sec=window_sec, step=step)
+    signals = detect_signals(cube)
+
+    if len(signals) == 0:
+        print("No d-Shape or p-Shape signals detected")
+        return signals
+
+    csv_path_output = save_signals(signals)
+    print(f"Saved {len(signals)} signals to {csv_path_output} ({time.perf_counter() - start:.2f}s)")
+    print(f"  - d-Shape signals: {int((signals['shape'] == 'd_shape').sum())}")
+    print(f"  - p-Shape signals: {int((signals['shape'] == 'p_shape').sum())}")
+    return signals
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python strat_absortion/shape_detector.py <time_and_sales.csv> [window_sec] [step]")
+        sys.exit(1)
+    main(sys.argv[1],
+         window_sec=float(sys.argv[2]) if len(sys.argv) > 2 else PROFILE_FREQUENCY,
+         step=sys.argv[3] if len(sys.argv) > 3 else "500ms")
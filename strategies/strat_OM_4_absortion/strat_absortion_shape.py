@@ -14,8 +14,6 @@ Cambia respecto a versiones previas:
 
 import sys
 from pathlib import Path
-from typing import Optional
-from dataclasses import dataclass
 
 import numpy as np
 import pandas as pd
@@ -26,6 +24,10 @@ PROJECT_ROOT = THIS_FILE.parents[2]  # .../strategies/strat_OM_4_absortion -> st
 DATA_DIR = PROJECT_ROOT / "data"
 OUTPUTS_DIR = PROJECT_ROOT / "outputs"
 
+sys.path.insert(0, str(PROJECT_ROOT))
+from tick_store import load_ticks, store_path_for
+import backtest_engine
+
 TNS_FILE = DATA_DIR / "time_and_sales_nq.csv"
 #TNS_FILE = DATA_DIR / "time_and_sales_nq_30min.csv"    # precio base
 SIGNALS_FILE = OUTPUTS_DIR / "db_shapes_20251024_003251.csv"
@@ -53,22 +55,16 @@ def _to_float(s: pd.Series) -> pd.Series:
          .astype(float)
     )
 
-@dataclass
-class OpenPosition:
-    """Represents an open position."""
-    side: str  # "LONG" or "SHORT"
-    entry_time: pd.Timestamp
-    entry_price: float
-    entry_signal: str
-    tp_price: float
-    sl_price: float
-
 # ========= BACKTEST =========
 def run_backtest_tickdriven(df_signals: pd.DataFrame, df_base: pd.DataFrame) -> pd.DataFrame:
     """
     Backtest tick-driven con control de posiciones máximas abiertas.
     df_signals: columnas ['timestamp','shape','close_price']
     df_base:    columnas ['timestamp','price'] (derivado de T&S)
+
+    Las señales se unen a los ticks por timestamp; d_shape abre LONG y p_shape
+    SHORT al close_price de la señal. En cada tick se revisan primero las
+    salidas y después la entrada (backtest_engine.run_backtest).
     """
     # Preparar datos
     sig = df_signals.copy().sort_values("timestamp").reset_index(drop=True)
@@ -84,123 +80,27 @@ def run_backtest_tickdriven(df_signals: pd.DataFrame, df_base: pd.DataFrame) ->
         how='left'
     ).sort_values('timestamp').reset_index(drop=True)
 
-    trades = []
-    open_positions = []  # List of OpenPosition objects
-
     print(f"\n  Processing {len(merged):,} ticks with {len(sig):,} signals...")
 
-    for i, row in merged.iterrows():
-        if i % 50000 == 0:
-            print(f"    Tick {i:,}/{len(merged):,} | Open positions: {len(open_positions)} | Completed trades: {len(trades)}")
-
-        current_time = row['timestamp']
-        current_price = row['price']
-
-        # 1. Check for exits FIRST (before processing new signals)
-        positions_to_close = []
-        for pos in open_positions:
-            exit_reason = None
-            exit_price = None
-
-            if pos.side == "LONG":
-                if current_price >= pos.tp_price:
-                    exit_reason = "TARGET"
-                    exit_price = pos.tp_price
-                elif current_price <= pos.sl_price:
-                    exit_reason = "STOP"
-                    exit_price = pos.sl_price
-
-            elif pos.side == "SHORT":
-                if current_price <= pos.tp_price:
-                    exit_reason = "TARGET"
-                    exit_price = pos.tp_price
-                elif current_price >= pos.sl_price:
-                    exit_reason = "STOP"
-                    exit_price = pos.sl_price
-
-            if exit_reason:
-                # Close position
-                if pos.side == "LONG":
-                    profit_points = exit_price - pos.entry_price
-                else:  # SHORT
-                    profit_points = pos.entry_price - exit_price
-
-                trades.append({
-                    "entry_time": pos.entry_time,
-                    "entry_price": pos.entry_price,
-                    "exit_time": current_time,
-                    "exit_price": float(exit_price),
-                    "side": pos.side,
-                    "entry_signal": pos.entry_signal,
-                    "tp_price": float(pos.tp_price),
-                    "sl_price": float(pos.sl_price),
-                    "exit_reason": exit_reason,
-                    "profit_points": round(float(profit_points), 2),
-                    "profit_dollars": round(float(profit_points * POINT_VALUE * CONTRACTS), 2),
-                    "contracts": CONTRACTS
-                })
-                positions_to_close.append(pos)
-
-        # Remove closed positions
-        for pos in positions_to_close:
-            open_positions.remove(pos)
-
-        # 2. Check for new signal (only if we have room for more positions)
-        if pd.notna(row['shape']) and len(open_positions) < NUM_MAX_OPEN_CONTRACTS:
-            shape = str(row['shape']).strip().lower()
-            signal_price = float(row['close_price'])
-
-            new_pos = None
-            if shape == "d_shape":
-                new_pos = OpenPosition(
-                    side="LONG",
-                    entry_time=current_time,
-                    entry_price=signal_price,
-                    entry_signal="d_shape",
-                    tp_price=signal_price + TP_POINTS,
-                    sl_price=signal_price - SL_POINTS
-                )
-            elif shape == "p_shape":
-                new_pos = OpenPosition(
-                    side="SHORT",
-                    entry_time=current_time,
-                    entry_price=signal_price,
-                    entry_signal="p_shape",
-                    tp_price=signal_price - TP_POINTS,
-                    sl_price=signal_price + SL_POINTS
-                )
-
-            if new_pos:
-                open_positions.append(new_pos)
-
-    # 3. Close any remaining open positions at END_OF_DATA
-    if open_positions:
-        last_time = merged.iloc[-1]['timestamp']
-        last_price = merged.iloc[-1]['price']
-
-        for pos in open_positions:
-            if pos.side == "LONG":
-                profit_points = last_price - pos.entry_price
-            else:  # SHORT
-                profit_points = pos.entry_price - last_price
-
-            trades.append({
-                "entry_time": pos.entry_time,
-                "entry_price": pos.entry_price,
-                "exit_time": last_time,
-                "exit_price": float(last_price),
-                "side": pos.side,
-                "entry_signal": pos.entry_signal,
-                "tp_price": float(pos.tp_price),
-                "sl_price": float(pos.sl_price),
-                "exit_reason": "END_OF_DATA",
-                "profit_points": round(float(profit_points), 2),
-                "profit_dollars": round(float(profit_points * POINT_VALUE * CONTRACTS), 2),
-                "contracts": CONTRACTS
-            })
+    shape = merged['shape'].astype(str).str.strip().str.lower().where(merged['shape'].notna())
+    ledger = backtest_engine.run_backtest(
+        merged['timestamp'], merged['price'],
+        long_signal=shape == "d_shape",
+        short_signal=shape == "p_shape",
+        tp_points=TP_POINTS, sl_points=SL_POINTS,
+        entry_price=merged['close_price'],
+        max_open=NUM_MAX_OPEN_CONTRACTS,
+        reenter_on_exit=True,  # Un tick puede cerrar una posición y abrir otra
+        point_value=POINT_VALUE, contracts=CONTRACTS,
+    )
 
-    print(f"    Completed: {len(trades):,} trades")
-    return pd.DataFrame(trades)
+    print(f"    Completed: {len(ledger):,} trades")
+    return ledger.to_frame(
+        reason_column="exit_reason",
+        extra={"entry_signal": np.where(shape == "d_shape", "d_shape", "p_shape")},
+        columns=["entry_time", "entry_price", "exit_time", "exit_price", "side", "entry_signal", "tp_price",
+                 "sl_price", "exit_reason", "profit_points", "profit_dollars", "contracts"],
+    )
 
 # ========= MAIN =========
 def main() -> pd.DataFrame:
@@ -224,15 +124,11 @@ def main() -> pd.DataFrame:
     df_sig["close_price"] = _to_float(df_sig["close_price"])
 
     # Cargar precio base T&S
-    if not TNS_FILE.exists():
+    if not TNS_FILE.exists() and not store_path_for(TNS_FILE).exists():
         raise FileNotFoundError(f"No existe {TNS_FILE}")
-    base = _read_csv_semicolon_decimal(TNS_FILE)
-    base.columns = base.columns.str.strip()
-    ts_col = next((c for c in base.columns if c.lower().startswith("timestamp")), "Timestamp")
-    px_col = next((c for c in base.columns if c.lower().startswith("precio")), "Precio")
-    base["timestamp"] = pd.to_datetime(base[ts_col])
-    base["price"] = _to_float(base[px_col])
-    base = base[["timestamp", "price"]].sort_values("timestamp").reset_index(drop=True)
+    base = load_ticks(TNS_FILE, columns=["Timestamp", "Precio"])
+    base = base.rename(columns={"Timestamp": "timestamp", "Precio": "price"})
+    base = base.sort_values("timestamp").reset_index(drop=True)
 
     print(f"  Señales: {len(df_sig):,} | Base T&S: {len(base):,}\n")
 
@@ -0,0 +1,392 @@
+"""
+Binary columnar tick store for Time & Sales data.
+
+Converts the European-format CSV (`Timestamp;Precio;Volumen;Lado;Bid;Ask`,
+`;` separator, `,` decimal) once into a compact columnar file next to it
+(`time_and_sales_nq.csv` -> `time_and_sales_nq.ticks`):
+
+    Timestamp  int64   nanoseconds since epoch (naive local time, as in the CSV)
+    Precio     int32   price in ticks (price / tick_size)
+    Volumen    uint16  contracts
+    Lado       uint8   side code (0 = BID, 1 = ASK)
+    Bid        int32   best bid in ticks
+    Ask        int32   best ask in ticks
+
+Missing prices (NaN, e.g. an empty Bid/Ask) are stored as MISSING_TICKS and
+decoded back to NaN. A CSV that cannot be stored exactly (prices off the
+tick_size grid, Volumen above uint16, sides other than BID/ASK) is loaded
+from the CSV instead, with a warning.
+
+File layout: 8-byte magic, uint32 header length, JSON header (row count,
+tick size, column dtypes and byte offsets), then one contiguous block per
+column aligned to 64 bytes. Loading a subset of columns only reads those blocks.
+
+Usage:
+    from tick_store import load_ticks, map_ticks
+    df = load_ticks('data/time_and_sales_nq.csv', columns=['Timestamp', 'Precio'])
+
+    # Read-only memory-mapped views (zero-copy, shared through the page cache)
+    header, arrays = map_ticks('data/time_and_sales_nq.csv')
+    prices_in_ticks = arrays['Precio']
+
+    # Derived arrays in the same layout (e.g. a pipeline stage shared by pool workers)
+    write_columns('stage.cols', {'Precio': prices, 'Volumen': volumes})
+    header, arrays = map_columns('stage.cols')
+
+    python tick_store.py data/time_and_sales_nq.csv   # convert + report load times
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+MAGIC = b'TICKSTR1'
+STORE_SUFFIX = '.ticks'
+DEFAULT_TICK_SIZE = 0.25  # NQ / ES
+ALIGNMENT = 64
+MISSING_TICKS = np.iinfo(np.int32).min  # Stored value of a NaN price
+
+SIDE_CODES = {'BID': 0, 'ASK': 1}
+SIDE_NAMES = np.array(['BID', 'ASK'], dtype=object)
+
+# Column name -> on-disk dtype
+COLUMN_DTYPES = {
+    'Timestamp': np.dtype('<i8'),
+    'Precio': np.dtype('<i4'),
+    'Volumen': np.dtype('<u2'),
+    'Lado': np.dtype('u1'),
+    'Bid': np.dtype('<i4'),
+    'Ask': np.dtype('<i4'),
+}
+PRICE_COLUMNS = ('Precio', 'Bid', 'Ask')
+
+
+def store_path_for(csv_path):
+    """Path of the binary store that belongs to a CSV file."""
+    return Path(csv_path).with_suffix(STORE_SUFFIX)
+
+
+def _to_ticks(prices, tick_size, name):
+    missing = np.isnan(prices)
+    ticks = np.rint(prices / tick_size)
+    valid = ticks[~missing]
+    if not np.allclose(valid * tick_size, prices[~missing], rtol=0, atol=tick_size * 1e-6):
+        raise ValueError(f"Column {name} has prices that are not multiples of tick_size={tick_size}")
+    if len(valid) and (valid.min() <= MISSING_TICKS or valid.max() > np.iinfo(np.int32).max):
+        raise ValueError(f"Column {name} does not fit in int32 ticks")
+    ticks[missing] = MISSING_TICKS
+    return ticks.astype(np.int32)
+
+
+def _data_start(header_len, magic=MAGIC):
+    start = len(magic) + 4 + header_len
+    return start + (-start % ALIGNMENT)
+
+
+def read_tick_csv(csv_path):
+    """Parse a Time & Sales CSV with `;` separator and `,` decimal."""
+    df = pd.read_csv(csv_path, sep=';', decimal=',')
+    df['Timestamp'] = pd.to_datetime(df['Timestamp'])
+    return df
+
+
+def write_store(df, store_path, tick_size=DEFAULT_TICK_SIZE, source=None):
+    """
+    Write a Time & Sales DataFrame to the binary columnar format.
+
+    Raises ValueError when a column cannot be stored exactly (prices off the
+    tick_size grid, Volumen missing or above uint16, sides other than BID/ASK).
+    """
+    missing = [c for c in COLUMN_DTYPES if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing columns for tick store: {missing}")
+
+    volume = df['Volumen'].to_numpy()
+    if not np.issubdtype(volume.dtype, np.integer):
+        raise ValueError("Column Volumen has missing or non-integer values")
+    if len(volume) and (volume.min() < 0 or volume.max() > np.iinfo(np.uint16).max):
+        raise ValueError("Column Volumen does not fit in uint16")
+
+    side = df['Lado'].astype(str).str.strip().str.upper()
+    unknown = set(side.unique()) - set(SIDE_CODES)
+    if unknown:
+        raise ValueError(f"Unknown side values in Lado: {sorted(unknown)}")
+
+    arrays = {
+        'Timestamp': df['Timestamp'].to_numpy().astype('datetime64[ns]').view(np.int64),
+        'Volumen': volume.astype(np.uint16),
+        'Lado': side.map(SIDE_CODES).to_numpy().astype(np.uint8),
+    }
+    for name in PRICE_COLUMNS:
+        arrays[name] = _to_ticks(df[name].to_numpy(dtype=np.float64), tick_size, name)
+
+    arrays = {name: arrays[name].astype(dtype, copy=False) for name, dtype in COLUMN_DTYPES.items()}
+    return write_columns(store_path, arrays, tick_size=tick_size,
+                         source=str(source) if source is not None else None)
+
+
+def write_columns(path, arrays, **fields):
+    """
+    Write equal-length 1-D arrays in the tick store layout, readable with
+    read_store_arrays and map_columns. Extra keyword fields are stored in the
+    header (see write_column_file).
+    """
+    arrays = {name: np.ascontiguousarray(values) for name, values in arrays.items()}
+    n_rows = len(next(iter(arrays.values()))) if arrays else 0
+    for name, values in arrays.items():
+        if values.ndim != 1 or len(values) != n_rows:
+            raise ValueError(f"Column {name} must be a 1-D array with {n_rows} values")
+    return write_column_file(path, arrays, n_rows=n_rows, **fields)
+
+
+def write_column_file(path, arrays, magic=MAGIC, **fields):
+    """
+    Write numeric arrays as a column file: magic, uint32 header length, JSON
+    header (keyword fields + dtype/shape/offset per column), then one 64-byte
+    aligned block per column. Shared by the tick store and the DOM store.
+
+    The file is written under a unique temporary name in the same directory and
+    renamed into place, so concurrent writers of the same path never mix their
+    bytes and readers only ever see a complete file.
+    """
+    path = Path(path)
+    arrays = {name: np.ascontiguousarray(values) for name, values in arrays.items()}
+
+    columns = {}
+    offset = 0
+    for name, values in arrays.items():
+        if values.dtype.hasobject:
+            raise ValueError(f"Column {name} must be numeric")
+        columns[name] = {'dtype': values.dtype.str, 'shape': list(values.shape), 'offset': offset}
+        offset += values.nbytes
+        offset += -offset % ALIGNMENT
+
+    header = {**fields, 'columns': columns}
+    header_bytes = json.dumps(header).encode('utf-8')
+    data_start = _data_start(len(header_bytes), magic)
+
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=path.name + '.', suffix='.tmp',
+                                     delete=False) as f:
+        tmp_path = Path(f.name)
+        try:
+            f.write(magic)
+            f.write(np.uint32(len(header_bytes)).tobytes())
+            f.write(header_bytes)
+            for name, values in arrays.items():
+                f.seek(data_start + columns[name]['offset'])
+                f.write(values.tobytes())
+        except BaseException:
+            f.close()
+            tmp_path.unlink(missing_ok=True)
+            raise
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_header(store_path, magic=MAGIC, kind='tick store'):
+    """Read the JSON header of a tick store (or another column file with its magic)."""
+    with open(store_path, 'rb') as f:
+        if f.read(len(magic)) != magic:
+            raise ValueError(f"{store_path} is not a {kind} file")
+        header_len = int(np.frombuffer(f.read(4), dtype='<u4')[0])
+        header = json.loads(f.read(header_len).decode('utf-8'))
+    header['data_start'] = _data_start(header_len, magic)
+    return header
+
+
+def _column_names(header, columns):
+    names = list(header['columns']) if columns is None else list(columns)
+    unknown = [c for c in names if c not in header['columns']]
+    if unknown:
+        raise ValueError(f"Unknown tick store columns: {unknown}")
+    return names
+
+
+def read_store_arrays(store_path, columns=None):
+    """Read raw column arrays (ticks / codes, no conversion) from a tick store."""
+    header = read_header(store_path)
+    names = _column_names(header, columns)
+
+    n_rows = header['n_rows']
+    arrays = {}
+    with open(store_path, 'rb') as f:
+        for name in names:
+            col = header['columns'][name]
+            f.seek(header['data_start'] + col['offset'])
+            arrays[name] = np.fromfile(f, dtype=np.dtype(col['dtype']), count=n_rows)
+    return header, arrays
+
+
+def map_ticks(path, columns=None, tick_size=DEFAULT_TICK_SIZE, build=True):
+    """
+    Memory-map tick store columns as read-only NumPy views (no copy, no parsing).
+
+    Every process that maps the same file shares one physical copy of the data
+    through the OS page cache, so parameter sweeps across worker processes do not
+    grow memory with the number of workers. Pass the *path* to the workers and
+    call map_ticks there: pickling a memmap sends a full copy of the data.
+
+    Args:
+        path: CSV path or `.ticks` store path
+        columns: subset of columns to map (None = all)
+        tick_size: tick size used when the store has to be built
+        build: build/refresh the store from the CSV when missing or stale
+
+    Returns:
+        (header, arrays) with arrays[name] a read-only np.memmap in on-disk
+        units (int64 ns, int32 ticks with MISSING_TICKS for NaN, uint16 volume,
+        uint8 side code). Use arrays_to_frame(header, arrays) to decode to the
+        CSV schema.
+
+    Raises ValueError when the CSV cannot be stored (see write_store).
+    """
+    path = Path(path)
+    store_path = path if path.suffix == STORE_SUFFIX else store_path_for(path)
+    if not _store_is_fresh(path, store_path):
+        if not build:
+            raise FileNotFoundError(f"No existe tick store actualizado: {store_path}")
+        convert_csv(path, store_path, tick_size=tick_size)
+
+    return map_columns(store_path, columns)
+
+
+def map_columns(path, columns=None):
+    """
+    Memory-map the columns of a file written by write_columns (tick stores
+    included) as read-only NumPy views.
+
+    Returns:
+        (header, arrays) with arrays[name] a read-only np.memmap
+    """
+    header = read_header(path)
+    names = _column_names(header, columns)
+
+    n_rows = header['n_rows']
+    arrays = {}
+    for name in names:
+        col = header['columns'][name]
+        dtype = np.dtype(col['dtype'])
+        if n_rows == 0:
+            arrays[name] = np.empty(0, dtype=dtype)
+            continue
+        arrays[name] = np.memmap(path, dtype=dtype, mode='r',
+                                 offset=header['data_start'] + col['offset'], shape=(n_rows,))
+    return header, arrays
+
+
+def arrays_to_frame(header, arrays):
+    """Decode raw store arrays into the original CSV schema."""
+    tick_size = header['tick_size']
+    data = {}
+    for name, values in arrays.items():
+        if name == 'Timestamp':
+            data[name] = values.view('datetime64[ns]')
+        elif name in PRICE_COLUMNS:
+            prices = values * tick_size
+            missing = values == MISSING_TICKS
+            if missing.any():
+                prices[missing] = np.nan
+            data[name] = prices
+        elif name == 'Volumen':
+            data[name] = values.astype(np.int64)
+        elif name == 'Lado':
+            data[name] = SIDE_NAMES[values]
+    return pd.DataFrame(data)
+
+
+def convert_csv(csv_path, store_path=None, tick_size=DEFAULT_TICK_SIZE):
+    """Convert a Time & Sales CSV into its binary store. Returns the store path."""
+    store_path = store_path_for(csv_path) if store_path is None else Path(store_path)
+    df = read_tick_csv(csv_path)
+    return write_store(df, store_path, tick_size=tick_size, source=Path(csv_path).name)
+
+
+def _store_is_fresh(csv_path, store_path):
+    if not store_path.exists():
+        return False
+    if not Path(csv_path).exists():
+        return True
+    return store_path.stat().st_mtime >= Path(csv_path).stat().st_mtime
+
+
+def load_ticks(path, columns=None, tick_size=DEFAULT_TICK_SIZE, build=True, verbose=True):
+    """
+    Load Time & Sales ticks as a DataFrame with the CSV schema
+    (Timestamp datetime64[ns], Precio/Bid/Ask float, Volumen int, Lado 'BID'/'ASK').
+
+    When the CSV cannot be stored (see write_store) a warning is printed and
+    the parsed CSV is returned, as before the store existed.
+
+    Args:
+        path: CSV path or `.ticks` store path
+        columns: subset of columns to load (None = all)
+        tick_size: tick size used when the store has to be built
+        build: build/refresh the store from the CSV when missing or stale
+        verbose: print load source and load time
+    """
+    path = Path(path)
+    store_path = path if path.suffix == STORE_SUFFIX else store_path_for(path)
+
+    start = time.perf_counter()
+    if not _store_is_fresh(path, store_path):
+        df = read_tick_csv(path)
+        stored = False
+        if build:
+            try:
+                write_store(df, store_path, tick_size=tick_size, source=path.name)
+                stored = True
+            except ValueError as e:
+                print(f"  ⚠️  No se puede crear el tick store de {path} ({e}): se usa el CSV")
+        if not stored:
+            if verbose:
+                print(f"  Ticks: {path} (CSV, {time.perf_counter() - start:.2f}s)")
+            return df if columns is None else df[list(columns)]
+        if verbose:
+            print(f"  Tick store creado: {store_path} ({time.perf_counter() - start:.2f}s)")
+        start = time.perf_counter()
+
+    header, arrays = read_store_arrays(store_path, columns)
+    df = arrays_to_frame(header, arrays)
+    if verbose:
+        print(f"  Ticks: {store_path} ({len(df):,} filas, {time.perf_counter() - start:.3f}s) "
+              f"<- {path if path != store_path else header.get('source')}")
+    return df
+
+
+def benchmark(csv_path, tick_size=DEFAULT_TICK_SIZE):
+    """Convert a CSV and report CSV parse time vs cold store load time."""
+    store_path = store_path_for(csv_path)
+
+    start = time.perf_counter()
+    df = read_tick_csv(csv_path)
+    csv_sec = time.perf_counter() - start
+
+    write_store(df, store_path, tick_size=tick_size, source=Path(csv_path).name)
+
+    start = time.perf_counter()
+    header, arrays = read_store_arrays(store_path)
+    loaded = arrays_to_frame(header, arrays)
+    store_sec = time.perf_counter() - start
+
+    csv_mb = Path(csv_path).stat().st_size / 1e6
+    store_mb = store_path.stat().st_size / 1e6
+    print(f"{csv_path}: {len(df):,} ticks")
+    print(f"  CSV   {csv_mb:8.2f} MB  {csv_sec:8.3f}s")
+    print(f"  Store {store_mb:8.2f} MB  {store_sec:8.3f}s  ({store_path})")
+    if store_sec > 0:
+        print(f"  Speedup: {csv_sec / store_sec:.1f}x")
+    return loaded
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Uso: python tick_store.py <time_and_sales.csv> [...]")
+        sys.exit(1)
+    for csv_file in sys.argv[1:]:
+        benchmark(csv_file)
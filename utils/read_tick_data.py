@@ -1,11 +1,11 @@
 # Este código lee los datos de time and sales (tick data)
 
-import pandas as pd
 import os
 import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 from config import DATA_DIR
+from tick_store import load_ticks
 
 
 # ====================================================
@@ -17,15 +17,12 @@ nombre_fichero = 'time_and_sales.csv'
 ruta_completa = os.path.join(directorio, nombre_fichero)
 
 print("\n======================== 🔍 Time and Sales Data  ===========================")
-# Leer CSV con formato europeo (separador ; y decimal ,)
-df = pd.read_csv(ruta_completa, sep=';', decimal=',')
+# Leer ticks desde el tick store binario (se crea desde el CSV europeo la primera vez)
+df = load_ticks(ruta_completa)
 print('Fichero:', ruta_completa, 'importado')
 print(f"Características del Fichero: {df.shape}")
 print("Columnas disponibles:", df.columns.tolist())
 
-# Convertir Timestamp a formato pandas datetime
-df['Timestamp'] = pd.to_datetime(df['Timestamp'])
-
 # Establecer Timestamp como índice
 df = df.set_index('Timestamp')
 